@@ -1 +1,11 @@
-from .controller import Controller
+def __getattr__(name):
+    # The controller (and VIKTOR with it) is imported on first use, so scripts can import `app.core` without it
+    if name == "Controller":
+        from .controller import Controller
+
+        return Controller
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return [*globals(), "Controller"]
@@ -1,238 +1,87 @@
+import io
+
 import viktor as vkt
 from viktor.result import DownloadResult
-from viktor.external.word import render_word_file, WordFileTag
+from viktor.external.word import render_word_file, WordFileImage, WordFileTag
 
-import app.core.compliance_check as compliance_check
 from app.models.models import (
-    OutputItem,
     ReportData,
     ComplianceSummaryList,
     ConnectionSummaryList,
     report_headers,
 )
-from app.core.parse_xlsx_files import get_entities, get_section_by_id
+from app.core.parse_xlsx_files import load_entities
+from app.core.cache import content_hash, result_cache, result_key
+from app.core.parallel import WORKERS
+from app.core.pipeline import run_checks, run_design
+from app.core.profiling import PROFILE, last_request, note, profiled, stage
+from app.core.report import load_template, table_workbook
+from app.core.results import CHECK_ORDER, UNCHECKED_LABEL
+from app.core.gltf import frame_colors, load_geometry
 from app.core.render import (
-    render_model,
     colors_by_group,
     get_material_color,
-    render_legend,
+    legend_entries,
+    report_snapshots,
 )
-from app.library.load_db import gen_library
+from app.library.load_db import get_library
 
-from app.parametrization import Parametrization
+from app.parametrization import Parametrization, REPORT_TABLE_APPENDIX
 from pathlib import Path
 
+# Width of the model snapshots in the report
+REPORT_IMAGE_WIDTH = 500
+
+
+def normalized_assignments(cont_types, with_capacity=True):
+    """Group -> (connection type, capacity) pairs the results depend on, later rows overriding earlier ones."""
+    assignments = {}
+    for con_dict in cont_types:
+        assignments[con_dict.groups] = (con_dict.connection_type, con_dict.capacities if with_capacity else None)
+    return tuple(sorted(assignments.items(), key=lambda item: str(item[0])))
+
 
-def connection_checks(file,cont_types,lc):
-    # Clear output for a new report
+def connection_checks(file,cont_types,lc,workers=WORKERS):
     xlsx_file = file.file
     file_content = xlsx_file.getvalue_binary()
-    nodes, lines, groups, sections, load_combos = get_entities(file_content)
-    frame_by_group = {}
-    groups_conn_props = {}
+    file_hash = content_hash(file_content)
+    with stage("load model"):
+        entities = load_entities(file_content, file_hash)
+
+    # Results are shared by the views of the same inputs, until the library changes
+    library = get_library()
+    result_cache.bind(library.fingerprint)
+    key = result_key(file_hash, normalized_assignments(cont_types), lc, "Connection Check")
+    with stage("connection checks", load_combination=lc):
+        frame_by_group, results = result_cache.get_or_create(
+            key, lambda: run_checks(entities, library, cont_types, lc, workers)
+        )
+    nodes, lines, groups, sections, load_combos, topology = entities
+    return sections, lines,nodes,frame_by_group,results,lc
 
-    # Process connections
-    for con_dict in cont_types:
-        conn_props = {
-            "color": con_dict.color,
-            "contype": con_dict.connection_type,
-            "capacity": con_dict.capacities,
-        }
-        groups_conn_props[con_dict.groups] = conn_props
-
-    # Generate library
-    db = gen_library()
-    selected_lc = lc
-    output_items = []
-
-    # Process groups and frames
-    for group_name, group_vals in groups.items():
-        frame_color_set = set()
-        for frames_in_groups in group_vals["frame_ids"]:
-            if frames_in_groups not in frame_color_set:
-                color = None
 
-                if groups_conn_props.get(group_name):
-                    frame_color_set.add(frames_in_groups)
-                    # Match the DynamicArray content with the connection database
-                    cont_type = groups_conn_props[group_name]["contype"]
-                    capacity = groups_conn_props[group_name]["capacity"]
-                    section_name = get_section_by_id(sections, frames_in_groups)
-                    frame_con_capacity = db[cont_type]
-                    load = load_combos[frames_in_groups][selected_lc]
-
-                    # Record for report
-                    report_item = OutputItem()
-                    report_item.frame_id = frames_in_groups
-                    report_item.group_name = group_name
-                    report_item.conn_type = cont_type
-                    report_item.load_combo = selected_lc
-                    report_item.section_name = section_name
-
-                    axis = compliance_check.get_alignment(lines, nodes, frames_in_groups)
-
-                    if cont_type == "Moment End Plate":
-                        color, report_item = compliance_check.moment_end_plate_check(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                            axis
-                        )
-
-                    if cont_type == "Web Cleat":
-                        color, report_item = compliance_check.web_cope(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                        )
-
-                    if cont_type == "Base Plate":
-                        color, report_item = compliance_check.base_plate(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                            nodes,
-                        )
-
-                    # Store item result for reporting
-                    output_items.append(report_item)
-
-                    if color:
-                        frame_by_group.update({frames_in_groups: {"material": color}})
-
-    output_items_serialized = [output_item.model_dump() for output_item in output_items]
-    return sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc
-
-
-
-def connection_design(file,cont_types,lc):
-    # Clear output for a new report
+def connection_design(file,cont_types,lc,workers=WORKERS):
     xlsx_file = file.file
     file_content = xlsx_file.getvalue_binary()
-    nodes, lines, groups, sections, load_combos = get_entities(file_content)
-    frame_by_group = {}
-    groups_conn_props = {}
+    file_hash = content_hash(file_content)
+    with stage("load model"):
+        entities = load_entities(file_content, file_hash)
+
+    # Results are shared by the views of the same inputs, until the library changes
+    library = get_library()
+    result_cache.bind(library.fingerprint)
+    key = result_key(file_hash, normalized_assignments(cont_types, with_capacity=False), lc, "Connection Design")
+    with stage("connection design", load_combination=lc):
+        design = result_cache.get_or_create(
+            key, lambda: run_design(entities, library, cont_types, lc, workers)
+        )
+    frame_by_group, results, design_result, non_compliant_members, driving_members = design
+    nodes, lines, groups, sections, load_combos, topology = entities
+    return (
+        sections, lines, nodes, frame_by_group, results, lc, design_result,
+        non_compliant_members, driving_members,
+    )
 
-    # Process connections
-    for con_dict in cont_types:
-        conn_props = {
-            "color": con_dict.color,
-            "contype": con_dict.connection_type,
-        }
-        groups_conn_props[con_dict.groups] = conn_props
-
-    # Generate library
-    db = gen_library()
-    selected_lc = lc
-    output_items = []
-
-    # Process groups and frames
-    non_compliant_members = {}
-    design_result = {}
-    for group_name, group_vals in groups.items():
-        if groups_conn_props.get(group_name):
-            non_compliant_members[group_name] = []
-            frame_id_list = group_vals["frame_ids"]
-            cont_type = groups_conn_props[group_name]["contype"]
-            frame_con_capacity = db[cont_type]
-
-            for frame_id in frame_id_list:
-                selected_con_index = 0
-                section_name = get_section_by_id(sections, frame_id)
-
-                load = load_combos[frame_id][selected_lc]
-                report_item = OutputItem()
-                report_item.frame_id = frame_id
-                report_item.group_name = group_name
-                report_item.conn_type = cont_type
-                report_item.load_combo = selected_lc
-                report_item.section_name = section_name
-
-                if cont_type == "Moment End Plate":
-                    axis = compliance_check.get_alignment(lines, nodes, frame_id)
-                    con_list = [
-                        "MEP 70%/35% (Moment/Shear)",
-                        "MEP 100%/50% (Moment/Shear)",
-                    ]
-                    design_result[group_name] = con_list[0]
-
-                    for index, current_conin in enumerate(con_list):
-                        capacity = current_conin
-                        color, report_item = compliance_check.moment_end_plate_check(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                            axis,
-                        )
-                        if report_item.check == "OK":
-                            if index > selected_con_index:
-                                selected_con_index = index
-                                design_result[group_name] = con_list[index]
-                            break
-
-                if cont_type == "Web Cleat":
-                    con_list = ["Web Cleat 30%", "Web Cleat 40%"]
-                    design_result[group_name] = con_list[0]
-
-                    for index, current_conin in enumerate(con_list):
-                        capacity = current_conin
-
-                        color, report_item = compliance_check.web_cope(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                        )
-                        if report_item.check == "OK":
-                            if index > selected_con_index:
-                                selected_con_index = index
-                                design_result[group_name] = con_list[index]
-                            break
-
-                if cont_type == "Base Plate":
-                    con_list = [
-                        "Base Plate 15%",
-                        "Base Plate 30%",
-                        "Base Plate 50%",
-                        "Base Plate 80%",
-                    ]
-                    design_result[group_name] = con_list[0]
-
-                    for index, current_conin in enumerate(con_list):
-                        capacity = current_conin
-
-                        color, report_item = compliance_check.base_plate(
-                            frame_con_capacity,
-                            section_name,
-                            report_item,
-                            capacity,
-                            load,
-                            nodes,
-                        )
-                        if report_item.check == "OK":
-                            if index > selected_con_index:
-                                selected_con_index = index
-                                design_result[group_name] = con_list[index]
-                            break
-
-                if report_item.check == "Not OK":
-                    non_compliant_members[group_name].append(frame_id)
-
-                output_items.append(report_item)
-                if color:
-                    frame_by_group.update({frame_id: {"material": color}})
-    output_items_serialized = [output_item.model_dump() for output_item in output_items]
-   
-    return sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc,design_result,non_compliant_members
 
 # Controller
 class Controller(vkt.Controller):
@@ -240,10 +89,13 @@ class Controller(vkt.Controller):
     parametrization = Parametrization
 
     @vkt.GeometryView("3D model", duration_guess=10, x_axis_to_right=True)
+    @profiled("generate_structure")
     def generate_structure(self, params, **kwargs):
         xlsx_file = params.step_1.tab_1.csv_file
         file_content = xlsx_file.file.getvalue_binary()
-        nodes, lines, groups, sections, load_combos = get_entities(file_content)
+        file_hash = content_hash(file_content)
+        with stage("load model"):
+            nodes, lines, groups, sections, load_combos, topology = load_entities(file_content, file_hash)
 
         frame_by_group = {}
         groups_conn_props = {}
@@ -264,16 +116,16 @@ class Controller(vkt.Controller):
                     frame_by_group[frames_in_groups] = {"material": material}
                     frame_color_set.add(frames_in_groups)
 
-        sections_group = render_model(
-            sections=sections,
-            lines=lines,
-            nodes=nodes,
-            frame_by_group=frame_by_group,
-            color_function=colors_by_group,
-        )
-        return vkt.GeometryResult(sections_group)
+        # The geometry is built once per file, only the colors are applied here
+        with stage("geometry"):
+            geometry = load_geometry(file_hash, sections, lines, nodes)
+        with stage("glb", members=len(geometry.frame_ids)):
+            colors = frame_colors(geometry.frame_ids, frame_by_group, colors_by_group)
+            glb = geometry.glb(colors)
+        return vkt.GeometryResult(vkt.File.from_data(glb), geometry_type="gltf")
 
     @vkt.GeometryView("3D model", duration_guess=10, x_axis_to_right=True)
+    @profiled("connection_check")
     def connection_check(self, params, **kwargs):
         if params.step_1.tab_1.mode == "Connection Check":
             cont_type = params.step_1.tab_1.connections
@@ -284,47 +136,54 @@ class Controller(vkt.Controller):
             cont_type = params.step_1.tab_1.connections
             lc = params.step_2.load_combos
             xlsx_file = params.step_1.tab_1.csv_file
-            sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc,design_result,non_compliant_members  = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
-
-        sections_group = render_model(
-            sections=sections,
-            lines=lines,
-            nodes=nodes,
-            frame_by_group=frame_by_group,
-            color_function=colors_by_group,
-        )
-        sections_group, labels = render_legend(sections_group=sections_group)
-        return vkt.GeometryResult(sections_group, labels)
+            sections, lines,nodes,frame_by_group,results,selected_lc,design_result,non_compliant_members,driving_members = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
+
+        file_hash = content_hash(xlsx_file.file.getvalue_binary())
+        with stage("geometry"):
+            geometry = load_geometry(file_hash, sections, lines, nodes)
+        with stage("glb", members=len(geometry.frame_ids)):
+            colors = frame_colors(geometry.frame_ids, frame_by_group, colors_by_group)
+            glb = geometry.glb(colors, legend=True)
+        labels = legend_entries()[1]
+        return vkt.GeometryResult(vkt.File.from_data(glb), labels, geometry_type="gltf")
 
     @vkt.TableView("Frame Results")
+    @profiled("results_table_view")
     def results_table_view(self, params, **kwargs):
         cont_type = params.step_1.tab_1.connections
         lc = params.step_2.load_combos
         xlsx_file = params.step_1.tab_1.csv_file
 
         if params.step_1.tab_1.mode == "Connection Check":
-            sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc = connection_checks(file=xlsx_file,cont_types=cont_type,lc=lc)
+            sections, lines,nodes,frame_by_group,results,selected_lc = connection_checks(file=xlsx_file,cont_types=cont_type,lc=lc)
 
         if params.step_1.tab_1.mode == "Connection Design":
-            sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc,design_result,non_compliant_members = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
-
-        report = ReportData()
-        report_items = [OutputItem.model_validate(item) for item in output_items_serialized]
-        report.table = report_items
-        report_dict = report.serialize()
-        frame_result_list = report_dict["table"]
-        data = []
-
-        for results_dict in frame_result_list:
-            row = list(results_dict.values())
-            if results_dict["check"] == "Not OK":
-                row[-1] = vkt.TableCell("Not OK", background_color=vkt.Color.from_hex("#FF6347"))
-            else:
-                row[-1] = vkt.TableCell("OK", background_color=vkt.Color.from_hex("#98FB98"))
-            data.append(row)
+            sections, lines,nodes,frame_by_group,results,selected_lc,design_result,non_compliant_members,driving_members = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
+
+        with stage("table rows", frames=len(results)):
+            rows = results.select(
+                groups=params.step_2.table_groups,
+                sections=params.step_2.table_sections,
+                conn_types=params.step_2.table_conn_types,
+                checks=params.step_2.table_checks,
+                order=params.step_2.table_order or CHECK_ORDER,
+                limit=params.step_2.table_limit,
+            )
+            data = []
+            for row in results.table_rows(rows):
+                if row[-1] == "Not OK":
+                    row[-1] = vkt.TableCell("Not OK", background_color=vkt.Color.from_hex("#FF6347"))
+                elif row[-1] == "OK":
+                    row[-1] = vkt.TableCell("OK", background_color=vkt.Color.from_hex("#98FB98"))
+                else:
+                    # Frames the engines could not check are not reported as compliant
+                    row[-1] = vkt.TableCell(UNCHECKED_LABEL, background_color=vkt.Color.from_hex("#D3D3D3"))
+                data.append(row)
+            note(rows=len(data))
 
         return vkt.TableResult(data, column_headers=report_headers)
 
+    @profiled("generate_report")
     def generate_report(self, params, **kwargs):
         components = []
         cont_type = params.step_1.tab_1.connections
@@ -334,17 +193,15 @@ class Controller(vkt.Controller):
         con_summary_list = ConnectionSummaryList()
 
         if params.step_1.tab_1.mode == "Connection Check":
-            sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc = connection_checks(file=xlsx_file,cont_types=cont_type,lc=lc)
+            sections, lines,nodes,frame_by_group,results,selected_lc = connection_checks(file=xlsx_file,cont_types=cont_type,lc=lc)
         if params.step_1.tab_1.mode == "Connection Design":
-            sections, lines,nodes,frame_by_group,output_items_serialized,selected_lc,design_result,non_compliant_members = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
-            con_summary_list.parse_from_dict(design_result)
+            sections, lines,nodes,frame_by_group,results,selected_lc,design_result,non_compliant_members,driving_members = connection_design(file=xlsx_file,cont_types=cont_type,lc=lc)
+            con_summary_list.parse_from_dict(design_result, driving_members)
             comp_summary_list.parse_from_dict(non_compliant_members)
 
 
         report = ReportData()
         report.load_combo = params.step_2.load_combos
-        report_items = [OutputItem.model_validate(item) for item in output_items_serialized]
-        report.table = report_items
 
         template_path = Path(__file__).parent / "library" / "templates" / "report_template.docx"
 
@@ -357,10 +214,59 @@ class Controller(vkt.Controller):
 
             template_path = Path(__file__).parent / "library" / "templates" / "report_template_design.docx"
 
+        # The frame table is not rendered by the template engine, its rows are written after rendering
         for key, vals in report.serialize().items():
-            components.append(WordFileTag(key, vals))
+            if key != "table":
+                components.append(WordFileTag(key, vals))
 
-        with open(template_path, "rb") as template:
-            word_file = render_word_file(template, components)
-        return DownloadResult(word_file, "Full Calculation Report.docx")
+        # Snapshots of the colored model, for the whole building and per group
+        with stage("report snapshots"):
+            snapshots = report_snapshots(lines, nodes, frame_by_group, results.group_frames())
+        for key, image in snapshots.items():
+            components.append(WordFileImage(io.BytesIO(image), key, width=REPORT_IMAGE_WIDTH))
+
+        with stage("render_word_file"):
+            template = load_template(template_path)
+            word_file = render_word_file(io.BytesIO(template.content), components)
+
+        if params.step_2.report_table == REPORT_TABLE_APPENDIX:
+            # The docx keeps the summaries, the full frame table goes to the xlsx next to it
+            with stage("report table", rows=0):
+                report_file = template.fill_table(word_file.getvalue_binary(), [])
+            with stage("appendix", rows=len(results)):
+                appendix = table_workbook(results.records(), report_headers)
+            return DownloadResult(
+                zipped_files={
+                    "Full Calculation Report.docx": io.BytesIO(report_file),
+                    "Frame Results.xlsx": io.BytesIO(appendix),
+                },
+                file_name="Full Calculation Report.zip",
+            )
+
+        with stage("report table", rows=len(results)):
+            report_file = template.fill_table(word_file.getvalue_binary(), results.records())
+        return DownloadResult(report_file, "Full Calculation Report.docx")
+
+    @vkt.TableView("Pipeline Profile")
+    def profile_view(self, params, **kwargs):
+        """Stages of the last profiled request of this process, shown when ETABS_PROFILE is set."""
+        record = last_request()
+        headers = ["Stage", "Wall time [s]", "CPU time [s]", "Peak memory [MB]", "Counts"]
+        if record is None:
+            message = "Set ETABS_PROFILE=1 to profile the views" if not PROFILE else "No request profiled yet"
+            return vkt.TableResult([[message, "-", "-", "-", "-"]], column_headers=headers)
+
+        request = f"{record['request']} ({record['time']})"
+        data = [[request, record["wall_s"], record["cpu_s"], record.get("peak_mb", "-"), "-"]]
+        for stage_record in record["stages"]:
+            counts = {
+                key: value
+                for key, value in stage_record.items()
+                if key not in {"stage", "depth", "wall_s", "cpu_s", "peak_mb"}
+            }
+            name = "    " * stage_record["depth"] + stage_record["stage"]
+            counts_text = ", ".join(f"{key}={value}" for key, value in counts.items()) or "-"
+            peak = stage_record.get("peak_mb", "-")
+            data.append([name, stage_record["wall_s"], stage_record["cpu_s"], peak, counts_text])
+        return vkt.TableResult(data, column_headers=headers)
     
\ No newline at end of file
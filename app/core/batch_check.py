@@ -0,0 +1,376 @@
+"""
+Vectorized compliance checks for all frames of a connection type at once.
+
+Every engine takes the load rows of all frames concatenated in the order the per-frame functions of
+`compliance_check` iterate them (joint by joint, sheet order within a joint) plus `owner`, the frame
+position of each row. Capacities are arrays with one value per frame, NaN when the section has no
+capacity for the selected tier. The results reproduce `moment_end_plate_check`, `web_cope` and
+`base_plate`, including the stop at the first failing entry.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import viktor as vkt
+
+from app.core.forces import FORCE_COMPONENTS
+from app.core.local_axes import to_local
+
+F1, F2, F3, M1, M2, M3 = range(len(FORCE_COMPONENTS))
+# Columns of `to_local`
+LOCAL_P, LOCAL_V2, LOCAL_V3, LOCAL_T, LOCAL_M2, LOCAL_M3 = range(len(FORCE_COMPONENTS))
+
+# Values of BatchResult.status
+UNCHECKED = -1
+NOT_OK = 0
+OK = 1
+
+# Color used by the per-frame functions when the section has no capacity for the selected tier
+MISSING_CAPACITY_COLOR = (200, 0, 0)
+
+# Load combination option that checks every combination and reports the governing one per frame
+ENVELOPE_COMBO = "Envelope (all combinations)"
+
+
+class BatchResult(NamedTuple):
+    """Per-frame results, NaN where the per-frame functions leave the OutputItem field as None."""
+
+    V: np.ndarray
+    M: np.ndarray
+    P: np.ndarray
+    Vn: np.ndarray
+    Mn: np.ndarray
+    Pn: np.ndarray
+    capacity_ratio: np.ndarray
+    status: np.ndarray
+    governing_row: np.ndarray  # Index into the load rows, -1 when no row governs
+    missing_capacity: np.ndarray
+    max_ratio: np.ndarray  # Highest capacity ratio over all the rows, NaN when no row has one
+
+    @classmethod
+    def empty(cls, n_frames: int) -> "BatchResult":
+        nan = lambda: np.full(n_frames, np.nan)  # noqa: E731
+        return cls(
+            V=nan(),
+            M=nan(),
+            P=nan(),
+            Vn=nan(),
+            Mn=nan(),
+            Pn=nan(),
+            capacity_ratio=nan(),
+            status=np.full(n_frames, UNCHECKED, dtype=np.int8),
+            governing_row=np.full(n_frames, -1, dtype=np.int64),
+            missing_capacity=np.zeros(n_frames, dtype=bool),
+            max_ratio=nan(),
+        )
+
+    def take(self, positions: np.ndarray) -> "BatchResult":
+        """Results of the owners at `positions`."""
+        return BatchResult(*(values[positions] for values in self))
+
+    def records(self) -> list[dict]:
+        """OutputItem fields of every frame, with None in place of NaN."""
+        fields = ["V", "M", "P", "Vn", "Mn", "Pn", "capacity_ratio"]
+        columns = [[None if value != value else value for value in getattr(self, field).tolist()] for field in fields]
+        checks = self.check_labels()
+        return [dict(zip(fields, values), check=check) for *values, check in zip(*columns, checks)]
+
+    def check_labels(self) -> list[str | None]:
+        return [{OK: "OK", NOT_OK: "Not OK"}.get(status) for status in self.status.tolist()]
+
+    def colors(self) -> list:
+        """Color of every frame, as returned by the per-frame functions (None when the frame was not checked)."""
+        ratio = self.capacity_ratio
+        with np.errstate(invalid="ignore"):
+            codes = np.where(ratio < 1.0, 0, np.where((ratio >= 1.0) & (ratio <= 1.1), 1, 2))
+        palette = [(0, 255, 0), (255, 165, 0), (255, 0, 0)]
+        colors = []
+        for code, missing, has_ratio in zip(
+            codes.tolist(), self.missing_capacity.tolist(), (~np.isnan(ratio)).tolist()
+        ):
+            if missing:
+                colors.append(vkt.Color(*MISSING_CAPACITY_COLOR))
+            elif has_ratio:
+                colors.append(palette[code])
+            else:
+                colors.append(None)
+        return colors
+
+
+class EnvelopeResult(NamedTuple):
+    """
+    Governing load combination of every frame over all combinations.
+    - result: BatchResult of each frame for its governing combo.
+    - governing_combo: Name of the combo with the highest capacity ratio, None if no combo could be checked.
+    - margin: Governing ratio minus the ratio of the next-worst combo, NaN with fewer than two checked combos.
+    - ratios: (frames, combos) highest capacity ratio of every pair over all its rows, NaN where not checked.
+
+    Combos are ranked on `BatchResult.max_ratio`, not on the reported `capacity_ratio`, which for Web Cleat and
+    Base Plate is the ratio of the last row visited. A failure without a ratio governs over any ratio.
+    """
+
+    result: BatchResult
+    governing_combo: list[str | None]
+    margin: np.ndarray
+    ratios: np.ndarray
+
+    @classmethod
+    def reduce(cls, pairs: BatchResult, n_frames: int, combos: list[str]) -> "EnvelopeResult":
+        """Reduce a BatchResult whose owners are the (frame, combo) pairs in frame-major order."""
+        n_combos = len(combos)
+        ratios = pairs.max_ratio.reshape(n_frames, n_combos)
+        failed = (pairs.status == NOT_OK).reshape(n_frames, n_combos)
+        rank = np.where(np.isnan(ratios), np.where(failed, np.inf, -np.inf), ratios)
+        ranked = np.sort(rank, axis=1)[:, ::-1]
+        has_ratio = (rank > -np.inf).any(axis=1)
+        governing = np.where(has_ratio, np.argmax(rank, axis=1), 0) if n_combos else np.zeros(n_frames, dtype=int)
+
+        margin = np.full(n_frames, np.nan)
+        if n_combos > 1:
+            with np.errstate(invalid="ignore"):
+                finite = np.isfinite(ranked[:, 0]) & np.isfinite(ranked[:, 1])
+                margin = np.where(finite, ranked[:, 0] - ranked[:, 1], np.nan)
+
+        result = pairs.take(np.arange(n_frames) * n_combos + governing) if n_combos else BatchResult.empty(n_frames)
+        governing_combo = [combos[code] if found else None for code, found in zip(governing.tolist(), has_ratio)]
+        return cls(result=result, governing_combo=governing_combo, margin=margin, ratios=ratios)
+
+
+def _first_in_segment(mask: np.ndarray, owner: np.ndarray, n_frames: int) -> np.ndarray:
+    """Row index of the first True row of every frame, -1 if none."""
+    first = np.full(n_frames, -1, dtype=np.int64)
+    rows = np.flatnonzero(mask)
+    # Reverse assignment so the lowest row index of each frame is written last
+    first[owner[rows][::-1]] = rows[::-1]
+    return first
+
+
+def _last_in_segment(mask: np.ndarray, owner: np.ndarray, n_frames: int) -> np.ndarray:
+    """Row index of the last True row of every frame, -1 if none."""
+    last = np.full(n_frames, -1, dtype=np.int64)
+    rows = np.flatnonzero(mask)
+    last[owner[rows]] = rows
+    return last
+
+
+def _segment_max(values: np.ndarray, owner: np.ndarray, n_frames: int, mask: np.ndarray) -> np.ndarray:
+    """Maximum of `values` over the rows of every frame where `mask` holds, 0 if none."""
+    out = np.zeros(n_frames)
+    np.maximum.at(out, owner[mask], values[mask])
+    return out
+
+
+def _segment_nanmax(values: np.ndarray, owner: np.ndarray, n_frames: int, mask: np.ndarray) -> np.ndarray:
+    """Maximum of `values` over the rows of every frame where `mask` holds, ignoring NaN, NaN if none."""
+    out = np.full(n_frames, -np.inf)
+    np.fmax.at(out, owner[mask], values[mask])
+    return np.where(out > -np.inf, out, np.nan)
+
+
+def _governed_by_first_failure(fail: np.ndarray, candidates: np.ndarray, owner: np.ndarray, n_frames: int):
+    """
+    Row reported by the functions that stop at the first failing entry and otherwise keep the last
+    entry they visited (`web_cope`, `base_plate`).
+    """
+    first_fail = _first_in_segment(fail & candidates, owner, n_frames)
+    last = _last_in_segment(candidates, owner, n_frames)
+    return np.where(first_fail >= 0, first_fail, last), first_fail >= 0
+
+
+def moment_end_plate_batch(
+    loads: np.ndarray,
+    owner: np.ndarray,
+    axes: np.ndarray,
+    shear: np.ndarray,
+    moment_top: np.ndarray,
+    moment_bottom: np.ndarray,
+) -> BatchResult:
+    """
+    Batched `moment_end_plate_check`.
+    - loads: (rows, 6) F1..M3 of every load entry.
+    - owner: Frame position of every row, rows of one frame are contiguous.
+    - axes: (frames, 3, 3) local axes of every frame (see `app.core.local_axes`), NaN for members that cannot
+      be transformed.
+    - shear, moment_top, moment_bottom: Per frame capacities.
+    """
+    n_frames = len(axes)
+    result = BatchResult.empty(n_frames)
+    missing = np.isnan(shear) | np.isnan(moment_top) | np.isnan(moment_bottom)
+    result.missing_capacity[:] = missing
+
+    # Rows of frames that cannot be checked are dropped up front
+    valid_row = ~np.isnan(axes).any(axis=(1, 2))[owner] & ~missing[owner]
+    local = to_local(loads, axes[owner])
+    V2 = local[:, LOCAL_V2]
+    M3 = local[:, LOCAL_M3]
+    abs_V2, abs_M3 = np.abs(V2), np.abs(M3)
+    S, Mt, Mb = shear[owner], moment_top[owner], moment_bottom[owner]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        neg = valid_row & (M3 <= 0)
+        pos = valid_row & (M3 > 0)
+        moment_capacity = np.where(neg, Mb, Mt)
+        ratio = np.maximum(abs_V2 / S, abs_M3 / moment_capacity)
+        fail = (neg & ~((abs_V2 < S) & (abs_M3 < Mb))) | (pos & ~((abs_V2 < S) & (abs_M3 < Mt)))
+
+    n_rows = len(owner)
+    first_fail = _first_in_segment(fail, owner, n_frames)
+    failed = first_fail >= 0
+    # Rows visited before the loop stops (the failing row is recorded before the break)
+    limit = np.where(failed, first_fail, n_rows)
+    visited = valid_row & (np.arange(n_rows) <= limit[owner])
+
+    max_M = _segment_max(np.nan_to_num(abs_M3), owner, n_frames, visited)
+    result.M[:] = np.where(max_M > 0, max_M, np.nan)
+    any_shear = _segment_max(np.nan_to_num(abs_V2), owner, n_frames, visited) > 0
+    result.Vn[:] = np.where(any_shear, shear, np.nan)
+
+    # Frames without a failing entry report the maximum ratio of their OK entries. Their check is
+    # set by any entry with M3 <= 0, or by an entry with M3 > 0 that raises the maximum ratio
+    ok_rows = (neg | pos) & ~fail
+    max_ratio = _segment_max(np.nan_to_num(ratio), owner, n_frames, ok_rows)
+    best_row = _first_in_segment(ok_rows & (ratio == max_ratio[owner]) & (max_ratio[owner] > 0), owner, n_frames)
+    has_neg = _first_in_segment(neg, owner, n_frames) >= 0
+    checked_ok = ~failed & (has_neg | (max_ratio > 0))
+
+    fail_rows = first_fail[failed]
+    result.capacity_ratio[failed] = ratio[fail_rows]
+    result.Mn[failed] = np.where(neg[fail_rows], moment_bottom[failed], moment_top[failed])
+    result.status[failed] = NOT_OK
+    result.governing_row[failed] = fail_rows
+
+    result.capacity_ratio[:] = np.where(~failed & (max_ratio > 0), max_ratio, result.capacity_ratio)
+    result.Mn[:] = np.where(checked_ok, moment_top, result.Mn)
+    result.status[checked_ok] = OK
+    result.governing_row[:] = np.where(~failed, best_row, result.governing_row)
+
+    result.max_ratio[:] = _segment_nanmax(ratio, owner, n_frames, neg | pos)
+    result.status[missing] = NOT_OK
+    return result
+
+
+def web_cleat_batch(loads: np.ndarray, owner: np.ndarray, shear: np.ndarray) -> BatchResult:
+    """
+    Batched `web_cope`.
+    - loads: (rows, 6) F1..M3 of every load entry.
+    - owner: Frame position of every row, rows of one frame are contiguous.
+    - shear: Per frame shear capacity.
+    """
+    n_frames = len(shear)
+    result = BatchResult.empty(n_frames)
+    missing = np.isnan(shear)
+    result.missing_capacity[:] = missing
+
+    candidates = ~missing[owner]
+    abs_F3 = np.abs(loads[:, F3])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fail = ~(abs_F3 < shear[owner])
+        ratio = abs_F3 / shear[owner]
+    governing, failed = _governed_by_first_failure(fail, candidates, owner, n_frames)
+
+    checked = governing >= 0
+    rows = governing[checked]
+    result.V[checked] = abs_F3[rows]
+    result.Vn[checked] = shear[checked]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result.capacity_ratio[checked] = abs_F3[rows] / shear[checked]
+    result.status[checked] = np.where(failed[checked], NOT_OK, OK)
+    result.governing_row[:] = governing
+    result.max_ratio[:] = _segment_nanmax(ratio, owner, n_frames, candidates)
+
+    result.status[missing] = NOT_OK
+    return result
+
+
+def base_plate_batch(
+    loads: np.ndarray, owner: np.ndarray, is_base: np.ndarray, shear: np.ndarray, axial: np.ndarray
+) -> BatchResult:
+    """
+    Batched `base_plate`.
+    - loads: (rows, 6) F1..M3 of every load entry.
+    - owner: Frame position of every row, rows of one frame are contiguous.
+    - is_base: Per row flag, True when the joint of the row sits at z == 0.
+    - shear, axial: Per frame capacities.
+    """
+    n_frames = len(shear)
+    result = BatchResult.empty(n_frames)
+    missing = np.isnan(shear) | np.isnan(axial)
+    result.missing_capacity[:] = missing
+
+    candidates = is_base & ~missing[owner]
+    abs_F3 = np.abs(loads[:, F3])
+    ultimate_shear = np.maximum(np.abs(loads[:, F1]), np.abs(loads[:, F2]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fail = ~((abs_F3 < axial[owner]) & (ultimate_shear < shear[owner]))
+        ratio = np.maximum(abs_F3 / axial[owner], ultimate_shear / shear[owner])
+    governing, failed = _governed_by_first_failure(fail, candidates, owner, n_frames)
+
+    checked = governing >= 0
+    rows = governing[checked]
+    result.P[checked] = abs_F3[rows]
+    result.V[checked] = ultimate_shear[rows]
+    result.Pn[checked] = axial[checked]
+    result.Vn[checked] = shear[checked]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result.capacity_ratio[checked] = np.maximum(
+            abs_F3[rows] / axial[checked], ultimate_shear[rows] / shear[checked]
+        )
+    result.status[checked] = np.where(failed[checked], NOT_OK, OK)
+    result.governing_row[:] = governing
+    result.max_ratio[:] = _segment_nanmax(ratio, owner, n_frames, candidates)
+
+    result.status[missing] = NOT_OK
+    return result
+
+
+# Capacity quantities read from the library for every connection type
+CONNECTION_QUANTITIES = {
+    "Moment End Plate": ["Shear", "MomentTop", "MomentBottom"],
+    "Web Cleat": ["Shear"],
+    "Base Plate": ["Shear", "Axial"],
+}
+
+
+def joint_elevations(load_combos, nodes: dict) -> np.ndarray:
+    """Z coordinate of every joint of the ForceStore, NaN for joints that are not in `nodes`."""
+    return np.array([nodes[joint]["z"] if joint in nodes else np.nan for joint in load_combos.joint_ids.tolist()])
+
+
+def evaluate_pairs(
+    cont_type: str,
+    load_combos,
+    frame_ids,
+    caps: dict[str, np.ndarray],
+    axes: np.ndarray,
+    joint_z: np.ndarray,
+    combo_codes,
+) -> BatchResult:
+    """
+    Run the engine of `cont_type` for every (frame, combo) pair, frame-major: the result of frame `i`
+    with the `k`-th entry of `combo_codes` is at position `i * len(combo_codes) + k`.
+    - caps: Per frame capacity arrays, keyed by the quantities of CONNECTION_QUANTITIES.
+    - axes: Per frame local axes (see `Topology.axes_of`), only used by Moment End Plate.
+    - joint_z: Per store joint elevation (see `joint_elevations`), only used by Base Plate.
+    `governing_row` of the result indexes the rows of `load_combos`.
+    """
+    n_frames, n_combos = len(frame_ids), len(combo_codes)
+    pair_frames = np.repeat(np.arange(n_frames), n_combos)
+    pair_combos = np.tile(np.asarray(combo_codes, dtype=np.int64), n_frames)
+    rows, owner = load_combos.gather_codes(np.asarray(frame_ids)[pair_frames], pair_combos)
+    loads = load_combos.values[rows]
+    pair_caps = {quantity: values[pair_frames] for quantity, values in caps.items()}
+
+    if cont_type == "Moment End Plate":
+        result = moment_end_plate_batch(
+            loads, owner, axes[pair_frames], pair_caps["Shear"], pair_caps["MomentTop"], pair_caps["MomentBottom"]
+        )
+    elif cont_type == "Web Cleat":
+        result = web_cleat_batch(loads, owner, pair_caps["Shear"])
+    elif cont_type == "Base Plate":
+        is_base = joint_z[load_combos.joint_codes[rows]] == 0
+        result = base_plate_batch(loads, owner, is_base, pair_caps["Shear"], pair_caps["Axial"])
+    else:
+        raise ValueError(f"Unknown connection type '{cont_type}'")
+
+    result.governing_row[:] = np.where(result.governing_row >= 0, rows[result.governing_row], -1)
+    return result
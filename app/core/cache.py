@@ -0,0 +1,328 @@
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from app.core.profiling import note
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the cached objects changes, so stale disk entries are ignored
+CACHE_VERSION = 4
+
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("ETABS_CACHE_MAX_BYTES", 512 * 1024**2))
+MODEL_CACHE_DISK_BYTES = int(os.environ.get("ETABS_CACHE_DISK_BYTES", 4 * 1024**3))
+# The disk store is unpickled, so it lives in a directory of the current user only (see `private_directory`)
+_USER_SUFFIX = f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+MODEL_CACHE_DIR = os.environ.get(
+    "ETABS_CACHE_DIR", str(Path(tempfile.gettempdir()) / f"etabs_connection_designer{_USER_SUFFIX}")
+)
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("ETABS_RESULT_CACHE_MAX_BYTES", 128 * 1024**2))
+
+
+def content_hash(file_content: bytes) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def result_key(*parts) -> str:
+    """Key of a result from its (hashable, deterministic repr) inputs."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def private_directory(path: str | Path) -> Path | None:
+    """
+    `path` as a directory that only the current user can access, created with mode 0o700 if needed. None when it
+    is not one and cannot be made one (another user's directory, a symlink): the caches unpickle the files they
+    read from it, so no other user may be able to write there.
+    """
+    path = Path(path)
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = path.lstat()
+        if not stat.S_ISDIR(info.st_mode):
+            return None
+        if hasattr(os, "getuid"):
+            if info.st_uid != os.getuid():
+                return None
+            if info.st_mode & 0o077:
+                path.chmod(0o700)
+    except OSError:
+        return None
+    return path
+
+
+def estimate_size(value) -> int:
+    """
+    Memory held by a cache entry: the bytes of its arrays plus the size of the other objects it refers to.
+    Memory-mapped arrays are left out, their pages belong to the file.
+    """
+    seen = set()
+    pending = [value]
+    size = 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            if not isinstance(item, np.memmap) and not isinstance(item.base, np.memmap):
+                size += item.nbytes
+            if item.dtype.hasobject:
+                pending.extend(item.ravel().tolist())
+            continue
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            pending.append(item.__dict__)
+    return size
+
+
+class ModelCache:
+    """
+    Process-wide LRU cache for parsed models, keyed by the hash of the uploaded bytes.
+    - max_bytes: Memory budget, with the size of each entry estimated by `estimate_size`.
+    - cache_dir: Every entry is also written here so it survives worker restarts. Empty disables the disk store,
+      as does a directory that is not private to the current user (see `private_directory`).
+    - max_disk_bytes: Budget of the disk store, the least recently written files are removed first.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: str | Path | None = None, max_disk_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        self._cache_dir_checked = False
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = threading.RLock()
+        self._pending = {}  # key -> Future of the entry being created
+        self._executor = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def cache_dir(self) -> Path | None:
+        """Directory of the disk store, checked on first use. None when the disk store is disabled."""
+        if not self._cache_dir_checked:
+            directory = self._cache_dir
+            self._cache_dir = private_directory(directory) if directory is not None else None
+            if directory is not None and self._cache_dir is None:
+                logger.warning("Cache directory %s is not private to this user, the disk store is disabled", directory)
+            self._cache_dir_checked = True
+        return self._cache_dir
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"v{CACHE_VERSION}-{key}.pkl"
+
+    def artifact_path(self, key: str, name: str) -> Path | None:
+        """
+        Directory next to the entry `key` for data an entry refers to instead of pickling it (memory-mapped
+        arrays), pruned with the entries. None when the disk store is disabled.
+        """
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"v{CACHE_VERSION}-{key}-{name}"
+
+    def _disk_entries(self, pattern: str) -> list[tuple[Path, int, float]]:
+        """Entry files and artifact directories matching `pattern`, with their size and modification time."""
+        entries = []
+        for path in self.cache_dir.glob(pattern):
+            if path.suffix == ".tmp":
+                continue  # Still being written
+            try:
+                if path.is_dir():
+                    size = sum(child.stat().st_size for child in path.iterdir())
+                elif path.suffix == ".pkl":
+                    size = path.stat().st_size
+                else:
+                    continue
+                entries.append((path, size, path.stat().st_mtime))
+            except OSError:
+                continue
+        return entries
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        if path.is_dir():
+            # Directories that are still mapped by a process cannot be removed on every platform
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    def _read_disk(self, key: str):
+        if self.cache_dir is None:
+            return None, 0
+        path = self._path(key)
+        try:
+            value = pickle.loads(path.read_bytes())
+            return value, estimate_size(value)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None, 0
+
+    def _write_disk(self, key: str, payload: bytes) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except OSError:
+            pass  # The disk store is best effort, the memory cache still works
+
+    def _prune_disk(self) -> None:
+        if self.max_disk_bytes is None:
+            return
+        entries = sorted(self._disk_entries("*"), key=lambda entry: entry[2], reverse=True)
+        total = 0
+        for path, size, _ in entries:
+            total += size
+            if total > self.max_disk_bytes:
+                self._remove(path)
+
+    def _store(self, key: str, value, size: int) -> None:
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._size += size
+        # Keep at least the newest entry, even when it is larger than the budget on its own
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def get(self, key: str):
+        """Return the cached value, or None. Disk entries are promoted back into memory."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            value, size = self._read_disk(key)
+            if value is not None:
+                self._store(key, value, size)
+                self.disk_hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            self._store(key, value, size)
+        # Pickled and written outside the lock, so other entries stay available meanwhile
+        if self.cache_dir is not None:
+            self._write_disk(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _create(self, key: str, factory: callable, pending: Future):
+        try:
+            value = self.get(key)
+            created = value is None
+            if created:
+                value = factory()
+            # Release the callers waiting on this entry before paying for the disk write
+            pending.set_result(value)
+            if created:
+                self.put(key, value)
+            return value
+        except BaseException as exc:
+            if not pending.done():
+                pending.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def get_or_create(self, key: str, factory: callable):
+        """
+        Return the cached value, or create it with `factory`. A caller asking for an entry that is already
+        being created (by another thread or by `prefetch`) waits for that result instead of creating it again.
+        """
+        with self._lock:
+            if key in self._entries:
+                note(cache_hits=1)
+                return self.get(key)
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+        if owner:
+            note(cache_misses=1)
+            return self._create(key, factory, pending)
+        note(cache_waits=1)
+        return pending.result()
+
+    def prefetch(self, key: str, factory: callable) -> None:
+        """Start creating an entry in a background thread, unless it is in memory or already being created."""
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            pending = self._pending[key] = Future()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-cache-prefetch")
+        # Failures are kept in the Future and raised again in the callers attached to it
+        self._executor.submit(self._create, key, factory, pending)
+
+    def peek(self, key: str):
+        """Return the value if it is in memory, without touching the disk, the LRU order or the statistics."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            if disk and self.cache_dir is not None:
+                for path, *_ in self._disk_entries(f"v{CACHE_VERSION}-*"):
+                    self._remove(path)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class ResultCache(ModelCache):
+    """
+    Memory-only cache of check and design results, so the views of one request do not repeat the pipeline.
+    The entries depend on the capacity library: `bind` empties the cache when its fingerprint changes.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self.fingerprint = None
+
+    def bind(self, fingerprint: str) -> None:
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self.clear()
+                self.fingerprint = fingerprint
+
+
+model_cache = ModelCache(MODEL_CACHE_MAX_BYTES, MODEL_CACHE_DIR, MODEL_CACHE_DISK_BYTES)
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
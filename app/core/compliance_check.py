@@ -1,9 +1,11 @@
+import numpy as np
 import viktor as vkt
+from app.core.local_axes import direction_cosines
 from app.core.render import get_color_for_ratio
 
 
 def moment_end_plate_check(
-    frame_con_capacity: dict, section_name: str, report_item: any, capacity: str, load: dict, axis: str
+    frame_con_capacity: dict, section_name: str, report_item: any, capacity: str, load: dict, axes: np.ndarray
 ):
     """
     Arguments:
@@ -12,6 +14,7 @@ def moment_end_plate_check(
     - report_item: Used for output reporting.
     - capacity: Key for shear and moment strength.
     - load: Contains force/moment components (F1, F2, F3, M1, M2, M3).
+    - axes: Local axes of the frame, see `get_local_axes`.
     """
     report_item.section_name = section_name
 
@@ -26,7 +29,7 @@ def moment_end_plate_check(
     found_break = False
     for node, list_load in load.items():
         for load_item in list_load:
-            gloab_load_dict = transform_global_to_local(load_item, axis)
+            gloab_load_dict = transform_global_to_local(load_item, axes)
             M3 = gloab_load_dict["M3"]
             V2 = gloab_load_dict["V2"]
             # Record loads
@@ -176,58 +179,28 @@ def base_plate(frame_con_capacity: dict, section_name: str, report_item: any, ca
     return color, report_item
 
 
-def get_alignment(lines: dict, nodes: dict, frame_id: int) -> str:
-    node_id_i = lines[frame_id]["nodeI"]
-    node_id_j = lines[frame_id]["nodeJ"]
-    node_i = nodes[node_id_i]
-    node_j = nodes[node_id_j]
-
-    is_x_axis = (node_i["y"] == node_j["y"]) and (node_i["z"] == node_j["z"])
-    is_y_axis = (node_i["x"] == node_j["x"]) and (node_i["z"] == node_j["z"])
-    if is_x_axis:
-        dir_axis = node_j["x"] - node_i["x"]
-        if dir_axis > 0:
-            return "+X"
-        else:
-            return "-X"
-    elif is_y_axis:
-        dir_axis = node_j["y"] - node_i["y"]
-        if dir_axis > 0:
-            return "+Y"
-        else:
-            return "-Y"
-
-
-def transform_global_to_local(load_item, alignment):
+def get_local_axes(lines: dict, nodes: dict, frame_id: int) -> np.ndarray:
+    """(3, 3) direction cosines of the local axes of a frame, see `app.core.local_axes`."""
+    node_i = nodes[lines[frame_id]["nodeI"]]
+    node_j = nodes[lines[frame_id]["nodeJ"]]
+    start = [node_i["x"], node_i["y"], node_i["z"]]
+    end = [node_j["x"], node_j["y"], node_j["z"]]
+    return direction_cosines(start, end)[0]
+
+
+def transform_global_to_local(load_item, axes):
     """
-    Transforms global forces to local forces for beams aligned along the global X or Y axis.
+    Transforms global forces to local forces for a frame of any orientation.
     - load_item: Dictionary containing global forces and moments with keys 'F1', 'F2', 'F3', 'M1', 'M2', 'M3'.
-    - alignment: String indicating beam alignment, either 'X' or 'Y'.
+    - axes: (3, 3) local axes of the frame, see `get_local_axes`.
     Returns:
     - Dictionary containing local forces and moments: 'P', 'V2', 'V3', 'T', 'M2', 'M3'.
     """
-    F1 = load_item["F1"]
-    F2 = load_item["F2"]
-    F3 = load_item["F3"]
-    M1 = load_item["M1"]
-    M2 = load_item["M2"]
-    M3 = load_item["M3"]
-
-    if alignment == "+Y":
-        P = F2
-        V2 = F3
-        V3 = F1
-        T = M3
-        M2_local = M2
-        M3_local = M1  # this sign needs checking
-    elif alignment == "+X":
-        P = F2
-        V2 = F3
-        V3 = -F1  # this sign needs checking
-        T = M2
-        M2_local = M1
-        M3_local = M2  # this sign needs checking
-    else:
-        raise ValueError("Invalid alignment. Alignment must be 'X' or 'Y'.")
+    if np.isnan(axes).any():
+        raise ValueError("The frame has no local axes, its nodes coincide.")
+    forces = axes @ [load_item["F1"], load_item["F2"], load_item["F3"]]
+    moments = axes @ [load_item["M1"], load_item["M2"], load_item["M3"]]
+    P, V2, V3 = forces.tolist()
+    T, M2_local, M3_local = moments.tolist()
 
     return {"P": P, "V2": V2, "V3": V3, "T": T, "M2": M2_local, "M3": M3_local}
@@ -0,0 +1,89 @@
+"""
+Group-level connection design: the lowest capacity tier that every frame of a group satisfies.
+
+All tiers of a connection type are evaluated in a single batch, by repeating the frames of the group once
+per tier (tier-major) as the owners of `evaluate_pairs`. Tiers are searched in the order of
+`connection_types`, which lists them by increasing nominal capacity. The library capacities are not
+monotonic across tiers for every section, so feasibility is evaluated for all tiers instead of assuming
+that a frame passing one tier passes all the higher ones.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.batch_check import CONNECTION_QUANTITIES, NOT_OK, UNCHECKED, BatchResult, EnvelopeResult
+from app.core.parallel import GroupTask
+from app.library.load_db import connection_types
+
+
+class GroupDesign(NamedTuple):
+    """
+    Design of one group.
+    - tier: Selected tier, the lowest one all frames satisfy (the highest tier when none does).
+    - frame_min_tier: Per frame position in `tiers` of the lowest satisfied tier, -1 if none or if the frame could
+      not be checked.
+    - non_compliant: Per frame flag, True when the frame does not satisfy the selected tier.
+    - drivers: Per frame flag, True for the frames that require the selected tier. None when it is the lowest tier,
+      and the non-compliant frames when no tier is satisfied by all frames.
+    - envelope: Results of every frame with the selected tier (governing combo over the evaluated combos).
+    """
+
+    tier: str | None
+    tiers: list[str]
+    frame_min_tier: np.ndarray
+    non_compliant: np.ndarray
+    drivers: np.ndarray
+    envelope: EnvelopeResult
+
+
+def design_tiers(library, cont_type: str) -> list[str]:
+    """Tiers of a connection type in increasing nominal capacity."""
+    return [tier for tier in connection_types if library.tier_types[library.tier_index[tier]] == cont_type]
+
+
+def design_task(
+    cont_type: str, frame_ids: list[int], section_names: list, library, axes: np.ndarray | None
+) -> tuple[GroupTask, list[str]]:
+    """GroupTask with the frames of the group repeated once per tier, and the tiers in that order."""
+    tiers = design_tiers(library, cont_type)
+    quantities = CONNECTION_QUANTITIES[cont_type]
+    tier_caps = [library.lookup(cont_type, section_names, tier, quantities) for tier in tiers]
+    caps = {quantity: np.concatenate([caps[quantity] for caps in tier_caps]) for quantity in quantities}
+    repeated_axes = np.tile(axes, (len(tiers), 1, 1)) if axes is not None else None
+    task = GroupTask(cont_type, np.tile(np.asarray(frame_ids), len(tiers)), caps, repeated_axes)
+    return task, tiers
+
+
+def select_tier(pairs: BatchResult, tiers: list[str], n_frames: int, combos: list[str]) -> GroupDesign:
+    """
+    Reduce the tier-major, frame-major, combo-minor results of a `design_task` to the group design.
+    A frame satisfies a tier when no checked combo fails, which is the status of its governing combo. Frames that
+    cannot be checked (a Base Plate group member without a joint at z == 0) do not constrain the tier, and are
+    neither non-compliant nor drivers.
+    """
+    n_tiers, n_combos = len(tiers), len(combos)
+    if not n_tiers:
+        empty = EnvelopeResult.reduce(BatchResult.empty(n_frames * n_combos), n_frames, combos)
+        no_frames = np.zeros(n_frames, dtype=bool)
+        return GroupDesign(None, tiers, np.full(n_frames, -1), ~no_frames, no_frames, empty)
+
+    per_tier = [
+        EnvelopeResult.reduce(
+            pairs.take(np.arange(tier * n_frames * n_combos, (tier + 1) * n_frames * n_combos)), n_frames, combos
+        )
+        for tier in range(n_tiers)
+    ]
+    status = np.stack([envelope.result.status for envelope in per_tier])  # (tiers, frames)
+    feasible = status != NOT_OK
+    unchecked = (status == UNCHECKED).all(axis=0)
+
+    group_feasible = feasible.all(axis=1)
+    selected = int(np.argmax(group_feasible)) if group_feasible.any() else n_tiers - 1
+    frame_min_tier = np.where(feasible.any(axis=0) & ~unchecked, np.argmax(feasible, axis=0), -1)
+    non_compliant = ~feasible[selected]
+    if group_feasible.any():
+        drivers = (frame_min_tier == selected) & (selected > 0)
+    else:
+        drivers = non_compliant
+    return GroupDesign(tiers[selected], tiers, frame_min_tier, non_compliant, drivers, per_tier[selected])
@@ -0,0 +1,400 @@
+import json
+import os
+import shutil
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORCE_COMPONENTS = ["F1", "F2", "F3", "M1", "M2", "M3"]
+
+# Arrays written by `ForceStore.save`, one .npy file each, next to the load combinations in combos.json
+MAPPED_ARRAYS = ["frame_ids", "joint_ids", "joint_codes", "values", "slice_keys", "slice_offsets"]
+
+
+class ForceSlice(Mapping):
+    """
+    Rows of one (frame, load combination) pair, sorted by joint.
+    - joint_codes: Joint code of each row, decoded through `joint_ids`.
+    - values: (rows, 6) float array with the F1, F2, F3, M1, M2, M3 columns.
+    Both arrays are views on the parent ForceStore. Iterating the slice as a mapping yields
+    `{joint: [{"F1": ..., "M3": ...}, ...]}`, the layout expected by the compliance functions.
+    """
+
+    __slots__ = ("joint_codes", "values", "joint_ids")
+
+    def __init__(self, joint_codes: np.ndarray, values: np.ndarray, joint_ids: np.ndarray):
+        self.joint_codes = joint_codes
+        self.values = values
+        self.joint_ids = joint_ids
+
+    @property
+    def joints(self) -> np.ndarray:
+        return self.joint_ids[self.joint_codes]
+
+    def _bounds(self):
+        codes = self.joint_codes
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+        return starts, np.r_[starts[1:], len(codes)].astype(np.int64)
+
+    def __getitem__(self, joint):
+        mask = self.joints == joint
+        if not mask.any():
+            raise KeyError(joint)
+        return [dict(zip(FORCE_COMPONENTS, row)) for row in self.values[mask].tolist()]
+
+    def __iter__(self):
+        starts, _ = self._bounds()
+        return iter(self.joint_ids[self.joint_codes[starts]].tolist())
+
+    def __len__(self):
+        return len(self._bounds()[0])
+
+    def items(self):
+        starts, ends = self._bounds()
+        rows = self.values.tolist()
+        joints = self.joint_ids[self.joint_codes[starts]].tolist()
+        for joint, start, end in zip(joints, starts, ends):
+            yield joint, [dict(zip(FORCE_COMPONENTS, row)) for row in rows[start:end]]
+
+
+class FrameForces(Mapping):
+    """Load combinations available for a single frame, mapping combo name -> ForceSlice."""
+
+    __slots__ = ("_store", "_frame_code")
+
+    def __init__(self, store: "ForceStore", frame_code: int):
+        self._store = store
+        self._frame_code = frame_code
+
+    def __getitem__(self, combo):
+        combo_code = self._store.combo_index.get(combo)
+        if combo_code is None:
+            raise KeyError(combo)
+        return self._store.slice_codes(self._frame_code, combo_code)
+
+    def __iter__(self):
+        store = self._store
+        first, last = store.frame_bounds(self._frame_code)
+        combo_codes = store.slice_keys[first:last] % len(store.combos)
+        return iter([store.combos[code] for code in combo_codes])
+
+    def __len__(self):
+        first, last = self._store.frame_bounds(self._frame_code)
+        return last - first
+
+
+class ForceStore(Mapping):
+    """
+    Columnar store of the combination rows of the "Element Joint Forces - Frame" sheet.
+
+    Rows are sorted by (frame, combo, joint) keeping the sheet order within each joint, so every
+    (frame, combo) pair is a contiguous block:
+    - frame_ids / combos / joint_ids: Decoded labels, indexed by the integer codes.
+    - frame_codes / combo_codes / joint_codes: Integer code of each row.
+    - values: (rows, 6) contiguous float64 array with the F1..M3 columns.
+    - slice_keys / slice_offsets: Sorted `frame_code * n_combos + combo_code` of every block and
+      the row offset where it starts (plus a trailing total row count).
+    - raw: The store this one was reduced from by `envelope`, when kept for audit, else None.
+    - path: Directory the arrays are memory-mapped from (see `save` and `open`), else None.
+
+    The store behaves as a read-only `{frame_id: {combo: {joint: [entries]}}}` mapping.
+    """
+
+    def __init__(
+        self,
+        frame_ids: np.ndarray,
+        combos: list[str],
+        joint_ids: np.ndarray,
+        frame_codes: np.ndarray,
+        combo_codes: np.ndarray,
+        joint_codes: np.ndarray,
+        values: np.ndarray,
+    ):
+        self.frame_ids = frame_ids
+        self.combos = list(combos)
+        self.joint_ids = joint_ids
+        self.frame_codes = frame_codes
+        self.combo_codes = combo_codes
+        self.joint_codes = joint_codes
+        self.values = values
+        self.raw = None
+        self.path = None
+        self.combo_index = {combo: code for code, combo in enumerate(self.combos)}
+        self.frame_index = {frame_id: code for code, frame_id in enumerate(self.frame_ids.tolist())}
+
+        keys = frame_codes.astype(np.int64) * max(len(self.combos), 1) + combo_codes
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        self.slice_keys = keys[starts]
+        self.slice_offsets = np.r_[starts, len(keys)].astype(np.int64)
+
+    @classmethod
+    def from_index(
+        cls,
+        frame_ids: np.ndarray,
+        combos: list[str],
+        joint_ids: np.ndarray,
+        joint_codes: np.ndarray,
+        values: np.ndarray,
+        slice_keys: np.ndarray,
+        slice_offsets: np.ndarray,
+    ) -> "ForceStore":
+        """
+        Rebuild a store around existing (for example shared-memory) arrays without re-deriving the block index.
+        The per-row frame and combo codes are not needed to look up blocks and are left out.
+        """
+        store = cls.__new__(cls)
+        store.frame_ids = frame_ids
+        store.combos = list(combos)
+        store.joint_ids = joint_ids
+        store.frame_codes = None
+        store.combo_codes = None
+        store.joint_codes = joint_codes
+        store.values = values
+        store.raw = None
+        store.path = None
+        store.combo_index = {combo: code for code, combo in enumerate(store.combos)}
+        store.frame_index = {frame_id: code for code, frame_id in enumerate(frame_ids.tolist())}
+        store.slice_keys = slice_keys
+        store.slice_offsets = slice_offsets
+        return store
+
+    def save(self, directory: str | Path) -> None:
+        """
+        Write the arrays to `directory` as .npy files, to be memory-mapped by `open`. The directory is written
+        under a temporary name and renamed when complete, an existing directory is kept as it is.
+        """
+        directory = Path(directory)
+        if directory.exists():
+            return
+        tmp_directory = directory.with_name(f"{directory.name}.{os.getpid()}.tmp")
+        tmp_directory.mkdir(parents=True, exist_ok=True)
+        try:
+            for name in MAPPED_ARRAYS:
+                np.save(tmp_directory / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+            (tmp_directory / "combos.json").write_text(json.dumps(self.combos))
+            os.rename(tmp_directory, directory)
+        except OSError:
+            # Another process renamed its copy first, or the disk is full
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            if not directory.exists():
+                raise
+
+    @classmethod
+    def open(cls, directory: str | Path) -> "ForceStore":
+        """
+        Store on the arrays written by `save`, memory-mapped read-only: only the pages a check touches are read,
+        and the processes that open the same directory share them through the page cache.
+        """
+        directory = Path(directory)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in MAPPED_ARRAYS}
+        store = cls.from_index(combos=json.loads((directory / "combos.json").read_text()), **arrays)
+        store.path = str(directory)
+        return store
+
+    def __getstate__(self):
+        # A mapped store pickles as its directory, and maps it again when unpickled
+        if self.path is not None:
+            return {"mapped_path": self.path, "raw": self.raw}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if "mapped_path" in state:
+            state = {**ForceStore.open(state["mapped_path"]).__dict__, "raw": state["raw"]}
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "ForceStore":
+        """Build the store from the "Combination" rows of the forces sheet in one vectorized pass."""
+        frame_codes, frame_ids = pd.factorize(df["Unique Name"], sort=True)
+        combo_cat = pd.Categorical(df["Output Case"], categories=pd.unique(df["Output Case"]))
+        combo_codes = combo_cat.codes.astype(np.int64)
+        joint_codes, joint_ids = pd.factorize(df["Joint"], sort=True)
+        values = df[FORCE_COMPONENTS].apply(pd.to_numeric).to_numpy(dtype=np.float64)
+
+        order = np.lexsort((joint_codes, combo_codes, frame_codes))
+        return cls(
+            frame_ids=np.asarray(frame_ids),
+            combos=list(combo_cat.categories),
+            joint_ids=np.asarray(joint_ids),
+            frame_codes=frame_codes[order],
+            combo_codes=combo_codes[order],
+            joint_codes=joint_codes[order],
+            values=np.ascontiguousarray(values[order]),
+        )
+
+    def envelope(self, frame_mask: np.ndarray | None = None, keep_raw: bool = False) -> "ForceStore":
+        """
+        Reduce the rows of every (frame, combo, joint) to two: the signed maximum and then the signed minimum of
+        each component. Blocks of one or two rows, and blocks with a missing value, are kept as they are.
+        - frame_mask: Per frame code, False for the frames that keep all their rows. All frames by default.
+        - keep_raw: Keep this store as `raw` of the reduced store.
+        """
+        n_combos, n_joints = max(len(self.combos), 1), max(len(self.joint_ids), 1)
+        keys = (self.frame_codes.astype(np.int64) * n_combos + self.combo_codes) * n_joints + self.joint_codes
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        sizes = np.diff(np.r_[starts, len(keys)])
+        reduce = sizes > 2
+        if len(starts):
+            reduce &= ~np.logical_or.reduceat(np.isnan(self.values).any(axis=1), starts)
+        if frame_mask is not None:
+            reduce &= np.asarray(frame_mask, dtype=bool)[self.frame_codes[starts]]
+
+        # Every block keeps 2 rows when reduced and all of its rows otherwise, in the same block order
+        out_sizes = np.where(reduce, 2, sizes)
+        out_starts = np.cumsum(out_sizes) - out_sizes
+        values = np.empty((int(out_sizes.sum()), len(FORCE_COMPONENTS)), dtype=np.float64)
+        if reduce.any():
+            values[out_starts[reduce]] = np.maximum.reduceat(self.values, starts, axis=0)[reduce]
+            values[out_starts[reduce] + 1] = np.minimum.reduceat(self.values, starts, axis=0)[reduce]
+        block = np.repeat(np.arange(len(starts)), sizes)
+        kept = ~reduce[block]
+        values[(out_starts[block] + np.arange(len(keys)) - starts[block])[kept]] = self.values[kept]
+
+        first_rows = np.repeat(starts, out_sizes)
+        store = ForceStore(
+            frame_ids=self.frame_ids,
+            combos=self.combos,
+            joint_ids=self.joint_ids,
+            frame_codes=self.frame_codes[first_rows],
+            combo_codes=self.combo_codes[first_rows],
+            joint_codes=self.joint_codes[first_rows],
+            values=values,
+        )
+        store.raw = self if keep_raw else None
+        return store
+
+    def frame_bounds(self, frame_code: int) -> tuple[int, int]:
+        """Range of `slice_keys` positions that belong to the given frame code."""
+        n_combos = max(len(self.combos), 1)
+        first, last = np.searchsorted(self.slice_keys, [frame_code * n_combos, (frame_code + 1) * n_combos])
+        return int(first), int(last)
+
+    def slice_codes(self, frame_code: int, combo_code: int) -> ForceSlice:
+        key = frame_code * max(len(self.combos), 1) + combo_code
+        pos = int(np.searchsorted(self.slice_keys, key))
+        if pos == len(self.slice_keys) or self.slice_keys[pos] != key:
+            raise KeyError((self.frame_ids[frame_code], self.combos[combo_code]))
+        start, end = self.slice_offsets[pos], self.slice_offsets[pos + 1]
+        return ForceSlice(self.joint_codes[start:end], self.values[start:end], self.joint_ids)
+
+    def gather(self, frame_ids, combo: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of many frames for one load combination, concatenated in the order of `frame_ids`.
+        Returns the row indexes into the store arrays and the position in `frame_ids` each row belongs to.
+        Frames without rows for the combination contribute no rows.
+        """
+        combo_codes = np.full(len(frame_ids), self.combo_index.get(combo, -1), dtype=np.int64)
+        return self.gather_codes(frame_ids, combo_codes)
+
+    def gather_codes(self, frame_ids, combo_codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Same as `gather` for (frame, combo) pairs, with one combo code per entry of `frame_ids` (-1 for none)."""
+        frame_ids = np.asarray(frame_ids)
+        combo_codes = np.asarray(combo_codes, dtype=np.int64)
+        starts = np.zeros(len(frame_ids), dtype=np.int64)
+        counts = np.zeros(len(frame_ids), dtype=np.int64)
+        if len(self.slice_keys) and len(frame_ids):
+            frame_codes = np.searchsorted(self.frame_ids, frame_ids).clip(max=len(self.frame_ids) - 1)
+            known = (self.frame_ids[frame_codes] == frame_ids) & (combo_codes >= 0)
+            keys = frame_codes * max(len(self.combos), 1) + combo_codes
+            pos = np.searchsorted(self.slice_keys, keys).clip(max=len(self.slice_keys) - 1)
+            found = known & (self.slice_keys[pos] == keys)
+            starts[found] = self.slice_offsets[pos[found]]
+            counts[found] = self.slice_offsets[pos[found] + 1] - starts[found]
+
+        owner = np.repeat(np.arange(len(frame_ids)), counts)
+        # Row index = start of the owning block + position inside the block
+        block_offsets = np.cumsum(counts) - counts
+        rows = starts[owner] + np.arange(len(owner)) - block_offsets[owner]
+        return rows, owner
+
+    def slice(self, frame_id, combo: str) -> ForceSlice:
+        """Rows of a frame for one load combination, as views on the store arrays."""
+        return self[frame_id][combo]
+
+    def __getitem__(self, frame_id) -> FrameForces:
+        frame_code = self.frame_index.get(frame_id)
+        if frame_code is None:
+            raise KeyError(frame_id)
+        return FrameForces(self, frame_code)
+
+    def __iter__(self):
+        return iter(self.frame_ids.tolist())
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class ForceStoreBuilder:
+    """
+    Append-only builder for a ForceStore, used when the forces sheet is streamed row by row.
+    Labels are encoded to integer codes on arrival and the rows are kept in growable typed buffers
+    (`array.array`), so memory is proportional to the retained rows instead of the whole sheet.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self._combos = {}
+        self._joints = {}
+        self._frame_codes = array("l")
+        self._combo_codes = array("l")
+        self._joint_codes = array("l")
+        self._values = array("d")
+
+    def __len__(self):
+        return len(self._frame_codes)
+
+    @staticmethod
+    def _encode(labels: dict, label) -> int:
+        code = labels.get(label)
+        if code is None:
+            code = labels[label] = len(labels)
+        return code
+
+    def append(self, frame_id, combo: str, joint, values) -> None:
+        """Add one row. `values` holds the F1, F2, F3, M1, M2, M3 components."""
+        try:
+            # Converted as a whole first, so a failing cell never leaves part of the row in the buffer
+            row = array("d", values)
+        except TypeError:
+            # Blank or text cells, converted the same way as pd.to_numeric(errors="coerce")
+            row = array("d", [_number(value) for value in values])
+        self._values.extend(row)
+        self._frame_codes.append(self._encode(self._frames, frame_id))
+        self._combo_codes.append(self._encode(self._combos, combo))
+        self._joint_codes.append(self._encode(self._joints, joint))
+
+    @staticmethod
+    def _sorted_labels(labels: dict, codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sort the labels (as pd.factorize(sort=True) does) and remap the codes to the sorted order."""
+        unsorted = np.array(list(labels))
+        order = np.argsort(unsorted, kind="stable")
+        remap = np.empty(len(order), dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        return unsorted[order], remap[codes]
+
+    def build(self) -> ForceStore:
+        frame_ids, frame_codes = self._sorted_labels(self._frames, np.frombuffer(self._frame_codes, dtype="l"))
+        joint_ids, joint_codes = self._sorted_labels(self._joints, np.frombuffer(self._joint_codes, dtype="l"))
+        combo_codes = np.frombuffer(self._combo_codes, dtype="l").astype(np.int64)
+        values = np.frombuffer(self._values, dtype=np.float64).reshape(-1, len(FORCE_COMPONENTS))
+
+        order = np.lexsort((joint_codes, combo_codes, frame_codes))
+        return ForceStore(
+            frame_ids=frame_ids,
+            combos=list(self._combos),
+            joint_ids=joint_ids,
+            frame_codes=frame_codes[order],
+            combo_codes=combo_codes[order],
+            joint_codes=joint_codes[order],
+            values=np.ascontiguousarray(values[order]),
+        )
@@ -0,0 +1,244 @@
+"""
+Binary glTF (GLB) export of the model for the glTF GeometryViews.
+
+The geometry only depends on the nodes, frames and sections of the uploaded file, so it is built once into
+`ModelGeometry` and cached with the model. Colors are a per-vertex COLOR_0 attribute appended to the cached
+buffers, so a change of colors, groups or load combination only rewrites that attribute.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from app.core.cache import model_cache
+from app.core.profiling import stage
+from app.core.render import (
+    LEGEND_WIDTH,
+    NODE_RADIUS,
+    SECTION_HEIGHT,
+    SECTION_WIDTH,
+    WIREFRAME_MEMBERS,
+    legend_entries,
+    member_boxes,
+)
+
+# glTF constants
+FLOAT = 5126
+UNSIGNED_BYTE = 5121
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+LINES = 1
+TRIANGLES = 4
+
+NODE_COLOR = (221, 221, 221)
+
+
+def _quad_faces(faces: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Split a closed triangle mesh in its faces (pairs of triangles), with 4 own vertices per face."""
+    corners, triangles = [], []
+    for pair in faces.reshape(-1, 2, 3):
+        face_corners = list(dict.fromkeys(pair.ravel().tolist()))
+        triangles.append([[len(corners) + face_corners.index(corner) for corner in triangle] for triangle in pair])
+        corners.extend(face_corners)
+    return np.array(corners, dtype=np.int64), np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+def _face_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Normal of every vertex, for meshes where each face owns its 4 vertices."""
+    triangle = vertices[faces[::2]]
+    normals = np.cross(triangle[:, 1] - triangle[:, 0], triangle[:, 2] - triangle[:, 0])
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.repeat(normals, 4, axis=0)
+
+
+# Layout of a flat shaded box: the 8 corners of `member_boxes` repeated to 24 vertices, 4 per face
+_BOX_CORNERS, _BOX_QUAD_FACES = _quad_faces(member_boxes(np.zeros((1, 3)), np.array([[1.0, 0.0, 0.0]]), 1, 1)[1])
+
+
+def _flat_boxes(start: np.ndarray, end: np.ndarray, width: float, height: float):
+    """Vertices, normals and triangles of member boxes, with flat shaded faces."""
+    vertices, _ = member_boxes(start, end, width, height)
+    vertices = vertices.reshape(-1, 8, 3)[:, _BOX_CORNERS].reshape(-1, 3)
+    faces = (_BOX_QUAD_FACES[None, :, :] + 24 * np.arange(len(start))[:, None, None]).reshape(-1, 3)
+    return vertices, _face_normals(vertices, faces), faces
+
+
+def _octahedra(centers: np.ndarray, radius: float):
+    """Vertices and triangles of small octahedra, used as node markers."""
+    directions = np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]], dtype=np.float64)
+    triangles = np.array(
+        [[0, 2, 4], [2, 1, 4], [1, 3, 4], [3, 0, 4], [2, 0, 5], [1, 2, 5], [3, 1, 5], [0, 3, 5]], dtype=np.int64
+    )
+    vertices = (centers[:, None, :] + radius * directions[None, :, :]).reshape(-1, 3)
+    faces = (triangles[None, :, :] + 6 * np.arange(len(centers))[:, None, None]).reshape(-1, 3)
+    return vertices, faces
+
+
+class _GLBWriter:
+    """Collects buffer views and accessors of one binary buffer."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add(self, array: np.ndarray, component_type: int, kind: str, target: int, normalized: bool = False) -> int:
+        data = np.ascontiguousarray(array).tobytes()
+        self.buffer_views.append({"buffer": 0, "byteOffset": self.size, "byteLength": len(data), "target": target})
+        padding = -len(data) % 4
+        self.chunks.append(data + b"\0" * padding)
+        self.size += len(data) + padding
+
+        accessor = {
+            "bufferView": len(self.buffer_views) - 1,
+            "componentType": component_type,
+            "count": len(array),
+            "type": kind,
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if kind == "VEC3" and component_type == FLOAT:
+            accessor["min"] = array.min(axis=0).tolist() if len(array) else [0.0, 0.0, 0.0]
+            accessor["max"] = array.max(axis=0).tolist() if len(array) else [0.0, 0.0, 0.0]
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def _vertex_colors(colors: np.ndarray, repeat: int) -> np.ndarray:
+    rgba = np.empty((len(colors), 4), dtype=np.uint8)
+    rgba[:, :3] = colors
+    rgba[:, 3] = 255
+    return np.repeat(rgba, repeat, axis=0)
+
+
+class ModelGeometry:
+    """
+    Geometry of the members of a model, in the order of `frame_ids` (frames listed per section). Above
+    `wireframe_members` members are lines and the nodes are not drawn.
+    """
+
+    def __init__(self, sections: dict, lines: dict, nodes: dict, wireframe_members: int = WIREFRAME_MEMBERS):
+        self.frame_ids = [frame_id for section_vals in sections.values() for frame_id in section_vals["frame_ids"]]
+        node_ids = [(lines[frame_id]["nodeI"], lines[frame_id]["nodeJ"]) for frame_id in self.frame_ids]
+        start = np.array([[nodes[node_i][axis] for axis in "xyz"] for node_i, _ in node_ids], dtype=np.float64)
+        end = np.array([[nodes[node_j][axis] for axis in "xyz"] for _, node_j in node_ids], dtype=np.float64)
+        start, end = start.reshape(-1, 3), end.reshape(-1, 3)
+        self.wireframe = len(self.frame_ids) > wireframe_members
+
+        if self.wireframe:
+            self.members = np.arange(len(self.frame_ids))
+            self.vertices = np.stack([start, end], axis=1).reshape(-1, 3).astype(np.float32)
+            self.normals = None
+            self.faces = None
+            self.node_vertices = self.node_faces = None
+            return
+
+        # Zero-length members have no direction to extrude along
+        self.members = np.flatnonzero((start != end).any(axis=1))
+        vertices, normals, faces = _flat_boxes(start[self.members], end[self.members], SECTION_WIDTH, SECTION_HEIGHT)
+        self.vertices = vertices.astype(np.float32)
+        self.normals = normals.astype(np.float32)
+        self.faces = faces.astype(np.uint32)
+
+        node_rows = list(dict.fromkeys(node_id for pair in node_ids for node_id in pair))
+        centers = np.array([[nodes[node_id][axis] for axis in "xyz"] for node_id in node_rows], dtype=np.float64)
+        node_vertices, node_faces = _octahedra(centers.reshape(-1, 3), NODE_RADIUS)
+        self.node_vertices = node_vertices.astype(np.float32)
+        self.node_faces = node_faces.astype(np.uint32)
+
+    def glb(self, colors: np.ndarray, legend: bool = False) -> bytes:
+        """GLB file of the model with (n_frames, 3) uint8 `colors`, optionally with the ratio legend bars."""
+        writer = _GLBWriter()
+        nodes, meshes, materials = [], [], []
+
+        def add_mesh(name: str, primitive: dict, color: tuple | None = None):
+            # Vertex colors multiply the base color, which stays white for them
+            base_color = [channel / 255 for channel in color] + [1.0] if color else [1.0, 1.0, 1.0, 1.0]
+            materials.append(
+                {"pbrMetallicRoughness": {"baseColorFactor": base_color, "metallicFactor": 0.5, "roughnessFactor": 1.0}}
+            )
+            primitive["material"] = len(materials) - 1
+            meshes.append({"name": name, "primitives": [primitive]})
+            nodes.append({"name": name, "mesh": len(meshes) - 1})
+
+        member_colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)[self.members]
+        attributes = {"POSITION": writer.add(self.vertices, FLOAT, "VEC3", ARRAY_BUFFER)}
+        if self.wireframe:
+            attributes["COLOR_0"] = writer.add(
+                _vertex_colors(member_colors, 2), UNSIGNED_BYTE, "VEC4", ARRAY_BUFFER, normalized=True
+            )
+            add_mesh("members", {"attributes": attributes, "mode": LINES})
+        else:
+            attributes["NORMAL"] = writer.add(self.normals, FLOAT, "VEC3", ARRAY_BUFFER)
+            attributes["COLOR_0"] = writer.add(
+                _vertex_colors(member_colors, 24), UNSIGNED_BYTE, "VEC4", ARRAY_BUFFER, normalized=True
+            )
+            indices = writer.add(self.faces.ravel(), UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+            add_mesh("members", {"attributes": attributes, "indices": indices, "mode": TRIANGLES})
+
+            positions = writer.add(self.node_vertices, FLOAT, "VEC3", ARRAY_BUFFER)
+            indices = writer.add(self.node_faces.ravel(), UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+            add_mesh(
+                "nodes", {"attributes": {"POSITION": positions}, "indices": indices, "mode": TRIANGLES}, NODE_COLOR
+            )
+
+        if legend:
+            for index, (start_point, end_point, color) in enumerate(legend_entries()[0]):
+                start = np.array([[start_point.x, start_point.y, start_point.z]])
+                end = np.array([[end_point.x, end_point.y, end_point.z]])
+                vertices, normals, faces = _flat_boxes(start, end, LEGEND_WIDTH, LEGEND_WIDTH)
+                attributes = {
+                    "POSITION": writer.add(vertices.astype(np.float32), FLOAT, "VEC3", ARRAY_BUFFER),
+                    "NORMAL": writer.add(normals.astype(np.float32), FLOAT, "VEC3", ARRAY_BUFFER),
+                }
+                indices = writer.add(faces.astype(np.uint32).ravel(), UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+                primitive = {"attributes": attributes, "indices": indices, "mode": TRIANGLES}
+                add_mesh(f"legend {index}", primitive, (color.r, color.g, color.b))
+
+        binary = b"".join(writer.chunks)
+        document = {
+            "asset": {"version": "2.0"},
+            "scene": 0,
+            # Model coordinates as they are: the GeometryViews keep their default Z-up axis, as the labels do
+            "scenes": [{"nodes": list(range(len(nodes)))}],
+            "nodes": nodes,
+            "meshes": meshes,
+            "materials": materials,
+            "accessors": writer.accessors,
+            "bufferViews": writer.buffer_views,
+            "buffers": [{"byteLength": len(binary)}],
+        }
+        content = json.dumps(document, separators=(",", ":")).encode()
+        content += b" " * (-len(content) % 4)
+        return b"".join(
+            [
+                struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(content) + 8 + len(binary)),
+                struct.pack("<I4s", len(content), b"JSON"),
+                content,
+                struct.pack("<I4s", len(binary), b"BIN\0"),
+                binary,
+            ]
+        )
+
+
+def load_geometry(file_hash: str, sections: dict, lines: dict, nodes: dict) -> ModelGeometry:
+    """ModelGeometry of an uploaded file, cached next to its parsed model."""
+    key = f"{file_hash}-geometry-{WIREFRAME_MEMBERS}"
+
+    def build():
+        with stage("build geometry", members=len(lines)):
+            return ModelGeometry(sections, lines, nodes)
+
+    return model_cache.get_or_create(key, build)
+
+
+def frame_colors(frame_ids: list, frame_by_group: dict, color_function: callable) -> np.ndarray:
+    """(n, 3) uint8 colors of the frames, from the materials `color_function` returns."""
+    colors = {}
+    for frame_id in dict.fromkeys(frame_ids):
+        color = color_function(frame_by_group, frame_id).color
+        colors[frame_id] = (color.r, color.g, color.b)
+    return np.array([colors[frame_id] for frame_id in frame_ids], dtype=np.uint8).reshape(-1, 3)
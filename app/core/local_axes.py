@@ -0,0 +1,49 @@
+"""
+Local axes of the frames as direction cosine matrices, and the transformation of joint forces to them.
+
+The axes follow the ETABS defaults for frames of any orientation:
+- local 1 runs from node I to node J;
+- local 2 is the upward direction in the vertical plane through local 1, or global +X for vertical members;
+- local 3 = local 1 x local 2 completes the right-handed system.
+Row k of the (3, 3) matrix of a frame is local axis k + 1 in global coordinates, so `matrix @ global` gives the
+local components. Frames without a length (coincident or unknown nodes) get a NaN matrix.
+"""
+
+import numpy as np
+
+# A member is vertical when the sine of its angle to global Z is below this value (the ETABS criterion)
+VERTICAL_TOLERANCE = 1e-3
+
+GLOBAL_X = np.array([1.0, 0.0, 0.0])
+GLOBAL_Z = np.array([0.0, 0.0, 1.0])
+
+
+def direction_cosines(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """(n, 3, 3) local axes of the members from `start` to `end`, both (n, 3) coordinates."""
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 3)
+    end = np.asarray(end, dtype=np.float64).reshape(-1, 3)
+    axis_1 = end - start
+    length = np.linalg.norm(axis_1, axis=1)
+    valid = length > 0
+    axis_1[valid] /= length[valid, None]
+
+    # Local 2 is the part of the reference direction normal to local 1
+    vertical = np.hypot(axis_1[:, 0], axis_1[:, 1]) < VERTICAL_TOLERANCE
+    reference = np.where(vertical[:, None], GLOBAL_X, GLOBAL_Z)
+    axis_2 = reference - np.einsum("ij,ij->i", reference, axis_1)[:, None] * axis_1
+    axis_2[valid] /= np.linalg.norm(axis_2[valid], axis=1)[:, None]
+
+    axes = np.stack([axis_1, axis_2, np.cross(axis_1, axis_2)], axis=1)
+    axes[~valid] = np.nan
+    return axes
+
+
+def to_local(loads: np.ndarray, axes: np.ndarray) -> np.ndarray:
+    """
+    Joint forces in local axes, as one batched matrix product.
+    - loads: (rows, 6) F1, F2, F3, M1, M2, M3 in global axes.
+    - axes: (rows, 3, 3) local axes of the frame of every row.
+    Returns (rows, 6) P, V2, V3, T, M2, M3.
+    """
+    vectors = np.asarray(loads, dtype=np.float64).reshape(-1, 2, 3)
+    return np.matmul(vectors, axes.transpose(0, 2, 1)).reshape(-1, 6)
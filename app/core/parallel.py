@@ -0,0 +1,165 @@
+"""
+Process-pool evaluation of the batch checks across groups and load combinations.
+
+The large ForceStore arrays are copied once into `multiprocessing.shared_memory` blocks, or, for a store
+memory-mapped from disk (`ForceStore.open`), mapped again by the workers from the same files. The block names
+(or the directory) and the small store fields are sent once to every worker through the pool initializer, the
+tasks only carry the per-group inputs, and the workers map the arrays without copying. Results are merged in
+task order, so the output matches the serial path.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.batch_check import BatchResult, evaluate_pairs
+from app.core.forces import ForceStore
+from app.core.profiling import note
+
+# Number of worker processes, 1 evaluates in the calling process
+WORKERS = int(os.environ.get("ETABS_WORKERS", 1))
+
+# Store arrays placed in shared memory
+SHARED_ARRAYS = ["values", "joint_codes", "frame_ids", "slice_keys", "slice_offsets"]
+
+
+class GroupTask(NamedTuple):
+    """Inputs of one group: see `evaluate_pairs` for the meaning of the fields."""
+
+    cont_type: str
+    frame_ids: np.ndarray
+    caps: dict[str, np.ndarray]
+    axes: np.ndarray | None
+
+
+class SharedForceStore:
+    """
+    Copy of the ForceStore arrays (and joint elevations) in shared memory, owned by the parent process.
+    Use as a context manager so the blocks are released after the workers are done.
+    """
+
+    def __init__(self, store: ForceStore, joint_z: np.ndarray | None):
+        self._blocks = []
+        self.descriptor = {
+            "combos": store.combos,
+            "joint_ids": store.joint_ids,
+            "path": store.path,
+            "arrays": {},
+            "inline": {},
+        }
+        # The workers map a store on disk themselves, only the joint elevations are shared
+        arrays = {} if store.path else {name: getattr(store, name) for name in SHARED_ARRAYS}
+        if joint_z is not None:
+            arrays["joint_z"] = joint_z
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype.hasobject:
+                # Labels that are not plain numbers cannot be mapped, they are sent with the descriptor
+                self.descriptor["inline"][name] = array
+                continue
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.descriptor["arrays"][name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self) -> None:
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Worker side: descriptor of the store set by `_init_worker`, and the attached stores keyed by their block names
+_descriptor = None
+_attached = {}
+
+
+def _init_worker(descriptor: dict) -> None:
+    global _descriptor
+    _descriptor = descriptor
+
+
+def _attach(descriptor: dict) -> tuple[ForceStore, np.ndarray | None]:
+    key = (descriptor["path"], *(name for name, _, _ in descriptor["arrays"].values()))
+    if key not in _attached:
+        # Only the store of the running request is kept mapped. The cached store and its arrays are dropped
+        # before the blocks are closed, so that no array is left viewing unmapped memory
+        while _attached:
+            blocks, _ = _attached.popitem()[1]
+            for block in blocks:
+                block.close()
+
+        blocks, arrays = [], {}
+        for name, (block_name, shape, dtype) in descriptor["arrays"].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        arrays.update(descriptor["inline"])
+        joint_z = arrays.pop("joint_z", None)
+        if descriptor["path"]:
+            store = ForceStore.open(descriptor["path"])
+        else:
+            store = ForceStore.from_index(combos=descriptor["combos"], joint_ids=descriptor["joint_ids"], **arrays)
+        _attached[key] = (blocks, (store, joint_z))
+    return _attached[key][1]
+
+
+def _evaluate(task: GroupTask, combo_codes: list[int]) -> BatchResult:
+    store, joint_z = _attach(_descriptor)
+    return evaluate_pairs(task.cont_type, store, task.frame_ids, task.caps, task.axes, joint_z, combo_codes)
+
+
+def _split(combo_codes: list[int], parts: int) -> list[list[int]]:
+    """Split the combos in at most `parts` contiguous, non-empty chunks."""
+    chunks = np.array_split(np.asarray(combo_codes, dtype=np.int64), max(1, min(parts, len(combo_codes))))
+    return [chunk.tolist() for chunk in chunks if len(chunk)]
+
+
+def _merge_chunks(results: list[BatchResult], n_frames: int) -> BatchResult:
+    """Join frame-major results of consecutive combo chunks into one frame-major result over all combos."""
+    if len(results) == 1:
+        return results[0]
+    fields = []
+    for values in zip(*results):
+        fields.append(np.concatenate([value.reshape(n_frames, -1) for value in values], axis=1).ravel())
+    return BatchResult(*fields)
+
+
+def check_groups(
+    tasks: list[GroupTask],
+    load_combos: ForceStore,
+    joint_z: np.ndarray | None,
+    combo_codes: list[int],
+    workers: int = WORKERS,
+) -> list[BatchResult]:
+    """
+    Evaluate `evaluate_pairs` for every group task with the given combos, in `workers` processes.
+    The work is split per group and, when there are fewer groups than workers, per chunk of combos.
+    Returns one frame-major BatchResult per task, in the order of `tasks`.
+    """
+    combo_codes = list(combo_codes)
+    note(groups=len(tasks), frames=sum(len(task.frame_ids) for task in tasks), combos=len(combo_codes))
+    if workers <= 1 or not tasks or not combo_codes:
+        return [
+            evaluate_pairs(task.cont_type, load_combos, task.frame_ids, task.caps, task.axes, joint_z, combo_codes)
+            for task in tasks
+        ]
+
+    chunks = _split(combo_codes, -(-workers // len(tasks)))
+    with SharedForceStore(load_combos, joint_z) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.descriptor,)) as pool:
+            futures = [[pool.submit(_evaluate, task, chunk) for chunk in chunks] for task in tasks]
+            # Deterministic merge: tasks and chunks are collected in submission order
+            return [
+                _merge_chunks([future.result() for future in task_futures], len(task.frame_ids))
+                for task, task_futures in zip(tasks, futures)
+            ]
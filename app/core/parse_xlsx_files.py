@@ -1,62 +1,240 @@
 import io
+import os
+from operator import itemgetter
+from typing import NamedTuple
+
+import numpy as np
+import openpyxl
 import pandas as pd
 from app.models.models import Node, Group, Frame, Section
+from app.core.forces import ForceStore, ForceStoreBuilder
+from app.core.topology import Topology
+from app.core.cache import model_cache, content_hash
+from app.core.profiling import note, stage
+from app.core.tables import XLSX, TableBundle, detect_format
+
+FORCES_SHEET = "Element Joint Forces - Frame"
+
+# Reduction of the joint forces at ingest, with `ETABS_FORCE_ENVELOPE`: "1" keeps the envelope rows of every
+# (frame, combo, joint) (see `envelope_forces`), "audit" also keeps the raw rows as `load_combos.raw`
+FORCE_ENVELOPE_MODE = os.environ.get("ETABS_FORCE_ENVELOPE", "").lower()
+FORCE_ENVELOPE = FORCE_ENVELOPE_MODE in {"1", "true", "yes", "audit"}
+KEEP_RAW_FORCES = FORCE_ENVELOPE_MODE == "audit"
+# Joint forces of at least this size are memory-mapped from the disk cache (see `map_forces`)
+FORCE_MAP_MIN_BYTES = int(os.environ.get("ETABS_FORCE_MAP_MIN_BYTES", 64 * 1024**2))
+
+# Columns used from each ETABS table, every other column is skipped while reading
+SHEET_COLUMNS = {
+    "Objects and Elements - Joints": ["Object Name", "Global X", "Global Y", "Global Z", "Object Type"],
+    "Group Assignments": ["Group Name", "Object Unique Name"],
+    "Beam Object Connectivity": ["Unique Name", "UniquePtI", "UniquePtJ"],
+    "Frame Assigns - Sect Prop": ["Section Property", "UniqueName"],
+    FORCES_SHEET: ["Unique Name", "Output Case", "Case Type", "Joint", "F1", "F2", "F3", "M1", "M2", "M3"],
+    "Column Object Connectivity": ["Unique Name", "UniquePtI", "UniquePtJ"],
+}
+
+
+class Entities(NamedTuple):
+    nodes: dict
+    lines: dict
+    groups: dict
+    sections: dict
+    load_combos: ForceStore
+    topology: Topology
+
+
+def iter_sheet_rows(workbook, sheet: str, columns: list[str]):
+    """
+    Yield the projected `columns` of every data row of an ETABS table as tuples.
+    The first row of the sheet holds the table title, the second the headers.
+    """
+    worksheet = workbook[sheet]
+    header = next(worksheet.iter_rows(min_row=2, max_row=2, values_only=True), ())
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"Sheet '{sheet}' is missing the columns: {', '.join(missing)}")
+    getter = itemgetter(*[header.index(column) for column in columns])
+    for row in worksheet.iter_rows(min_row=3, max_col=len(header), values_only=True):
+        yield getter(row)
+
+
+def read_sheet(workbook, sheet: str, columns: list[str]) -> pd.DataFrame:
+    data = list(iter_sheet_rows(workbook, sheet, columns))
+    # Rows left without any value (formatted but empty cells) carry no data
+    return pd.DataFrame(data, columns=columns).dropna(how="all")
 
 
-def extract_sheets(file_content):
-    sheet_names = [
-        "Objects and Elements - Joints",
-        "Group Assignments",
-        "Beam Object Connectivity",
-        "Frame Assigns - Sect Prop",
-        "Element Joint Forces - Frame",
-        "Column Object Connectivity",
-    ]
+def stream_forces(workbook) -> ForceStore:
+    """
+    Build the ForceStore straight from the rows of the forces sheet. Rows that are not a "Combination", or that
+    miss their frame or joint, are dropped as they are read, so the full sheet is never held in memory. Ids are
+    plain integers, as in `combination_rows`.
+    """
+    columns = SHEET_COLUMNS[FORCES_SHEET]
+    frame_i, combo_i, case_type_i, joint_i = (
+        columns.index(name) for name in ["Unique Name", "Output Case", "Case Type", "Joint"]
+    )
+    values_slice = slice(columns.index("F1"), columns.index("M3") + 1)
+
+    builder = ForceStoreBuilder()
+    for row in iter_sheet_rows(workbook, FORCES_SHEET, columns):
+        if row[case_type_i] != "Combination" or row[frame_i] is None or row[joint_i] is None:
+            continue
+        builder.append(int(row[frame_i]), row[combo_i], int(row[joint_i]), row[values_slice])
+    return builder.build()
+
+
+def extract_sheets(file_content, stream=False):
+    """
+    Open the upload once and read the required columns of the six ETABS tables, from an xlsx workbook or from
+    a zip of CSV or Parquet tables (see `app.core.tables`).
+    With `stream` the forces table is returned as a ForceStore, built row by row from a workbook (see
+    `stream_forces`) and from the "Combination" rows of the forces column arrays otherwise.
+    """
+    file_format = detect_format(file_content)
+    if file_format != XLSX:
+        with TableBundle(file_content, file_format) as bundle:
+            dataframes = {sheet: bundle.read(sheet, columns) for sheet, columns in SHEET_COLUMNS.items()}
+        if stream:
+            forces_df = dataframes[FORCES_SHEET]
+            dataframes[FORCES_SHEET] = ForceStore.from_dataframe(combination_rows(forces_df))
+        return dataframes
+
     dataframes = {}
     # Create a BytesIO object from the file content
     excel_data = io.BytesIO(file_content)
-    with pd.ExcelFile(excel_data) as excel_file:
-        for sheet in sheet_names:
-            dataframes[sheet] = pd.read_excel(excel_file, sheet_name=sheet, skiprows=1)
+    workbook = openpyxl.load_workbook(excel_data, read_only=True, data_only=True)
+    try:
+        for sheet, columns in SHEET_COLUMNS.items():
+            if stream and sheet == FORCES_SHEET:
+                dataframes[sheet] = stream_forces(workbook)
+            else:
+                dataframes[sheet] = read_sheet(workbook, sheet, columns)
+    finally:
+        workbook.close()
     return dataframes
 
 
+def combination_rows(forces_df: pd.DataFrame) -> pd.DataFrame:
+    """Rows of the forces table that belong to a load combination, with plain integer ids."""
+    combination_df = forces_df[forces_df["Case Type"] == "Combination"].dropna(subset=["Unique Name", "Joint"])
+    combination_df = combination_df.astype({"Unique Name": "int64", "Joint": "int64"})
+    if isinstance(combination_df["Output Case"].dtype, pd.CategoricalDtype):
+        # The load cases that are not combinations would stay behind as categories
+        combination_df["Output Case"] = combination_df["Output Case"].cat.remove_unused_categories()
+    return combination_df
+
+
+def envelope_forces(load_combos: ForceStore, topology: Topology, keep_raw: bool = False) -> ForceStore:
+    """
+    Envelope rows (see `ForceStore.envelope`) of the frames whose local axes are global axes up to sign: every
+    quantity the checks read (V2 and M3, F3, F1 and F2) is then one component of the row, so its extremes, and
+    whether any entry fails, are those of the raw rows. Other frames keep all their rows.
+    """
+    axes = topology.axes_of(load_combos.frame_ids.tolist())
+    aligned = np.isin(axes, (-1.0, 0.0, 1.0)).all(axis=(1, 2))
+    return load_combos.envelope(aligned, keep_raw)
+
+
+def _model_key(file_hash: str) -> str:
+    if not FORCE_ENVELOPE:
+        return file_hash
+    return f"{file_hash}-envelope{'-raw' if KEEP_RAW_FORCES else ''}"
+
+
+def map_forces(entities: Entities, key: str) -> Entities:
+    """
+    Entities with the joint forces memory-mapped from a directory of the model cache, when they are at least
+    `FORCE_MAP_MIN_BYTES`. The cached entry then pickles without the force arrays, so re-opening the model reads
+    only the other entities, and the processes that open it share the pages of the arrays.
+    """
+    directory = model_cache.artifact_path(key, "forces")
+    load_combos = entities.load_combos
+    if directory is None or load_combos.values.nbytes < FORCE_MAP_MIN_BYTES:
+        return entities
+    if load_combos.frame_ids.dtype.hasobject or load_combos.joint_ids.dtype.hasobject:
+        return entities  # Labels that are not plain numbers cannot be mapped
+    with stage("map forces", bytes=load_combos.values.nbytes):
+        load_combos.save(directory)
+        mapped = ForceStore.open(directory)
+    mapped.raw = load_combos.raw
+    return entities._replace(load_combos=mapped)
+
+
+def _create_entities(file_content, key: str):
+    return lambda: map_forces(get_entities(file_content), key)
+
+
+def prewarm_entities(file_content) -> str:
+    """Start `load_entities` in a background thread and return the hash the model is cached under."""
+    file_hash = content_hash(file_content)
+    key = _model_key(file_hash)
+    model_cache.prefetch(key, _create_entities(file_content, key))
+    return file_hash
+
+
+def read_names(file_content, sheet: str, column: str) -> list:
+    """Unique values of one column of an ETABS table, in order of appearance, reading only that table."""
+    columns = SHEET_COLUMNS[sheet]
+    file_format = detect_format(file_content)
+    if file_format != XLSX:
+        with TableBundle(file_content, file_format) as bundle:
+            table_df = bundle.read(sheet, columns)
+    else:
+        workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            table_df = read_sheet(workbook, sheet, columns)
+        finally:
+            workbook.close()
+    return table_df.dropna(subset=columns)[column].unique().tolist()
+
+
 def get_groups(file_content):
-    sheet_name = "Group Assignments"
-    excel_data = io.BytesIO(file_content)
-    with pd.ExcelFile(excel_data) as excel_file:
-        groups_df = pd.read_excel(excel_file, sheet_name=sheet_name, skiprows=1)
-    groups_df_cleaned = groups_df.dropna(subset=["Group Name", "Object Unique Name"])
-    group_names = groups_df_cleaned["Group Name"].unique().tolist()
-    return group_names
+    """
+    Names of the groups, in order of appearance. The full model is loaded in the background meanwhile,
+    and only the groups table is read here unless the model is already in memory.
+    """
+    entities = model_cache.peek(_model_key(prewarm_entities(file_content)))
+    if entities is not None:
+        return list(entities.groups)
+    return read_names(file_content, "Group Assignments", "Group Name")
 
 
-def get_load_combos(file_content):
-    sheet_name = ["Element Joint Forces - Frame"]
-    excel_data = io.BytesIO(file_content)
-    with pd.ExcelFile(excel_data) as excel_file:
-        df = pd.read_excel(excel_file, sheet_name=sheet_name, skiprows=1)
+def get_sections(file_content):
+    """Names of the sections, in order of appearance, read the same way as `get_groups`."""
+    entities = model_cache.peek(_model_key(prewarm_entities(file_content)))
+    if entities is not None:
+        return list(entities.sections)
+    return read_names(file_content, "Frame Assigns - Sect Prop", "Section Property")
 
-    element_forces = df["Element Joint Forces - Frame"]
-    df_combination = element_forces[element_forces["Case Type"] == "Combination"]
 
-    combos = df_combination["Output Case"].unique().tolist()
-    return combos
+def get_load_combos(file_content):
+    """Names of the load combinations, waiting for the model that `prewarm_entities` may have started."""
+    file_hash = prewarm_entities(file_content)
+    return list(load_entities(file_content, file_hash).load_combos.combos)
 
 
-def get_entities(file_content):
+def get_entities(file_content, stream=True, envelope=FORCE_ENVELOPE, keep_raw=KEEP_RAW_FORCES):
+    """
+    Parse the upload into the model entities. With `envelope` the joint forces are reduced to their envelope
+    rows (see `envelope_forces`), keeping the raw rows as `load_combos.raw` with `keep_raw`.
+    """
     nodes_dict = {}
     frame_dicts = {}
     group_dicts = {}
     section_dicts = {}
-    sheets_data = extract_sheets(file_content)
+    with stage("read sheets", bytes=len(file_content)):
+        sheets_data = extract_sheets(file_content, stream=stream)
+        note(table_rows=sum(len(data) for data in sheets_data.values() if isinstance(data, pd.DataFrame)))
+        if stream:
+            note(force_rows=len(sheets_data[FORCES_SHEET].values))
 
     joints_df = sheets_data["Objects and Elements - Joints"]
     groups_df = sheets_data["Group Assignments"]
     beam_df = sheets_data["Beam Object Connectivity"]
     column_df = sheets_data["Column Object Connectivity"]
     frame_assigns_summary_df = sheets_data["Frame Assigns - Sect Prop"]
-    element_forces = sheets_data["Element Joint Forces - Frame"]
+    element_forces = sheets_data[FORCES_SHEET]
 
     # Create Nodes
     joints_df_cleaned = joints_df.dropna(subset=["Object Name", "Global X", "Global Y", "Global Z", "Object Type"])
@@ -71,9 +249,7 @@ def get_entities(file_content):
 
     # Create groups
     groups_df_cleaned = groups_df.dropna(subset=["Group Name", "Object Unique Name"])
-    group_names = groups_df_cleaned["Group Name"].unique()
-    for group_name in group_names:
-        group_df = groups_df_cleaned[groups_df_cleaned["Group Name"] == group_name]
+    for group_name, group_df in groups_df_cleaned.groupby("Group Name", sort=False):
         frame_ids = group_df["Object Unique Name"].astype(int).tolist()
         group = Group(name=group_name, frame_ids=frame_ids)
         group_dicts.update({group_name: group.model_dump()})
@@ -99,44 +275,30 @@ def get_entities(file_content):
 
     # Create sections
     frame_assigns_summary_df_cleaned = frame_assigns_summary_df.dropna(subset=["Section Property", "UniqueName"])
-    section_names = frame_assigns_summary_df_cleaned["Section Property"].unique()
-
-    for section_name in section_names:
-        section_df = frame_assigns_summary_df_cleaned[
-            frame_assigns_summary_df_cleaned["Section Property"] == section_name
-        ]
+    for section_name, section_df in frame_assigns_summary_df_cleaned.groupby("Section Property", sort=False):
         frame_ids = section_df["UniqueName"].tolist()
         section = Section(name=section_name, frame_ids=frame_ids)
         section_dicts.update({section_name: section.model_dump()})
 
     # Combos
-    df_combination = element_forces[element_forces["Case Type"] == "Combination"]
-
-    comb_forces_dict = {}
-    # Group the DataFrame by 'Unique Name', 'Output Case', and 'Joint'
-    grouped = df_combination.groupby(["Unique Name", "Output Case", "Joint"])
-    for (unique_name, output_case, joint), group in grouped:
-        if unique_name not in comb_forces_dict:
-            comb_forces_dict[unique_name] = {}
-        if output_case not in comb_forces_dict[unique_name]:
-            comb_forces_dict[unique_name][output_case] = {}
-        entries = []
-        for idx, row in group.iterrows():
-            entry = {
-                "F1": row["F1"],
-                "F2": row["F2"],
-                "F3": row["F3"],
-                "M1": row["M1"],
-                "M2": row["M2"],
-                "M3": row["M3"],
-            }
-            entries.append(entry)
-        comb_forces_dict[unique_name][output_case][joint] = entries
-
-    return nodes_dict, frame_dicts, group_dicts, section_dicts, comb_forces_dict
-
-
-def get_section_by_id(sections, section_id):
-    for section_name, section_vals in sections.items():
-        if section_id in section_vals["frame_ids"]:
-            return section_name
+    if stream:
+        comb_forces_dict = element_forces
+    else:
+        comb_forces_dict = ForceStore.from_dataframe(combination_rows(element_forces))
+
+    topology = Topology(nodes_dict, frame_dicts, group_dicts, section_dicts)
+    if envelope:
+        with stage("envelope forces", force_rows=len(comb_forces_dict.values)):
+            comb_forces_dict = envelope_forces(comb_forces_dict, topology, keep_raw)
+            note(envelope_rows=len(comb_forces_dict.values))
+
+    return Entities(nodes_dict, frame_dicts, group_dicts, section_dicts, comb_forces_dict, topology)
+
+
+def load_entities(file_content, file_hash: str | None = None):
+    """
+    Cached `get_entities`, keyed by the hash of the uploaded bytes and shared by all views of the process.
+    Pass `file_hash` when the caller already computed `content_hash(file_content)`.
+    """
+    key = _model_key(file_hash or content_hash(file_content))
+    return model_cache.get_or_create(key, _create_entities(file_content, key))
@@ -0,0 +1,153 @@
+"""
+Check and design pipelines of the app, shared by the VIKTOR controller and the headless batch runner.
+
+Both take the parsed entities of a model (`get_entities`), the compiled capacity library and the group
+assignments, and run every group as one batch (see `check_groups`).
+"""
+
+import numpy as np
+
+from app.core.batch_check import CONNECTION_QUANTITIES, ENVELOPE_COMBO, EnvelopeResult, joint_elevations
+from app.core.design import design_task, select_tier
+from app.core.parallel import WORKERS, GroupTask, check_groups
+from app.core.profiling import stage
+from app.core.results import ResultStoreBuilder
+
+
+def run_checks(entities, library, cont_types, lc, workers=WORKERS):
+    """
+    Check the frames of every assigned group against the capacity selected for it.
+    `cont_types` holds the group assignments (groups, connection_type, capacities), `lc` is a load combination
+    or ENVELOPE_COMBO. Returns the check color of every checked frame and the ResultStore of the frames.
+    """
+    nodes, lines, groups, sections, load_combos, topology = entities
+    frame_by_group = {}
+    groups_conn_props = {}
+
+    # Process connections
+    for con_dict in cont_types:
+        conn_props = {
+            "color": con_dict.color,
+            "contype": con_dict.connection_type,
+            "capacity": con_dict.capacities,
+        }
+        groups_conn_props[con_dict.groups] = conn_props
+
+    selected_lc = lc
+    results = ResultStoreBuilder()
+
+    # Build one batch task per group
+    group_tasks = []
+    for group_name, group_vals in groups.items():
+        if not groups_conn_props.get(group_name):
+            continue
+        # Match the DynamicArray content with the connection database
+        cont_type = groups_conn_props[group_name]["contype"]
+        capacity = groups_conn_props[group_name]["capacity"]
+        frame_ids = list(dict.fromkeys(group_vals["frame_ids"]))
+        section_names = [topology.section_of(frame_id) for frame_id in frame_ids]
+        caps = library.lookup(cont_type, section_names, capacity, CONNECTION_QUANTITIES[cont_type])
+        axes = topology.axes_of(frame_ids) if cont_type == "Moment End Plate" else None
+        group_tasks.append((group_name, section_names, GroupTask(cont_type, np.asarray(frame_ids), caps, axes)))
+
+    # Process groups, all frames of a group are checked in one batch
+    envelope_mode = selected_lc == ENVELOPE_COMBO
+    if envelope_mode:
+        combo_codes = range(len(load_combos.combos))
+    else:
+        combo_codes = [load_combos.combo_index.get(selected_lc, -1)]
+    joint_z = joint_elevations(load_combos, nodes)
+    with stage("batch checks", workers=workers):
+        group_results = check_groups([task for *_, task in group_tasks], load_combos, joint_z, combo_codes, workers)
+
+    for (group_name, section_names, task), result in zip(group_tasks, group_results):
+        cont_type = task.cont_type
+        frame_ids = task.frame_ids.tolist()
+        if envelope_mode:
+            envelope = EnvelopeResult.reduce(result, len(frame_ids), load_combos.combos)
+            result = envelope.result
+            frame_combos = envelope.governing_combo
+            margins = envelope.margin
+        else:
+            frame_combos = [selected_lc] * len(frame_ids)
+            margins = None
+
+        results.add(frame_ids, group_name, cont_type, section_names, frame_combos, margins, result)
+        for frame_id, color in zip(frame_ids, result.colors()):
+            if color:
+                frame_by_group.update({frame_id: {"material": color}})
+
+    return frame_by_group, results.build()
+
+
+def run_design(entities, library, cont_types, lc, workers=WORKERS):
+    """
+    Select for every assigned group the lowest capacity tier all of its frames satisfy.
+    Returns the frame colors and ResultStore as `run_checks`, then per group the selected tier, the frames that
+    fail every tier and the frames that drive the selection.
+    """
+    nodes, lines, groups, sections, load_combos, topology = entities
+    frame_by_group = {}
+    groups_conn_props = {}
+
+    # Process connections
+    for con_dict in cont_types:
+        conn_props = {
+            "color": con_dict.color,
+            "contype": con_dict.connection_type,
+        }
+        groups_conn_props[con_dict.groups] = conn_props
+
+    selected_lc = lc
+    results = ResultStoreBuilder()
+
+    # Build one batch task per group, covering every tier of its connection type
+    group_tasks = []
+    for group_name, group_vals in groups.items():
+        if not groups_conn_props.get(group_name):
+            continue
+        cont_type = groups_conn_props[group_name]["contype"]
+        frame_ids = list(dict.fromkeys(group_vals["frame_ids"]))
+        section_names = [topology.section_of(frame_id) for frame_id in frame_ids]
+        axes = topology.axes_of(frame_ids) if cont_type == "Moment End Plate" else None
+        task, tiers = design_task(cont_type, frame_ids, section_names, library, axes)
+        group_tasks.append((group_name, frame_ids, section_names, tiers, task))
+
+    # Design against one combination, or against all of them for the envelope
+    envelope_mode = selected_lc == ENVELOPE_COMBO
+    if envelope_mode:
+        combos = load_combos.combos
+        combo_codes = range(len(combos))
+    else:
+        combos = [selected_lc]
+        combo_codes = [load_combos.combo_index.get(selected_lc, -1)]
+    joint_z = joint_elevations(load_combos, nodes)
+    with stage("batch checks", workers=workers):
+        group_results = check_groups([task for *_, task in group_tasks], load_combos, joint_z, combo_codes, workers)
+
+    # Process groups, the group takes the lowest tier all of its frames satisfy
+    non_compliant_members = {}
+    design_result = {}
+    driving_members = {}
+    for (group_name, frame_ids, section_names, tiers, task), result in zip(group_tasks, group_results):
+        cont_type = task.cont_type
+        design = select_tier(result, tiers, len(frame_ids), combos)
+        design_result[group_name] = design.tier
+        non_compliant = zip(frame_ids, design.non_compliant)
+        non_compliant_members[group_name] = [frame_id for frame_id, flag in non_compliant if flag]
+        driving_members[group_name] = [frame_id for frame_id, flag in zip(frame_ids, design.drivers) if flag]
+
+        envelope = design.envelope
+        if envelope_mode:
+            frame_combos = envelope.governing_combo
+            margins = envelope.margin
+        else:
+            frame_combos = [selected_lc] * len(frame_ids)
+            margins = None
+
+        result = envelope.result
+        results.add(frame_ids, group_name, cont_type, section_names, frame_combos, margins, result)
+        for frame_id, color in zip(frame_ids, result.colors()):
+            if color:
+                frame_by_group.update({frame_id: {"material": color}})
+    return frame_by_group, results.build(), design_result, non_compliant_members, driving_members
@@ -0,0 +1,143 @@
+"""
+Per-request timing and memory breakdown of the pipeline, enabled with the `ETABS_PROFILE` environment variable:
+`ETABS_PROFILE=1` records timings, `ETABS_PROFILE=memory` also traces allocations, which slows the pipeline down.
+
+A view call is a request (`profiled`), the steps inside it are stages (`stage`), which may nest. Each stage records
+its wall time, CPU time of the process, peak memory traced by `tracemalloc` and the counts noted with `note`
+(rows, frames, cache hits...). At the end of a request its record is appended as one JSON line to
+`ETABS_PROFILE_LOG` and kept in memory for the debug view. When profiling is disabled every call is a no-op.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+PROFILE_MODE = os.environ.get("ETABS_PROFILE", "").lower()
+PROFILE = PROFILE_MODE in {"1", "true", "yes", "memory"}
+PROFILE_MEMORY = PROFILE_MODE == "memory"
+PROFILE_LOG = os.environ.get("ETABS_PROFILE_LOG", "etabs_profile.jsonl")
+# Requests kept in memory for the debug view
+PROFILE_HISTORY = 20
+
+recent_requests = deque(maxlen=PROFILE_HISTORY)
+_log_lock = threading.Lock()
+_current = ContextVar("profile_stage", default=None)
+
+
+class _Frame:
+    """Open request or stage: its record and the values its children need."""
+
+    __slots__ = ("record", "stages", "depth", "wall", "cpu", "peak")
+
+    def __init__(self, record: dict, stages: list, depth: int):
+        self.record = record
+        self.stages = stages
+        self.depth = depth
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.peak = 0
+
+
+def _traced_peak() -> int:
+    return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+
+@contextmanager
+def _open(record: dict, stages: list, depth: int):
+    parent = _current.get()
+    if parent is not None:
+        # The peak is reset for every stage, the parent keeps the highest peak of its own part and its children
+        parent.peak = max(parent.peak, _traced_peak())
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    frame = _Frame(record, stages, depth)
+    token = _current.set(frame)
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+        frame.peak = max(frame.peak, _traced_peak())
+        record["wall_s"] = round(time.perf_counter() - frame.wall, 6)
+        record["cpu_s"] = round(time.process_time() - frame.cpu, 6)
+        if tracemalloc.is_tracing():
+            record["peak_mb"] = round(frame.peak / 2**20, 3)
+        if parent is not None:
+            parent.peak = max(parent.peak, frame.peak)
+
+
+@contextmanager
+def stage(name: str, **counts):
+    """Time a pipeline stage of the current request. Outside a profiled request this does nothing."""
+    parent = _current.get()
+    if parent is None:
+        yield
+        return
+    record = {"stage": name, "depth": parent.depth + 1, **counts}
+    parent.stages.append(record)
+    with _open(record, parent.stages, parent.depth + 1):
+        yield
+
+
+def note(**counts) -> None:
+    """Add counts to the current stage: numbers are summed, other values replace the previous one."""
+    frame = _current.get()
+    if frame is None:
+        return
+    for key, value in counts.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            frame.record[key] = frame.record.get(key, 0) + value
+        else:
+            frame.record[key] = value
+
+
+def _write(record: dict) -> None:
+    recent_requests.append(record)
+    if not PROFILE_LOG:
+        return
+    with _log_lock, open(PROFILE_LOG, "a", encoding="utf-8") as log:
+        log.write(json.dumps(record, default=str) + "\n")
+
+
+def profiled(name: str):
+    """Decorator profiling every call of a view as one request, when `ETABS_PROFILE` is set."""
+
+    def decorator(function):
+        if not PROFILE:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is not None:
+                return function(*args, **kwargs)
+            started = PROFILE_MEMORY and not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            record = {"request": name, "time": datetime.now().isoformat(timespec="seconds"), "pid": os.getpid()}
+            stages = []
+            try:
+                with _open(record, stages, 0):
+                    return function(*args, **kwargs)
+            except Exception as exc:
+                record["error"] = repr(exc)
+                raise
+            finally:
+                if started:
+                    tracemalloc.stop()
+                record["stages"] = stages
+                _write(record)
+
+        return wrapper
+
+    return decorator
+
+
+def last_request(exclude: str | None = None) -> dict | None:
+    """Most recent request record of this process, skipping the requests named `exclude`."""
+    return next((record for record in reversed(recent_requests) if record["request"] != exclude), None)
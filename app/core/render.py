@@ -1,66 +1,80 @@
+import logging
+import os
+import threading
+
+import numpy as np
 import viktor as vkt
 
+logger = logging.getLogger(__name__)
+
 NODE_RADIUS = 40
+SECTION_WIDTH = 200
+SECTION_HEIGHT = 200
+DEFAULT_COLOR = (40, 40, 40)
+LEGEND_WIDTH = 700
+
+# Above this number of members the model is drawn as colored lines, without node spheres
+WIREFRAME_MEMBERS = int(os.environ.get("ETABS_WIREFRAME_MEMBERS", 5000))
+
+# Corners of a member box: the section rectangle at nodeI (0-3) and at nodeJ (4-7)
+_BOX_U = np.array([-1, 1, 1, -1, -1, 1, 1, -1], dtype=np.float64)
+_BOX_V = np.array([-1, -1, 1, 1, -1, -1, 1, 1], dtype=np.float64)
+_BOX_END = np.array([0, 0, 0, 0, 1, 1, 1, 1], dtype=bool)
+# Two triangles per face, counter-clockwise seen from outside the box
+_BOX_FACES = np.array(
+    [
+        [0, 2, 1], [0, 3, 2],  # nodeI end
+        [4, 5, 6], [4, 6, 7],  # nodeJ end
+        [0, 1, 5], [0, 5, 4],
+        [1, 2, 6], [1, 6, 5],
+        [2, 3, 7], [2, 7, 6],
+        [3, 0, 4], [3, 4, 7],
+    ],
+    dtype=np.int64,
+)  # fmt: skip
+
+_materials = {}
+
+
+def intern_material(color) -> vkt.Material:
+    """One shared Material per distinct color, given as a vkt.Color or an (r, g, b) tuple."""
+    rgb = (color.r, color.g, color.b) if isinstance(color, vkt.Color) else tuple(color)
+    material = _materials.get(rgb)
+    if material is None:
+        material = _materials[rgb] = vkt.Material(color=vkt.Color(*rgb))
+    return material
+
 
-def render_model(
-    sections: dict,
-    lines: dict,
-    nodes: dict,
-    frame_by_group: dict,
-    color_function: callable,
-    sections_group=[],
-):
-    rendered_sphere = set()
-    sections_group = []  # Stores all 3d entities
-    for section_name, section_vals in sections.items():
-        for frame_id in section_vals["frame_ids"]:
-            node_id_i = lines[frame_id]["nodeI"]
-            node_id_j = lines[frame_id]["nodeJ"]
-
-            node_i = nodes[node_id_i]
-            node_j = nodes[node_id_j]
-
-            point_i = vkt.Point(node_i["x"], node_i["y"], node_i["z"])
-            point_j = vkt.Point(node_j["x"], node_j["y"], node_j["z"])
-
-            if node_id_i not in rendered_sphere:
-                sphere_k = vkt.Sphere(
-                    point_i,
-                    radius=NODE_RADIUS,
-                    material=None,
-                    identifier=str(node_id_i),
-                )
-                sections_group.append(sphere_k)
-                rendered_sphere.add(node_id_i)
-
-            if node_id_j not in rendered_sphere:
-                sphere_k = vkt.Sphere(
-                    point_j,
-                    radius=NODE_RADIUS,
-                    material=None,
-                    identifier=str(node_id_j),
-                )
-                sections_group.append(sphere_k)
-                rendered_sphere.add(node_id_j)
-
-            line_k = vkt.Line(point_i, point_j)
-
-            material = color_function(frame_by_group, frame_id)
-            section_k = vkt.RectangularExtrusion(200, 200, line_k, identifier=str(frame_id), material=material)
-            sections_group.append(section_k)
-    return sections_group
+def member_boxes(start: np.ndarray, end: np.ndarray, width: float, height: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vertices (8n, 3) and triangles (12n, 3) of the rectangular extrusions of n members from `start` to `end`.
+    The section is oriented with its height in the vertical plane through the member axis.
+    """
+    axis = end - start
+    axis = axis / np.linalg.norm(axis, axis=1, keepdims=True)
+    # Vertical members take the global X axis as reference instead of Z
+    reference = np.where(np.abs(axis[:, 2:3]) > 0.999, [[1.0, 0.0, 0.0]], [[0.0, 0.0, 1.0]])
+    u = np.cross(reference, axis)
+    u /= np.linalg.norm(u, axis=1, keepdims=True)
+    v = np.cross(axis, u)
+
+    base = np.where(_BOX_END[None, :, None], end[:, None, :], start[:, None, :])
+    offset_u = _BOX_U[None, :, None] * u[:, None, :] * (width / 2)
+    offset_v = _BOX_V[None, :, None] * v[:, None, :] * (height / 2)
+    vertices = base + offset_u + offset_v
+    faces = _BOX_FACES[None, :, :] + 8 * np.arange(len(start))[:, None, None]
+    return vertices.reshape(-1, 3), faces.reshape(-1, 3)
 
 
 def colors_by_group(frame_by_group: dict, frame_id: int):
     maybe_color = frame_by_group.get(frame_id)
     if maybe_color:
-        if isinstance(maybe_color["material"], tuple):
-            r,g,b = maybe_color["material"]
-            material = vkt.Material(color = vkt.Color(r=r, g=g, b=b))
+        if isinstance(maybe_color["material"], (tuple, vkt.Color)):
+            material = intern_material(maybe_color["material"])
         else:
             material = maybe_color["material"]
     else:
-        material = vkt.Material(color=vkt.Color(r=40, g=40, b=40))
+        material = intern_material(DEFAULT_COLOR)
     return material
 
 
@@ -69,136 +83,164 @@ def get_material_color(group_name, groups_conn_props):
     Determine the material color based on the group name and connection properties.
     """
     if group_name in groups_conn_props:
-        return vkt.Material(color=groups_conn_props[group_name]["color"])
+        return intern_material(groups_conn_props[group_name]["color"])
     else:
         # Default color if the group is not found in the connection properties
-        return vkt.Material(color=vkt.Color(r=40, g=40, b=40))
-
-
-def plotly_model(lines: dict, nodes: dict, color_dict: dict):
-    import plotly.graph_objects as go
-    import plotly.io as pio
-
-    # Set default image parameters for saving
-    pio.kaleido.scope.default_format = "png"
-    pio.kaleido.scope.default_width = 800
-    pio.kaleido.scope.default_height = 600
-
-    # Initialize lists to store node coordinates and identifiers
-    x_nodes = []
-    y_nodes = []
-    z_nodes = []
-    node_ids = []
-    rendered_nodes = set()
-
-    # Collect node coordinates
-    for line_id, line_data in lines.items():
-        node_id_i = line_data["nodeI"]
-        node_id_j = line_data["nodeJ"]
-
-        # Add nodeI if not already added
-        if node_id_i not in rendered_nodes:
-            node_i = nodes[node_id_i]
-            x_nodes.append(node_i["x"])
-            y_nodes.append(node_i["y"])
-            z_nodes.append(node_i["z"])
-            node_ids.append(str(node_id_i))
-            rendered_nodes.add(node_id_i)
-
-        # Add nodeJ if not already added
-        if node_id_j not in rendered_nodes:
-            node_j = nodes[node_id_j]
-            x_nodes.append(node_j["x"])
-            y_nodes.append(node_j["y"])
-            z_nodes.append(node_j["z"])
-            node_ids.append(str(node_id_j))
-            rendered_nodes.add(node_id_j)
-
-    # Create scatter plot of nodes
-    node_trace = go.Scatter3d(
-        x=x_nodes,
-        y=y_nodes,
-        z=z_nodes,
-        mode="markers",
-        marker=dict(size=5, color="blue"),
-        text=node_ids,
-        hoverinfo="text",
-        showlegend=False,
-    )
+        return intern_material(DEFAULT_COLOR)
 
-    # Initialize a dictionary to group lines by color
-    color_to_lines = {}
 
-    for line_id, line_data in lines.items():
-        node_id_i = line_data["nodeI"]
-        node_id_j = line_data["nodeJ"]
+def frame_segments(lines: dict, nodes: dict, frame_ids: list) -> tuple[np.ndarray, np.ndarray]:
+    """(n, 3) coordinates of nodeI and of nodeJ of the frames."""
+    node_ids = [(lines[frame_id]["nodeI"], lines[frame_id]["nodeJ"]) for frame_id in frame_ids]
+    start = np.array([[nodes[node_i][axis] for axis in "xyz"] for node_i, _ in node_ids], dtype=np.float64)
+    end = np.array([[nodes[node_j][axis] for axis in "xyz"] for _, node_j in node_ids], dtype=np.float64)
+    return start.reshape(-1, 3), end.reshape(-1, 3)
 
-        node_i = nodes[node_id_i]
-        node_j = nodes[node_id_j]
 
-        # Get color from color_dict
-        color = color_dict.get(line_id, "black")  # Default to black if not specified
+def _plotly_color(color) -> str:
+    if isinstance(color, str):
+        return color
+    if isinstance(color, vkt.Color):
+        color = (color.r, color.g, color.b)
+    return "rgb({}, {}, {})".format(*color)
 
-        if color not in color_to_lines:
-            color_to_lines[color] = {"x": [], "y": [], "z": []}
 
-        # Add coordinates for the line segment
-        color_to_lines[color]["x"].extend([node_i["x"], node_j["x"], None])
-        color_to_lines[color]["y"].extend([node_i["y"], node_j["y"], None])
-        color_to_lines[color]["z"].extend([node_i["z"], node_j["z"], None])
+def line_traces(start: np.ndarray, end: np.ndarray, colors: list, width: float = 2) -> list:
+    """One Scatter3d line trace per distinct color, the segments of a trace are separated by NaN points."""
+    import plotly.graph_objects as go
 
-    # Create line traces for each color
-    line_traces = []
-    for color, coords in color_to_lines.items():
+    segments = np.stack([start, end, np.full_like(start, np.nan)], axis=1)
+    names, codes = np.unique(np.array([_plotly_color(color) for color in colors], dtype=object), return_inverse=True)
+    traces = []
+    for code, color in enumerate(names):
+        points = segments[codes == code].reshape(-1, 3)
         trace = go.Scatter3d(
-            x=coords["x"],
-            y=coords["y"],
-            z=coords["z"],
+            x=points[:, 0],
+            y=points[:, 1],
+            z=points[:, 2],
             mode="lines",
-            line=dict(width=2, color=color),
+            line=dict(width=width, color=color),
             hoverinfo="none",
             showlegend=False,
         )
-        line_traces.append(trace)
-
-    # Combine node and line traces
-    data = [node_trace] + line_traces
-
-    # Set up the layout of the plot
-    layout = go.Layout(
-        scene=dict(
-            xaxis=dict(
-                visible=False,
-                showgrid=False,
-                zeroline=False,
-                showline=False,
-                showticklabels=False,
-            ),
-            yaxis=dict(
-                visible=False,
-                showgrid=False,
-                zeroline=False,
-                showline=False,
-                showticklabels=False,
-            ),
-            zaxis=dict(
-                visible=False,
-                showgrid=False,
-                zeroline=False,
-                showline=False,
-                showticklabels=False,
-            ),
-            aspectmode="data",
-            bgcolor="white",
-        ),
-        paper_bgcolor="white",
-        margin=dict(r=0, l=0, b=0, t=0),
-        showlegend=False,
+        traces.append(trace)
+    return traces
+
+
+# Hidden axes, equal scales
+PLOTLY_SCENE = dict(
+    xaxis=dict(visible=False, showgrid=False, zeroline=False, showline=False, showticklabels=False),
+    yaxis=dict(visible=False, showgrid=False, zeroline=False, showline=False, showticklabels=False),
+    zaxis=dict(visible=False, showgrid=False, zeroline=False, showline=False, showticklabels=False),
+    aspectmode="data",
+    bgcolor="white",
+)
+SNAPSHOT_WIDTH = 1200
+SNAPSHOT_HEIGHT = 900
+GROUP_SNAPSHOT_COLUMNS = 3
+GROUP_SNAPSHOT_HEIGHT = 450
+CONTEXT_COLOR = (220, 220, 220)
+
+
+def plotly_model(lines: dict, nodes: dict, color_dict: dict, show_nodes: bool = True):
+    """
+    3D figure of all frames, colored per frame id by `color_dict` (plotly color, vkt.Color or (r, g, b) tuple),
+    black when missing. The traces are built from coordinate arrays, one line trace per color.
+    """
+    import plotly.graph_objects as go
+
+    frame_ids = list(lines)
+    start, end = frame_segments(lines, nodes, frame_ids)
+    data = line_traces(start, end, [color_dict.get(frame_id, "black") for frame_id in frame_ids])
+
+    if show_nodes:
+        node_ids = list(dict.fromkeys(lines[frame_id][end] for frame_id in frame_ids for end in ("nodeI", "nodeJ")))
+        xyz = np.array([[nodes[node_id][axis] for axis in "xyz"] for node_id in node_ids], dtype=np.float64)
+        xyz = xyz.reshape(-1, 3)
+        node_trace = go.Scatter3d(
+            x=xyz[:, 0],
+            y=xyz[:, 1],
+            z=xyz[:, 2],
+            mode="markers",
+            marker=dict(size=5, color="blue"),
+            text=[str(node_id) for node_id in node_ids],
+            hoverinfo="text",
+            showlegend=False,
+        )
+        data = [node_trace] + data
+
+    layout = go.Layout(scene=PLOTLY_SCENE, paper_bgcolor="white", margin=dict(r=0, l=0, b=0, t=0), showlegend=False)
+    return go.Figure(data=data, layout=layout)
+
+
+def plotly_groups(lines: dict, nodes: dict, color_dict: dict, group_frames: dict[str, list]):
+    """Grid of 3D views, one per group: the frames of the group colored by `color_dict` over the grey model."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    columns = max(1, min(GROUP_SNAPSHOT_COLUMNS, len(group_frames)))
+    rows = max(1, -(-len(group_frames) // columns))
+    figure = make_subplots(
+        rows=rows,
+        cols=columns,
+        specs=[[{"type": "scene"}] * columns for _ in range(rows)],
+        subplot_titles=list(group_frames),
+        horizontal_spacing=0.01,
+        vertical_spacing=0.04,
+    )
+
+    all_ids = list(lines)
+    start, end = frame_segments(lines, nodes, all_ids)
+    context = line_traces(start, end, [CONTEXT_COLOR] * len(all_ids), width=1)
+    for position, frame_ids in enumerate(group_frames.values()):
+        row, column = divmod(position, columns)
+        start, end = frame_segments(lines, nodes, frame_ids)
+        colors = [color_dict.get(frame_id, "black") for frame_id in frame_ids]
+        for trace in context + line_traces(start, end, colors, width=4):
+            figure.add_trace(go.Scatter3d(trace), row=row + 1, col=column + 1)
+
+    figure.update_scenes(**PLOTLY_SCENE)
+    figure.update_layout(
+        paper_bgcolor="white", margin=dict(r=0, l=0, b=0, t=30), showlegend=False, height=rows * GROUP_SNAPSHOT_HEIGHT
     )
+    return figure
+
 
-    # Create the figure and save it as a PNG image
-    fig = go.Figure(data=data, layout=layout)
-    fig.write_image("plot.png")
+# One kaleido process, started on first use and kept for every image of the worker
+_kaleido_scope = None
+_kaleido_lock = threading.Lock()
+
+
+def figure_to_png(figure, width: int = SNAPSHOT_WIDTH, height: int | None = None) -> bytes:
+    """Render a plotly figure to PNG bytes in memory, through the persistent kaleido process."""
+    global _kaleido_scope
+    import plotly
+    from kaleido.scopes.plotly import PlotlyScope
+
+    height = height or figure.layout.height or SNAPSHOT_HEIGHT
+    # The scope talks to its process over one pipe, images are rendered one at a time
+    with _kaleido_lock:
+        if _kaleido_scope is None:
+            # The plotly.js bundled with plotly, so no CDN is needed
+            plotlyjs = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+            _kaleido_scope = PlotlyScope(plotlyjs=plotlyjs, mathjax=False)
+        return _kaleido_scope.transform(figure, format="png", width=width, height=height)
+
+
+def report_snapshots(lines: dict, nodes: dict, frame_by_group: dict, group_frames: dict[str, list]) -> dict[str, bytes]:
+    """
+    PNG snapshots for the report: "model_snapshot" with every frame and "group_snapshots" with one view per
+    group, colored as in the 3D view. Returns no images when they cannot be rendered, the report is still made.
+    """
+    color_dict = {frame_id: colors_by_group(frame_by_group, frame_id).color for frame_id in lines}
+    try:
+        snapshots = {"model_snapshot": figure_to_png(plotly_model(lines, nodes, color_dict, show_nodes=False))}
+        if group_frames:
+            snapshots["group_snapshots"] = figure_to_png(plotly_groups(lines, nodes, color_dict, group_frames))
+    except Exception:
+        logger.warning("Model snapshots could not be rendered", exc_info=True)
+        return {}
+    return snapshots
 
 
 def get_color_for_ratio(ratio):
@@ -209,7 +251,8 @@ def get_color_for_ratio(ratio):
     else:
         return 255, 0, 0  # Red
 
-def render_legend(sections_group: list):
+def legend_entries() -> tuple[list[tuple[vkt.Point, vkt.Point, vkt.Color]], list[vkt.Label]]:
+    """Bars of the ratio legend as (bottom, top, color), bottom to top, and the labels next to them."""
     legend_cord_x = 0
     legend_cord_y = 0
     legend_cord_z = 30000  # Top of the legend
@@ -218,6 +261,7 @@ def render_legend(sections_group: list):
     legend_height = legend_cord_z - legend_cord_z2
     num_sections = 3
 
+    bars = []
     labels = []
 
     # Define colors and ratio ranges
@@ -243,10 +287,7 @@ def render_legend(sections_group: list):
 
         start_point = vkt.Point(legend_cord_x, legend_cord_y, z_start)
         end_point = vkt.Point(legend_cord_x, legend_cord_y, z_end)
-        line = vkt.Line(start_point, end_point)
-
-        section = vkt.RectangularExtrusion(700, 700, line, material=vkt.Material(color=color, opacity=0.8))
-        sections_group.append(section)
+        bars.append((start_point, end_point, color))
 
         # Create label for this section
         z = (z_start + z_end) / 2
@@ -265,4 +306,4 @@ def render_legend(sections_group: list):
     label_top = vkt.Label(text_point_top, f"{offset_str}Non Compliant", size_factor=0.7, color=vkt.Color(0, 0, 0))
     labels.append(label_top)
 
-    return sections_group, labels
\ No newline at end of file
+    return bars, labels
@@ -0,0 +1,149 @@
+"""
+Word report with a streamed results table.
+
+The templates hold the frame table as a `{%tr for r in table %}` loop. Rendering that loop row by row does not
+scale to large models, so each template is compiled once: the loop rows are replaced by a marker row, which is
+what `render_word_file` receives, and the data row is split into the XML around each cell value. After
+rendering, the rows are written in bulk in place of the marker while the document is copied to a new docx.
+"""
+
+import io
+import re
+import zipfile
+from itertools import chain, islice
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import openpyxl
+
+DOCUMENT_XML = "word/document.xml"
+TABLE_MARKER = "__FRAME_RESULTS_TABLE__"
+TABLE_LOOP = "{%tr for r in table %}"
+TABLE_LOOP_END = "{%tr endfor %}"
+# Rows joined per write to the compressed document
+ROWS_PER_CHUNK = 2000
+
+_ROW = re.compile(r"<w:tr[ >].*?</w:tr>", flags=re.S)
+_CELL = re.compile(r"<w:tc[ >].*?</w:tc>", flags=re.S)
+_TEXT = re.compile(r"<w:t(?: [^>]*)?>([^<]*)</w:t>")
+_FIELD = re.compile(r"r\s*\[\s*[“\"'](\w+)[”\"']\s*\]")
+
+
+def _text(xml: str) -> str:
+    return "".join(_TEXT.findall(xml))
+
+
+def _first(pattern: str, xml: str) -> str:
+    match = re.search(pattern, xml, flags=re.S)
+    return match.group(0) if match else ""
+
+
+def format_cell(value) -> str:
+    """Table text of a value: floats rounded to 2 decimals and "-" for missing values, as `OutputItem.serialize`."""
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return str(round(value, 2))
+    return escape(str(value))
+
+
+class ReportTemplate:
+    """
+    A report template compiled for the streamed table.
+    - content: The template with the table loop replaced by the marker row, to be rendered by `render_word_file`.
+    - fields: Keys of the result records shown in the table, in column order.
+    """
+
+    def __init__(self, template: bytes):
+        with zipfile.ZipFile(io.BytesIO(template)) as archive:
+            document = archive.read(DOCUMENT_XML).decode("utf-8")
+
+        rows = list(_ROW.finditer(document))
+        loop = next(index for index, row in enumerate(rows) if TABLE_LOOP in _text(row.group(0)))
+        loop_end = next(
+            index for index, row in enumerate(rows) if index > loop and TABLE_LOOP_END in _text(row.group(0))
+        )
+        self.fields, self._pieces = self._compile_row(rows[loop + 1].group(0))
+
+        marker_row = f"<w:tr><w:tc><w:p><w:r><w:t>{TABLE_MARKER}</w:t></w:r></w:p></w:tc></w:tr>"
+        document = document[: rows[loop].start()] + marker_row + document[rows[loop_end].end() :]
+        self.content = _replace_document(template, [document.encode("utf-8")])
+
+    @staticmethod
+    def _compile_row(row: str) -> tuple[list[str], list[str]]:
+        """Split the data row in the XML pieces around its cell values, keeping the row, cell and text formatting."""
+        fields, pieces = [], ["<w:tr>" + _first(r"<w:trPr>.*?</w:trPr>", row)]
+        for cell in _CELL.findall(row):
+            fields.append(_FIELD.search(_text(cell)).group(1))
+            paragraph_props = _first(r"<w:pPr>.*?</w:pPr>", cell)
+            run_props = re.search(r"<w:r[ >](?:(?!</w:r>).)*?(<w:rPr>.*?</w:rPr>)", cell, flags=re.S)
+            run_props = run_props.group(1) if run_props else ""
+            pieces[-1] += (
+                "<w:tc>" + _first(r"<w:tcPr>.*?</w:tcPr>", cell) + "<w:p>" + paragraph_props + "<w:r>" + run_props
+            )
+            pieces[-1] += '<w:t xml:space="preserve">'
+            pieces.append("</w:t></w:r></w:p></w:tc>")
+        pieces[-1] += "</w:tr>"
+        return fields, pieces
+
+    def rows_xml(self, records) -> str:
+        """Table rows of the result records (dicts with the template fields)."""
+        pieces, last = self._pieces[:-1], self._pieces[-1]
+        return "".join(
+            "".join(chain.from_iterable(zip(pieces, [format_cell(record[field]) for field in self.fields]))) + last
+            for record in records
+        )
+
+    def fill_table(self, rendered: bytes, records) -> bytes:
+        """Write the table rows of the `records` iterable in place of the marker row of a rendered report."""
+        with zipfile.ZipFile(io.BytesIO(rendered)) as archive:
+            document = archive.read(DOCUMENT_XML).decode("utf-8")
+        marker = next(row for row in _ROW.finditer(document) if TABLE_MARKER in row.group(0))
+
+        def chunks():
+            yield document[: marker.start()].encode("utf-8")
+            rows = iter(records)
+            while chunk := list(islice(rows, ROWS_PER_CHUNK)):
+                yield self.rows_xml(chunk).encode("utf-8")
+            yield document[marker.end() :].encode("utf-8")
+
+        return _replace_document(rendered, chunks())
+
+
+def _replace_document(docx: bytes, document_chunks) -> bytes:
+    """Copy of a docx with its main document written from `document_chunks`."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(docx)) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            if info.filename == DOCUMENT_XML:
+                with target.open(DOCUMENT_XML, "w") as stream:
+                    for chunk in document_chunks:
+                        stream.write(chunk)
+            else:
+                target.writestr(info, source.read(info.filename))
+    return output.getvalue()
+
+
+# Compiled templates by path, recompiled when the file changes
+_templates = {}
+
+
+def load_template(path: Path) -> ReportTemplate:
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    cached = _templates.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _templates[path] = (mtime, ReportTemplate(path.read_bytes()))
+    return cached[1]
+
+
+def table_workbook(records, headers: list[str]) -> bytes:
+    """Appendix xlsx with one row per result record, written in streaming (write-only) mode."""
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Frame Results")
+    worksheet.append(headers)
+    for record in records:
+        worksheet.append(list(record.values()))
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
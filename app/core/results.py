@@ -0,0 +1,200 @@
+"""
+Column store of the frame results shown in the table view and the report.
+
+Each field of `OutputItem` is one array: numbers as float64 with NaN for missing values, labels (group,
+section, load combination, connection type) as integer codes into a list of names, and the check as the
+`BatchResult.status` code. Values are only converted to Python objects, and formatted, for the rows that are
+displayed or exported.
+"""
+
+import numpy as np
+
+from app.core.batch_check import NOT_OK, OK, BatchResult
+from app.models.models import OutputItem
+
+FIELDS = list(OutputItem.model_fields)
+LABEL_FIELDS = ["group_name", "section_name", "load_combo", "conn_type"]
+NUMBER_FIELDS = ["V", "M", "P", "Vn", "Mn", "Pn", "capacity_ratio", "margin"]
+CHECK_LABELS = {OK: "OK", NOT_OK: "Not OK"}
+# Status filter label of the frames that could not be checked
+UNCHECKED_LABEL = "Not checked"
+
+# Orders of `ResultStore.select`
+CHECK_ORDER = "Check order"
+HIGHEST_RATIO = "Highest ratio first"
+LOWEST_RATIO = "Lowest ratio first"
+
+# Rows converted to Python objects at a time when iterating records
+RECORDS_PER_CHUNK = 2000
+
+
+def format_value(value):
+    """Displayed value, as `OutputItem.serialize`: floats rounded to 2 decimals and "-" for missing values."""
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+class ResultStore:
+    """
+    Frame results in the order they were checked.
+    - frame_ids: (n,) int64 frame ids.
+    - codes: Label field -> (n,) int32 codes into `labels[field]`, -1 for a missing label.
+    - numbers: Number field -> (n,) float64 values, NaN for a missing value.
+    - status: (n,) int8 `BatchResult.status` codes.
+    """
+
+    __slots__ = ("frame_ids", "codes", "labels", "numbers", "status", "_ratio_rank")
+
+    def __init__(self, frame_ids: np.ndarray, codes: dict, labels: dict, numbers: dict, status: np.ndarray):
+        self.frame_ids = frame_ids
+        self.codes = codes
+        self.labels = labels
+        self.numbers = numbers
+        self.status = status
+        self._ratio_rank = None
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def _rows(self, rows) -> np.ndarray:
+        return np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def column(self, field: str, rows=None) -> list:
+        """Values of a field for `rows` (all rows by default), with None for missing values."""
+        rows = self._rows(rows)
+        if field == "frame_id":
+            return self.frame_ids[rows].tolist()
+        if field == "check":
+            return [CHECK_LABELS.get(status) for status in self.status[rows].tolist()]
+        if field in self.codes:
+            names = self.labels[field] + [None]
+            return [names[code] for code in self.codes[field][rows].tolist()]
+        return [None if value != value else value for value in self.numbers[field][rows].tolist()]
+
+    def records(self, rows=None):
+        """Yield the `OutputItem` fields of `rows` as dicts, in chunks so only a chunk is held as objects."""
+        rows = self._rows(rows)
+        for start in range(0, len(rows), RECORDS_PER_CHUNK):
+            chunk = rows[start : start + RECORDS_PER_CHUNK]
+            columns = [self.column(field, chunk) for field in FIELDS]
+            for values in zip(*columns):
+                yield dict(zip(FIELDS, values))
+
+    def table_rows(self, rows=None) -> list[list]:
+        """Formatted table rows of `rows`, in the column order of `report_headers`."""
+        columns = [self.column(field, self._rows(rows)) for field in FIELDS]
+        return [[format_value(value) for value in values] for values in zip(*columns)]
+
+    def ratio_rank(self) -> np.ndarray:
+        """
+        Rank of every row by capacity ratio, 0 for the highest ratio and rows without a ratio last (in check
+        order). Computed once per store, so filtering and sorting a cached result is a matter of masks.
+        """
+        if self._ratio_rank is None:
+            ratio = self.numbers["capacity_ratio"]
+            order = np.argsort(np.where(np.isnan(ratio), np.inf, -ratio), kind="stable")
+            self._ratio_rank = np.empty(len(order), dtype=np.int64)
+            self._ratio_rank[order] = np.arange(len(order))
+        return self._ratio_rank
+
+    def _label_mask(self, field: str, names: list) -> np.ndarray:
+        names = set(names)
+        codes = [code for code, name in enumerate(self.labels[field]) if name in names]
+        return np.isin(self.codes[field], codes)
+
+    def select(
+        self,
+        groups: list | None = None,
+        sections: list | None = None,
+        conn_types: list | None = None,
+        checks: list | None = None,
+        order: str = CHECK_ORDER,
+        limit: int | None = None,
+    ) -> np.ndarray:
+        """
+        Rows matching the filters (an empty or missing filter keeps every row), limited to the `limit` rows
+        with the highest capacity ratio and sorted by `order`.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for field, names in [("group_name", groups), ("section_name", sections), ("conn_type", conn_types)]:
+            if names:
+                mask &= self._label_mask(field, names)
+        if checks:
+            statuses = [status for status, label in CHECK_LABELS.items() if label in checks]
+            checked = np.isin(self.status, statuses)
+            if UNCHECKED_LABEL in checks:
+                checked |= ~np.isin(self.status, list(CHECK_LABELS))
+            mask &= checked
+
+        rows = np.flatnonzero(mask)
+        rank = self.ratio_rank()[rows]
+        if limit and len(rows) > limit:
+            keep = np.sort(np.argpartition(rank, limit - 1)[:limit])
+            rows, rank = rows[keep], rank[keep]
+        if order == HIGHEST_RATIO:
+            return rows[np.argsort(rank)]
+        if order == LOWEST_RATIO:
+            ratio = self.numbers["capacity_ratio"][rows]
+            return rows[np.argsort(np.where(np.isnan(ratio), np.inf, ratio), kind="stable")]
+        return rows
+
+    def group_frames(self) -> dict[str, list]:
+        """Frame ids of every group, in order."""
+        group_frames = {}
+        names = self.labels["group_name"] + [None]
+        for code, frame_id in zip(self.codes["group_name"].tolist(), self.frame_ids.tolist()):
+            group_frames.setdefault(names[code], []).append(frame_id)
+        return group_frames
+
+
+class ResultStoreBuilder:
+    """Collects the results group by group and concatenates them into a ResultStore."""
+
+    def __init__(self):
+        self._frame_ids = []
+        self._labels = {field: {} for field in LABEL_FIELDS}
+        self._codes = {field: [] for field in LABEL_FIELDS}
+        self._numbers = {field: [] for field in NUMBER_FIELDS}
+        self._status = []
+
+    def _encode(self, field: str, values: list) -> np.ndarray:
+        labels = self._labels[field]
+        codes = [-1 if value is None else labels.setdefault(value, len(labels)) for value in values]
+        return np.array(codes, dtype=np.int32)
+
+    def add(
+        self,
+        frame_ids: list,
+        group_name: str,
+        conn_type: str,
+        section_names: list,
+        load_combos: list,
+        margin: np.ndarray | None,
+        result: BatchResult,
+    ) -> None:
+        """Add the results of a group, `margin` being None outside the envelope."""
+        n_frames = len(frame_ids)
+        self._frame_ids.append(np.asarray(frame_ids, dtype=np.int64))
+        self._codes["group_name"].append(self._encode("group_name", [group_name] * n_frames))
+        self._codes["conn_type"].append(self._encode("conn_type", [conn_type] * n_frames))
+        self._codes["section_name"].append(self._encode("section_name", section_names))
+        self._codes["load_combo"].append(self._encode("load_combo", load_combos))
+        for field in NUMBER_FIELDS[:-1]:
+            self._numbers[field].append(np.asarray(getattr(result, field), dtype=np.float64))
+        self._numbers["margin"].append(np.full(n_frames, np.nan) if margin is None else np.asarray(margin, float))
+        self._status.append(np.asarray(result.status, dtype=np.int8))
+
+    def build(self) -> ResultStore:
+        def concat(parts, dtype):
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+
+        return ResultStore(
+            frame_ids=concat(self._frame_ids, np.int64),
+            codes={field: concat(parts, np.int32) for field, parts in self._codes.items()},
+            labels={field: list(labels) for field, labels in self._labels.items()},
+            numbers={field: concat(parts, np.float64) for field, parts in self._numbers.items()},
+            status=concat(self._status, np.int8),
+        )
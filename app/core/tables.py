@@ -0,0 +1,128 @@
+"""
+Columnar readers of the ETABS tables exported as CSV files or as Parquet files, uploaded together in a zip.
+
+Every table is a member of the zip named after it ("Group Assignments.csv", "Element Joint Forces - Frame.parquet",
+...), matched ignoring case, spaces and punctuation, in any folder of the zip. CSV tables may keep the title line
+and units row of the ETABS layout. Only the requested columns are decoded, each in one pass, into the same
+DataFrames as the xlsx reader: identifiers and values as numbers, text that is not a number (such as "Global")
+as missing.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from pathlib import PurePosixPath
+
+import pandas as pd
+
+XLSX = "xlsx"
+CSV = "csv"
+PARQUET = "parquet"
+
+# Columns holding object ids, read as integers
+ID_COLUMNS = {"Object Name", "Object Unique Name", "Unique Name", "UniqueName", "UniquePtI", "UniquePtJ", "Joint"}
+NUMBER_COLUMNS = {"Global X", "Global Y", "Global Z", "F1", "F2", "F3", "M1", "M2", "M3"}
+# Label columns with few distinct values over many rows
+CATEGORY_COLUMNS = {"Output Case", "Case Type", "Object Type"}
+# Lines searched for the header of a CSV table (title line, header)
+HEADER_LINES = 5
+
+
+def detect_format(file_content: bytes) -> str:
+    """Format of an upload: an xlsx workbook, or a zip of CSV or of Parquet tables."""
+    if not zipfile.is_zipfile(io.BytesIO(file_content)):
+        raise ValueError("Unknown file format: upload an ETABS .xlsx export or a .zip of its CSV or Parquet tables")
+    with zipfile.ZipFile(io.BytesIO(file_content)) as archive:
+        names = archive.namelist()
+    if "xl/workbook.xml" in names:
+        return XLSX
+    suffixes = {PurePosixPath(name).suffix.lower() for name in names}
+    if f".{PARQUET}" in suffixes:
+        return PARQUET
+    if f".{CSV}" in suffixes:
+        return CSV
+    raise ValueError("The zip holds neither .csv nor .parquet tables")
+
+
+def _table_key(name: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def _clean_column(column: pd.Series, name: str) -> pd.Series:
+    if name in ID_COLUMNS:
+        numbers = pd.to_numeric(column, errors="coerce")
+        # Nullable integers, so that ids stay ints next to the missing values
+        integral = numbers.dropna()
+        return numbers.astype("Int64") if (integral == integral.round()).all() else numbers
+    if name in NUMBER_COLUMNS:
+        return pd.to_numeric(column, errors="coerce")
+    return column
+
+
+class TableBundle:
+    """The tables of a zipped CSV or Parquet export, each read when requested."""
+
+    def __init__(self, file_content: bytes, file_format: str):
+        self.format = file_format
+        self._archive = zipfile.ZipFile(io.BytesIO(file_content))
+        self._members = {
+            _table_key(PurePosixPath(name).stem): name
+            for name in self._archive.namelist()
+            if PurePosixPath(name).suffix.lower() == f".{file_format}" and not name.startswith("__MACOSX/")
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._archive.close()
+
+    def read(self, table: str, columns: list[str]) -> pd.DataFrame:
+        """The `columns` of a table, without the rows left without any value."""
+        member = self._members.get(_table_key(table))
+        if member is None:
+            raise ValueError(f"The zip has no '{table}.{self.format}' table")
+        if self.format == PARQUET:
+            table_df = self._read_parquet(member, columns)
+        else:
+            table_df = self._read_csv(member, table, columns)
+        table_df = pd.DataFrame({column: _clean_column(table_df[column], column) for column in columns})
+        return table_df.dropna(how="all").reset_index(drop=True)
+
+    def _read_csv(self, member: str, table: str, columns: list[str]) -> pd.DataFrame:
+        # The header is the first line holding every column, the line after it is skipped when it has no ids
+        with self._archive.open(member) as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            lines = [row for _, row in zip(range(HEADER_LINES + 1), csv.reader(text))]
+        header_index = next((i for i, row in enumerate(lines[:HEADER_LINES]) if set(columns) <= set(row)), None)
+        if header_index is None:
+            found = max(lines[:HEADER_LINES], key=lambda row: len(set(columns) & set(row)), default=[])
+            missing = [column for column in columns if column not in found]
+            raise ValueError(f"Table '{table}' is missing the columns: {', '.join(missing)}")
+        skip = list(range(header_index))
+        header = lines[header_index]
+        if header_index + 1 < len(lines):
+            after = dict(zip(header, lines[header_index + 1]))
+            if all(not after.get(column, "").strip() for column in columns if column in ID_COLUMNS):
+                skip.append(header_index + 1)
+
+        with self._archive.open(member) as raw:
+            return pd.read_csv(
+                raw,
+                encoding="utf-8-sig",
+                skiprows=skip,
+                usecols=columns,
+                dtype={column: "category" for column in columns if column in CATEGORY_COLUMNS},
+                skip_blank_lines=True,
+                low_memory=False,
+            )
+
+    def _read_parquet(self, member: str, columns: list[str]) -> pd.DataFrame:
+        try:
+            return pd.read_parquet(io.BytesIO(self._archive.read(member)), columns=columns)
+        except ImportError as exc:
+            raise ValueError("Reading Parquet tables requires pyarrow (pip install pyarrow)") from exc
@@ -0,0 +1,62 @@
+import numpy as np
+
+from app.core.local_axes import direction_cosines
+
+
+class Topology:
+    """
+    Frame-centric index of the model, built in one pass over the parsed entities.
+    - node_ids: (N,) node ids, with `node_xyz` (N, 3) their coordinates and `node_index` id -> row.
+    - frame_ids: (M,) frame ids, with `frame_index` id -> row.
+    - frame_nodes: (M, 2) ids of nodeI and nodeJ of every frame.
+    - frame_node_rows: (M, 2) rows of nodeI and nodeJ in `node_xyz`, -1 when the node is unknown.
+    - frame_axes: (M, 3, 3) local axes of every frame (see `app.core.local_axes`), NaN when a node is unknown.
+    - frame_section: frame id -> section name.
+    - frame_groups: frame id -> names of the groups the frame belongs to.
+    """
+
+    def __init__(self, nodes: dict, lines: dict, groups: dict, sections: dict):
+        self.node_ids = np.fromiter(nodes.keys(), dtype=np.int64, count=len(nodes))
+        self.node_xyz = np.array([(node["x"], node["y"], node["z"]) for node in nodes.values()], dtype=np.float64)
+        self.node_xyz = self.node_xyz.reshape(-1, 3)
+        self.node_index = {node_id: row for row, node_id in enumerate(nodes)}
+
+        self.frame_ids = np.fromiter(lines.keys(), dtype=np.int64, count=len(lines))
+        self.frame_index = {frame_id: row for row, frame_id in enumerate(lines)}
+        self.frame_nodes = np.array([(line["nodeI"], line["nodeJ"]) for line in lines.values()], dtype=np.int64)
+        self.frame_nodes = self.frame_nodes.reshape(-1, 2)
+        self.frame_node_rows = np.array(
+            [self.node_index.get(node_id, -1) for node_id in self.frame_nodes.ravel().tolist()], dtype=np.int64
+        ).reshape(-1, 2)
+        ends = np.vstack([self.node_xyz, np.full((1, 3), np.nan)])[self.frame_node_rows]
+        self.frame_axes = direction_cosines(ends[:, 0], ends[:, 1])
+
+        self.frame_section = {}
+        for section_name, section_vals in sections.items():
+            for frame_id in section_vals["frame_ids"]:
+                # A frame keeps the first section it is listed under
+                self.frame_section.setdefault(frame_id, section_name)
+
+        self.frame_groups = {}
+        for group_name, group_vals in groups.items():
+            for frame_id in group_vals["frame_ids"]:
+                self.frame_groups.setdefault(frame_id, []).append(group_name)
+
+    def section_of(self, frame_id: int) -> str | None:
+        return self.frame_section.get(frame_id)
+
+    def groups_of(self, frame_id: int) -> list[str]:
+        return self.frame_groups.get(frame_id, [])
+
+    def node_coordinates(self, node_id: int) -> np.ndarray:
+        return self.node_xyz[self.node_index[node_id]]
+
+    def axes_of(self, frame_ids) -> np.ndarray:
+        """(n, 3, 3) local axes of the frames, NaN for frames that are not in the model."""
+        rows = np.array([self.frame_index.get(frame_id, -1) for frame_id in frame_ids], dtype=np.int64)
+        axes = np.vstack([self.frame_axes, np.full((1, 3, 3), np.nan)])
+        return axes[rows]
+
+    def frame_coordinates(self, frame_id: int) -> np.ndarray:
+        """(2, 3) coordinates of nodeI and nodeJ of a frame."""
+        return self.node_xyz[self.frame_node_rows[self.frame_index[frame_id]]]
@@ -1,6 +1,16 @@
+import hashlib
 import json
+import logging
+import pickle
+import re
 from pathlib import Path
 
+import numpy as np
+
+from app.core.cache import MODEL_CACHE_DIR, private_directory
+
+logger = logging.getLogger(__name__)
+
 connection_types = [
     "MEP 70%/35% (Moment/Shear)",
     "MEP 100%/50% (Moment/Shear)",
@@ -12,6 +22,21 @@ connection_types = [
     "Web Cleat 40%",
 ]
 
+DB_DIR = Path(__file__).parent / "db"
+LIBRARY_SOURCES = {
+    "Web Cleat": DB_DIR / "web_cope_capacities.json",
+    "Moment End Plate": DB_DIR / "mep_capacities.json",
+    "Base Plate": DB_DIR / "bp_capacities.json",
+}
+CAPACITY_QUANTITIES = ["Shear", "MomentTop", "MomentBottom", "Axial"]
+# Compiled copy on disk, next to the model cache and unpickled from there: None disables it with the disk cache
+LIBRARY_CACHE_PATH = Path(MODEL_CACHE_DIR) / "capacity_library.pkl" if MODEL_CACHE_DIR else None
+# Bump when CapacityLibrary changes, so compiled copies on disk are rebuilt
+LIBRARY_FORMAT = 1
+
+# Standard steel section designations, e.g. 200UB18.2, 310UC118 or 1200WB249
+SECTION_PATTERN = re.compile(r"^[1-9]\d{2,3}[A-Z]{2,3}\d+(\.\d+)?$")
+
 
 def load_json(file_path: Path):
     with file_path.open() as jsonfile:
@@ -19,17 +44,165 @@ def load_json(file_path: Path):
     return data
 
 
+class CapacityLibrary:
+    """
+    Connection library compiled into a dense (section, tier, quantity) capacity array.
+    - sections / tiers: Names indexed by the first two axes, with `section_index` / `tier_index` name -> code.
+    - tier_types: Connection type ("Web Cleat", ...) the tier belongs to.
+    - capacities: float array of shape (sections, tiers, len(CAPACITY_QUANTITIES)), NaN where undefined.
+    - issues: Inconsistent keys found while compiling.
+    - fingerprint: Hash of the JSON sources the library was compiled from.
+    """
+
+    def __init__(self, sections, tiers, tier_types, capacities, issues, fingerprint):
+        self.sections = sections
+        self.tiers = tiers
+        self.tier_types = tier_types
+        self.capacities = capacities
+        self.issues = issues
+        self.fingerprint = fingerprint
+        self.section_index = {name: code for code, name in enumerate(sections)}
+        self.tier_index = {name: code for code, name in enumerate(tiers)}
+        self.quantity_index = {name: code for code, name in enumerate(CAPACITY_QUANTITIES)}
+        self._legacy = None
+
+    @classmethod
+    def compile(cls, sources: dict[str, dict], fingerprint: str = "") -> "CapacityLibrary":
+        """Compile the parsed JSON sources, keyed by connection type, and flag inconsistent keys."""
+        issues = []
+        known_tiers = {re.sub(r"\s+", "", tier): tier for tier in connection_types}
+        entries = []  # (section, tier, connection type, values)
+        for cont_type, data in sources.items():
+            for section_name, tiers in data.items():
+                if not SECTION_PATTERN.match(section_name):
+                    issues.append(f"{cont_type}: section '{section_name}' is not a valid section name (truncated?)")
+                for tier, values in tiers.items():
+                    if tier not in connection_types:
+                        # Kept under its own name: a misspelled tier is reported, never read as another one
+                        issue = f"{cont_type}: tier '{tier}' of '{section_name}' is not a connection type"
+                        suggestion = known_tiers.get(re.sub(r"\s+", "", tier))
+                        issues.append(f"{issue} (did you mean '{suggestion}'?)" if suggestion else issue)
+                    unknown = set(values) - set(CAPACITY_QUANTITIES)
+                    if unknown:
+                        issues.append(
+                            f"{cont_type}: '{section_name}' / '{tier}' has unknown quantities {sorted(unknown)}"
+                        )
+                    entries.append((section_name, tier, cont_type, values))
+
+        sections = list(dict.fromkeys(entry[0] for entry in entries))
+        tiers = list(dict.fromkeys([*connection_types, *(entry[1] for entry in entries)]))
+        section_index = {name: code for code, name in enumerate(sections)}
+        tier_index = {name: code for code, name in enumerate(tiers)}
+        tier_types = [None] * len(tiers)
+        capacities = np.full((len(sections), len(tiers), len(CAPACITY_QUANTITIES)), np.nan)
+        for section_name, tier, cont_type, values in entries:
+            tier_code = tier_index[tier]
+            if tier_types[tier_code] not in (None, cont_type):
+                issues.append(f"Tier '{tier}' is used by both {tier_types[tier_code]} and {cont_type}")
+            tier_types[tier_code] = cont_type
+            for quantity, value in values.items():
+                if quantity in CAPACITY_QUANTITIES:
+                    capacities[section_index[section_name], tier_code, CAPACITY_QUANTITIES.index(quantity)] = value
+
+        # Condense the per-section notes, one line per distinct problem
+        issues = list(dict.fromkeys(re.sub(r" of '[^']*'", "", issue) for issue in issues))
+        return cls(sections, tiers, tier_types, capacities, issues, fingerprint)
+
+    def lookup(self, cont_type: str, section_names: list, tier: str, quantities: list[str]) -> dict[str, np.ndarray]:
+        """
+        Per frame capacity of every quantity for one tier. NaN when the section is not in the library,
+        the tier has no value for it, or the tier belongs to another connection type.
+        """
+        tier_code = self.tier_index.get(tier, -1)
+        if tier_code < 0 or self.tier_types[tier_code] != cont_type:
+            return {quantity: np.full(len(section_names), np.nan) for quantity in quantities}
+        section_codes = np.array([self.section_index.get(name, -1) for name in section_names], dtype=np.int64)
+        known = section_codes >= 0
+        quantity_codes = [self.quantity_index[quantity] for quantity in quantities]
+        values = np.full((len(section_names), len(quantities)), np.nan)
+        values[known] = self.capacities[section_codes[known], tier_code][:, quantity_codes]
+        return {quantity: values[:, position] for position, quantity in enumerate(quantities)}
+
+    def to_dict(self) -> dict:
+        """Nested `{connection type: {section: {tier: {quantity: value}}}}` layout of `gen_library`."""
+        if self._legacy is None:
+            library = {cont_type: {} for cont_type in LIBRARY_SOURCES}
+            defined = ~np.isnan(self.capacities)
+            for section_code, tier_code in zip(*np.nonzero(defined.any(axis=2))):
+                cont_type = self.tier_types[tier_code]
+                values = {
+                    quantity: self.capacities[section_code, tier_code, quantity_code].item()
+                    for quantity_code, quantity in enumerate(CAPACITY_QUANTITIES)
+                    if defined[section_code, tier_code, quantity_code]
+                }
+                section = library[cont_type].setdefault(self.sections[section_code], {})
+                section[self.tiers[tier_code]] = values
+            self._legacy = library
+        return self._legacy
+
+
+def _source_stats() -> dict[str, tuple[int, int]]:
+    return {cont_type: (path.stat().st_mtime_ns, path.stat().st_size) for cont_type, path in LIBRARY_SOURCES.items()}
+
+
+def _source_hash() -> str:
+    digest = hashlib.sha256()
+    for path in LIBRARY_SOURCES.values():
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _read_cached_library(stats: dict) -> CapacityLibrary | None:
+    """Compiled library from disk, if it was compiled from JSON sources with the same mtime or contents."""
+    # Only read from a directory no other user can write to (see `private_directory`)
+    if LIBRARY_CACHE_PATH is None or private_directory(LIBRARY_CACHE_PATH.parent) is None:
+        return None
+    try:
+        cached = pickle.loads(LIBRARY_CACHE_PATH.read_bytes())
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if cached.get("format") != LIBRARY_FORMAT:
+        return None
+    if cached["stats"] == stats or cached["library"].fingerprint == _source_hash():
+        return cached["library"]
+    return None
+
+
+def _write_cached_library(stats: dict, library: CapacityLibrary) -> None:
+    if LIBRARY_CACHE_PATH is None or private_directory(LIBRARY_CACHE_PATH.parent) is None:
+        return
+    try:
+        tmp_path = LIBRARY_CACHE_PATH.with_suffix(".tmp")
+        tmp_path.write_bytes(
+            pickle.dumps(
+                {"format": LIBRARY_FORMAT, "stats": stats, "library": library}, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        )
+        tmp_path.replace(LIBRARY_CACHE_PATH)
+    except OSError:
+        pass  # Compiling again is cheap, the disk copy only saves the JSON parse on worker start
+
+
+_compiled = {"stats": None, "library": None}
+
+
+def get_library() -> CapacityLibrary:
+    """
+    Compiled connection library, built once per process. The JSON sources are checked by mtime on
+    every call, so edits to the library are picked up without a restart.
+    """
+    stats = _source_stats()
+    if _compiled["stats"] != stats:
+        library = _read_cached_library(stats)
+        if library is None:
+            sources = {cont_type: load_json(path) for cont_type, path in LIBRARY_SOURCES.items()}
+            library = CapacityLibrary.compile(sources, fingerprint=_source_hash())
+            for issue in library.issues:
+                logger.warning("Connection library: %s", issue)
+        _write_cached_library(stats, library)
+        _compiled.update(stats=stats, library=library)
+    return _compiled["library"]
+
+
 def gen_library():
-    # Get the directory of the current script
-    current_dir = Path(__file__).parent
-    
-    # Construct paths using Path
-    bp_path = current_dir / "db" / "bp_capacities.json"
-    mep_path = current_dir / "db" / "mep_capacities.json"
-    wcp_path = current_dir / "db" / "web_cope_capacities.json"
-
-    bp = load_json(bp_path)
-    mep = load_json(mep_path)
-    wcp = load_json(wcp_path)
-
-    return {"Web Cleat": wcp, "Moment End Plate": mep, "Base Plate": bp}
+    return get_library().to_dict()
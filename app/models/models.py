@@ -47,6 +47,7 @@ class OutputItem(BaseModel):
     Mn: float | None = None
     Pn: float | None = None
     capacity_ratio: float | None = None
+    margin: float | None = None
     check: str | None = None
 
     def serialize(self) -> dict[str, any]:
@@ -110,9 +111,18 @@ class ComplianceSummaryModel(BaseModel):
 class ConnectionSummaryModel(BaseModel):
     group_name: str
     connection_type: str
+    driving_members: list[int] | str | None = Field(
+        default=None, description="Members that require the selected connection type or '-' if empty"
+    )
 
-    def serialize(self) -> dict[str, str]:
-        return {"group_name": self.group_name, "con_type": self.connection_type}
+    @field_validator("driving_members", mode="before")
+    def replace_empty_list(cls, value):
+        if isinstance(value, list) and not value:
+            return "-"
+        return value
+
+    def serialize(self) -> dict[str, Union[str, list[int]]]:
+        return {"group_name": self.group_name, "con_type": self.connection_type, "driving_member": self.driving_members}
 
 
 class ComplianceSummaryList:
@@ -138,9 +148,13 @@ class ConnectionSummaryList:
     def __init__(self):
         self.items: list[ConnectionSummaryModel] = []
 
-    def parse_from_dict(self, data: dict[str, str]) -> None:
+    def parse_from_dict(self, data: dict[str, str], drivers: dict[str, list[int]] | None = None) -> None:
         """Parse a dictionary into a list of ConnectionSummaryModel instances."""
-        self.items = [ConnectionSummaryModel(group_name=group, connection_type=type_) for group, type_ in data.items()]
+        drivers = drivers or {}
+        self.items = [
+            ConnectionSummaryModel(group_name=group, connection_type=type_, driving_members=drivers.get(group))
+            for group, type_ in data.items()
+        ]
 
     def serialize(self) -> dict[str, list[dict[str, str]]]:
         """Serialize all items for Jinja template rendering with the key 'con_summary'."""
@@ -164,5 +178,6 @@ report_headers = [
     "ΦM [kNm]",
     "ΦP [kN]",
     "Capacity Ratio",
+    "Margin to Next Combo",
     "OK / Not OK",
 ]
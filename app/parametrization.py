@@ -1,30 +1,53 @@
 import viktor as vkt
 from app.library.load_db import connection_types
-from app.core.parse_xlsx_files import get_groups, get_load_combos, get_entities
+from app.core.parse_xlsx_files import get_groups, get_load_combos, get_sections
+from app.core.batch_check import ENVELOPE_COMBO
+from app.core.profiling import PROFILE
+from app.core.results import CHECK_ORDER, HIGHEST_RATIO, LOWEST_RATIO, UNCHECKED_LABEL
 from textwrap import dedent
 
+REPORT_TABLE_APPENDIX = "Appendix (.xlsx)"
+
+
+# The first callback that sees a new file starts loading the full model in the background, the views
+# then attach to that load instead of parsing the file again
+@vkt.memoize
+def read_groups(file) -> list:
+    xlsx_file = file.file
+    file_content = xlsx_file.getvalue_binary()
+    return get_groups(file_content)
+
 
 @vkt.memoize
-def read_file(file) -> list:
+def read_load_combos(file) -> list:
     xlsx_file = file.file
     file_content = xlsx_file.getvalue_binary()
-    groups = get_groups(file_content)
-    combos = get_load_combos(file_content)
-    all_stuff = get_entities(file_content)
-    return [groups, combos, all_stuff]
+    return get_load_combos(file_content)
+
+
+@vkt.memoize
+def read_sections(file) -> list:
+    xlsx_file = file.file
+    file_content = xlsx_file.getvalue_binary()
+    return get_sections(file_content)
 
 
 def get_possible_columns(params, **kwargs):
     if params.step_1.tab_1.csv_file:
-        result = read_file(params.step_1.tab_1.csv_file)
-        return result[0]
-    return ["First upload a .xlsx file"]
+        return read_groups(params.step_1.tab_1.csv_file)
+    return ["First upload a .xlsx or .zip file"]
+
+
+def get_possible_sections(params, **kwargs):
+    if params.step_1.tab_1.csv_file:
+        return read_sections(params.step_1.tab_1.csv_file)
+    return ["First upload a .xlsx or .zip file"]
 
 
 def get_possible_load_combos(params, **kwargs):
     if params.step_1.tab_1.csv_file:
-        return read_file(params.step_1.tab_1.csv_file)[1]
-    return ["First upload a .xlsx file"]
+        return [ENVELOPE_COMBO] + read_load_combos(params.step_1.tab_1.csv_file)
+    return ["First upload a .xlsx or .zip file"]
 
 
 def visible(params, **kwargs):
@@ -52,11 +75,14 @@ class Parametrization(vkt.Parametrization):
             ## Step 1: Upload Your `.xlsx` File
             Export your model's results in `.xlsx` format from ETABS,
             click on the file loader below, and upload the `.xlsx` file.
+            For large models, the tables can also be exported as CSV files
+            (or converted to Parquet) and uploaded together in a `.zip` file.
         """
         )
     )
     step_1.tab_1.csv_file = vkt.FileField(
-        "**Upload a .xlsx file:**",
+        "**Upload a .xlsx or .zip file:**",
+        file_types=[".xlsx", ".zip"],
         flex=50,
     )
     step_1.tab_1.lines = vkt.LineBreak()
@@ -109,25 +135,58 @@ class Parametrization(vkt.Parametrization):
         path="base_plate.png", align="center", caption="Figure 3: Base Plate", max_width=250
     )
     # %%
-    step_2 = vkt.Step("Connection Checks", views=["connection_check", "results_table_view"], width=30)
+    # The pipeline profile is a debug view, only offered when profiling is enabled
+    step_2 = vkt.Step(
+        "Connection Checks",
+        views=["connection_check", "results_table_view"] + (["profile_view"] if PROFILE else []),
+        width=30,
+    )
     step_2.text = vkt.Text(
         dedent(
             """
         # Run Calculations:
         Select a load combination to verify or design the connection based on the defined "Calculation Mode".
         The 3D view shows a model where compliant beams are green, and non-compliant beams are red.
+        Select "Envelope (all combinations)" to check or design against every combination at once and report
+        the governing combination of each frame.
         """
         )
     )
     step_2.load_combos = vkt.OptionField("Load Combinations", options=get_possible_load_combos)
+    step_2.table_text = vkt.Text(
+        dedent(
+            """
+        # Frame Results Table:
+        Filter the frames shown in the table, leave a filter empty to show all of them. Only the frames
+        with the highest capacity ratio are shown, up to the set number (0 shows every frame).
+        """
+        )
+    )
+    step_2.table_groups = vkt.MultiSelectField("Groups", options=get_possible_columns, flex=50)
+    step_2.table_sections = vkt.MultiSelectField("Sections", options=get_possible_sections, flex=50)
+    step_2.table_conn_types = vkt.MultiSelectField(
+        "Connection Types", options=["Web Cleat", "Moment End Plate", "Base Plate"], flex=50
+    )
+    step_2.table_checks = vkt.MultiSelectField("Status", options=["OK", "Not OK", UNCHECKED_LABEL], flex=50)
+    step_2.table_order = vkt.OptionField(
+        "Sort", options=[CHECK_ORDER, HIGHEST_RATIO, LOWEST_RATIO], default=HIGHEST_RATIO, flex=50
+    )
+    step_2.table_limit = vkt.IntegerField("Worst Frames Shown", default=500, min=0, flex=50)
     step_2.text2 = vkt.Text(
         dedent(
             """ 
         # Download Report:
         After the check, download a detailed report with inputs, load combinations, forces, and compliance status.
         The report, exported as a Word document, is useful for documentation, sharing, or record-keeping.
+        For large models, the frame results table can be moved to an `.xlsx` appendix next to the report.
         """
         )
     )
+    step_2.report_table = vkt.OptionField(
+        "Frame Results Table",
+        options=["In the report", REPORT_TABLE_APPENDIX],
+        default="In the report",
+        variant="radio-inline",
+    )
     step_2.break_line = vkt.LineBreak()
     step_2.download_buttoms = vkt.DownloadButton("Generate Report", method="generate_report", longpoll=True)
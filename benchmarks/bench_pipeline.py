@@ -0,0 +1,203 @@
+"""
+End-to-end benchmark of the app pipeline on synthetic ETABS exports of several sizes.
+
+Stages, in the order the app runs them:
+- parse: `get_entities` on the uploaded bytes.
+- index: `Topology` and the joint elevations used by the batch checks.
+- check / check envelope: the connection check for one combination and for all of them.
+- design: the connection design for one combination.
+- geometry: `ModelGeometry` and its GLB with the check colors.
+- report snapshots / report table: the model images and the streamed results table of the Word report, plus
+  the xlsx appendix. The rendering of the summaries by the VIKTOR service is not included.
+
+Every size runs in a fresh process. The time of a stage is the best of `--repeat` runs, its peak memory the
+highest resident set size reached during the stage (reset before every stage on Linux, the process peak so far
+elsewhere). The results are printed and written as JSON to `--output`.
+
+With `--envelope` the joint forces are reduced to their envelope rows while parsing (see `envelope_forces`).
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes small medium [--repeat 3] [--output bench_results.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.pipeline import run_checks, run_design  # noqa: E402
+from app.core.batch_check import ENVELOPE_COMBO, joint_elevations  # noqa: E402
+from app.core.design import design_tiers  # noqa: E402
+from app.core.gltf import ModelGeometry, frame_colors  # noqa: E402
+from app.core.parallel import WORKERS  # noqa: E402
+from app.core.parse_xlsx_files import get_entities  # noqa: E402
+from app.core.render import colors_by_group, report_snapshots  # noqa: E402
+from app.core.report import load_template, table_workbook  # noqa: E402
+from app.core.topology import Topology  # noqa: E402
+from app.library.load_db import get_library  # noqa: E402
+from app.models.models import report_headers  # noqa: E402
+
+from synthetic_workbook import connection_type_of, write_workbook  # noqa: E402
+
+# Model sizes as (storeys, bays, groups, combinations)
+SIZES = {
+    "small": (3, 3, 3, 4),
+    "medium": (10, 5, 5, 10),
+    "large": (20, 8, 9, 20),
+    "xlarge": (40, 10, 13, 30),
+}
+
+
+def _reset_peak_rss() -> None:
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is reported in kB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def run_stages(path: str, repeat: int, workers: int, envelope: bool = False) -> dict:
+    """Run every stage on the workbook at `path`, returning {stage: {"seconds", "peak_rss_mb"}}."""
+    stages = {}
+
+    @contextmanager
+    def stage(name: str):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        previous = stages.get(name, {"seconds": float("inf"), "peak_rss_mb": 0.0})
+        stages[name] = {
+            "seconds": min(previous["seconds"], elapsed),
+            "peak_rss_mb": max(previous["peak_rss_mb"], _peak_rss_mb()),
+        }
+
+    file_content = Path(path).read_bytes()
+    library = get_library()
+    templates = Path(__file__).resolve().parents[1] / "app" / "library" / "templates"
+    for _ in range(repeat):
+        with stage("parse"):
+            entities = get_entities(file_content, envelope=envelope)
+        nodes, lines, groups, sections, load_combos, topology = entities
+
+        with stage("index"):
+            Topology(nodes, lines, groups, sections)
+            joint_elevations(load_combos, nodes)
+
+        cont_types = [
+            SimpleNamespace(
+                groups=group_name,
+                connection_type=connection_type_of(group_name),
+                color=None,
+                capacities=design_tiers(library, connection_type_of(group_name))[0],
+            )
+            for group_name in groups
+        ]
+        combo = load_combos.combos[0]
+        with stage("check"):
+            frame_by_group, results = run_checks(entities, library, cont_types, combo, workers)
+        with stage("check envelope"):
+            run_checks(entities, library, cont_types, ENVELOPE_COMBO, workers)
+        with stage("design"):
+            run_design(entities, library, cont_types, combo, workers)
+
+        with stage("geometry"):
+            geometry = ModelGeometry(sections, lines, nodes)
+            geometry.glb(frame_colors(geometry.frame_ids, frame_by_group, colors_by_group), legend=True)
+
+        with stage("report snapshots"):
+            report_snapshots(lines, nodes, frame_by_group, results.group_frames())
+        with stage("report table"):
+            template = load_template(templates / "report_template.docx")
+            template.fill_table(template.content, results.records())
+            table_workbook(results.records(), report_headers)
+
+    return stages
+
+
+def _measure(path: str, repeat: int, workers: int, envelope: bool, queue) -> None:
+    start_peak = _peak_rss_mb()
+    stages = run_stages(path, repeat, workers, envelope)
+    queue.put({"stages": stages, "baseline_rss_mb": start_peak})
+
+
+def measure(path: str, repeat: int, workers: int, envelope: bool = False) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(path, repeat, workers, envelope, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Processes of the batch checks")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--envelope", action="store_true", help="Reduce the joint forces while parsing")
+    args = parser.parse_args()
+
+    workers = args.workers or WORKERS
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": workers,
+        "repeat": args.repeat,
+        "envelope": args.envelope,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            storeys, bays, groups, combos = SIZES[size]
+            path = Path(directory) / f"{size}.xlsx"
+            start = time.perf_counter()
+            counts = write_workbook(path, storeys, bays, groups, combos)
+            print(f"\n{size}: " + ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items()))
+            print(f"generated in {time.perf_counter() - start:.1f} s, {path.stat().st_size / 1e6:.1f} MB")
+
+            result = measure(str(path), args.repeat, workers, args.envelope)
+            report["sizes"][size] = {
+                "storeys": storeys,
+                "bays": bays,
+                "groups": groups,
+                "combos": combos,
+                **counts,
+                "file_mb": path.stat().st_size / 1e6,
+                **result,
+            }
+            print(f"{'stage':<18} {'best time [s]':>14} {'peak RSS [MB]':>14}")
+            for name, values in result["stages"].items():
+                print(f"{name:<18} {values['seconds']:>14.3f} {values['peak_rss_mb']:>14.1f}")
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
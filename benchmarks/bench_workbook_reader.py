@@ -0,0 +1,80 @@
+"""
+Compare the workbook reader of `extract_sheets` with the previous approach, where `get_groups`,
+`get_load_combos` and `extract_sheets` each opened the workbook and read every column.
+
+Usage:
+    python benchmarks/bench_workbook_reader.py path/to/etabs_export.xlsx [--repeat 3]
+
+Every run happens in a fresh process so the peak RSS of both readers is measured independently.
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd  # noqa: E402
+
+from app.core.parse_xlsx_files import SHEET_COLUMNS, extract_sheets  # noqa: E402
+
+
+def legacy_reader(file_content):
+    with pd.ExcelFile(io.BytesIO(file_content)) as excel_file:
+        pd.read_excel(excel_file, sheet_name="Group Assignments", skiprows=1)
+    with pd.ExcelFile(io.BytesIO(file_content)) as excel_file:
+        pd.read_excel(excel_file, sheet_name=["Element Joint Forces - Frame"], skiprows=1)
+    with pd.ExcelFile(io.BytesIO(file_content)) as excel_file:
+        for sheet in SHEET_COLUMNS:
+            pd.read_excel(excel_file, sheet_name=sheet, skiprows=1)
+
+
+def projected_reader(file_content):
+    extract_sheets(file_content)
+
+
+READERS = {"legacy": legacy_reader, "projected": projected_reader}
+
+
+def run(reader_name, path, queue):
+    file_content = Path(path).read_bytes()
+    start = time.perf_counter()
+    READERS[reader_name](file_content)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kB on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def measure(reader_name, path):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run, args=(reader_name, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="ETABS .xlsx export")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'reader':<10} {'best time [s]':>14} {'peak RSS [MB]':>14}")
+    results = {}
+    for reader_name in READERS:
+        runs = [measure(reader_name, args.path) for _ in range(args.repeat)]
+        results[reader_name] = (min(run[0] for run in runs), max(run[1] for run in runs))
+        print(f"{reader_name:<10} {results[reader_name][0]:>14.2f} {results[reader_name][1]:>14.1f}")
+
+    legacy, projected = results["legacy"], results["projected"]
+    print(f"speed-up: {legacy[0] / projected[0]:.2f}x, peak RSS: {projected[1] - legacy[1]:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
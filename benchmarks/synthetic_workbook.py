@@ -0,0 +1,244 @@
+"""
+Write synthetic ETABS exports with the six tables read by `extract_sheets`.
+
+The model is a regular moment frame: a grid of `bays` x `bays` bays over `storeys` storeys, with a column at every
+grid point of every storey and beams along X and Y at every floor. Every table has the ETABS layout (title row,
+header row, units row), either as a sheet of an xlsx workbook or as a CSV file of a zip (`--format csv`). The
+forces table holds two joints and a Max/Min step per frame and combination, plus a few load case rows that are not
+combinations.
+
+Groups:
+- "GF Columns": the ground floor columns (Base Plate).
+- "Beams X <band>" / "Beams Y <band>": the beams of each direction, split in bands of floors so that there are
+  `groups` groups in total (Moment End Plate along X, Web Cleat along Y).
+
+Usage:
+    python benchmarks/synthetic_workbook.py out.xlsx --storeys 10 --bays 5 --groups 5 --combos 10
+    python benchmarks/synthetic_workbook.py out.zip --format csv
+"""
+
+import argparse
+import csv
+import io
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+
+STOREY_HEIGHT = 3500.0
+SPAN = 6000.0
+COLUMN_SECTIONS = ["310UC158", "310UC118", "250UC89.5", "200UC59.5", "150UC37.2"]
+BEAM_SECTIONS = {"X": ["410UB59.7", "360UB50.7", "310UB40.4"], "Y": ["310UB46.2", "250UB37.3", "200UB29.8"]}
+CONNECTION_TYPES = {"GF Columns": "Base Plate", "Beams X": "Moment End Plate", "Beams Y": "Web Cleat"}
+# Load cases written next to the combinations, dropped by the reader
+LOAD_CASES = ["Dead", "Live"]
+FORMATS = ["xlsx", "csv"]
+
+
+def connection_type_of(group_name: str) -> str:
+    """Connection type the benchmark assigns to a group of the synthetic model."""
+    return next(conn_type for prefix, conn_type in CONNECTION_TYPES.items() if group_name.startswith(prefix))
+
+
+def model_size(storeys: int, bays: int, combos: int) -> dict[str, int]:
+    """Number of joints, frames and force rows of a synthetic model."""
+    columns = storeys * (bays + 1) ** 2
+    beams = storeys * 2 * bays * (bays + 1)
+    return {
+        "joints": (storeys + 1) * (bays + 1) ** 2,
+        "frames": columns + beams,
+        "force_rows": (columns + beams) * combos * 2 * 2,
+    }
+
+
+def _sheet_writer(workbook):
+    def write_table(title: str, headers: list[str], units: list, rows):
+        worksheet = workbook.create_sheet(title)
+        worksheet.append([f"TABLE:  {title}"])
+        worksheet.append(headers)
+        worksheet.append(units)
+        for row in rows:
+            worksheet.append(row)
+
+    return write_table
+
+
+def _csv_writer(archive: zipfile.ZipFile):
+    def write_table(title: str, headers: list[str], units: list, rows):
+        with archive.open(f"{title}.csv", "w", force_zip64=True) as member:
+            text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow([f"TABLE:  {title}"])
+            writer.writerow(headers)
+            writer.writerow(units)
+            writer.writerows(rows)
+            text.flush()
+            text.detach()
+
+    return write_table
+
+
+def write_workbook(
+    path: str | Path,
+    storeys: int = 3,
+    bays: int = 3,
+    groups: int = 3,
+    combos: int = 4,
+    seed: int = 0,
+    table_format: str = "xlsx",
+) -> dict[str, int]:
+    """Write the synthetic export to `path`, as a workbook or a zip of CSV tables, and return its `model_size`."""
+    rng = np.random.default_rng(seed)
+    grid = bays + 1
+
+    def node_id(storey: int, i: int, j: int) -> int:
+        return 1 + storey * grid * grid + i * grid + j
+
+    joints = [
+        [
+            f"Story{storey}",
+            node_id(storey, i, j),
+            "Joint",
+            node_id(storey, i, j),
+            i * SPAN,
+            j * SPAN,
+            storey * STOREY_HEIGHT,
+        ]
+        for storey in range(storeys + 1)
+        for i in range(grid)
+        for j in range(grid)
+    ]
+
+    # Frames as (storey, node I, node J, section, kind), the frame ids are their position from 1
+    frames = []
+    for storey in range(1, storeys + 1):
+        section = COLUMN_SECTIONS[min((storey - 1) * len(COLUMN_SECTIONS) // storeys, len(COLUMN_SECTIONS) - 1)]
+        for i in range(grid):
+            for j in range(grid):
+                frames.append((storey, node_id(storey - 1, i, j), node_id(storey, i, j), section, "column"))
+    for storey in range(1, storeys + 1):
+        for direction in "XY":
+            sections = BEAM_SECTIONS[direction]
+            section = sections[min((storey - 1) * len(sections) // storeys, len(sections) - 1)]
+            for i in range(bays):
+                for j in range(grid):
+                    start, end = ((i, j), (i + 1, j)) if direction == "X" else ((j, i), (j, i + 1))
+                    frames.append((storey, node_id(storey, *start), node_id(storey, *end), section, direction))
+    frame_ids = range(1, len(frames) + 1)
+
+    # Beams are split in floor bands, one group per band and direction
+    bands = max((groups - 1) // 2, 1)
+    group_rows = []
+    for frame_id, (storey, _, _, _, kind) in zip(frame_ids, frames):
+        if kind == "column" and storey == 1:
+            group_rows.append(["GF Columns", "Frame", frame_id])
+        elif kind != "column":
+            band = (storey - 1) * bands // storeys + 1
+            group_rows.append([f"Beams {kind} {band}", "Frame", frame_id])
+
+    columns = [
+        [f"Story{storey}", f"C{frame_id}", frame_id, node_i, node_j, STOREY_HEIGHT]
+        for frame_id, (storey, node_i, node_j, _, kind) in zip(frame_ids, frames)
+        if kind == "column"
+    ]
+    beams = [
+        [f"Story{storey}", f"B{frame_id}", frame_id, node_i, node_j, SPAN]
+        for frame_id, (storey, node_i, node_j, _, kind) in zip(frame_ids, frames)
+        if kind != "column"
+    ]
+    section_rows = [
+        [f"Story{storey}", f"{'C' if kind == 'column' else 'B'}{frame_id}", frame_id, "I/Wide Flange", "No", section]
+        for frame_id, (storey, _, _, section, kind) in zip(frame_ids, frames)
+    ]
+
+    # Columns carry the axial load of the floors above, beams shear and bending
+    is_column = np.array([kind == "column" for *_, kind in frames])
+    floors_above = np.array([storeys - storey + 1 for storey, *_ in frames], dtype=np.float64)
+    column_scale = np.tile([30.0, 30.0, 120.0, 10.0, 10.0, 5.0], (len(frames), 1))
+    column_scale[:, 2] *= floors_above
+    scale = np.where(is_column[:, None], column_scale, np.array([5.0, 60.0, 60.0, 2.0, 60.0, 90.0]))
+
+    def force_rows():
+        for combo in range(1, combos + 1):
+            factor = rng.uniform(0.6, 1.2)
+            values = rng.normal(0.0, 1.0, (len(frames), 2, 2, 6)) * scale[:, None, None, :] * factor
+            for frame_id, (storey, node_i, node_j, _, kind), frame_values in zip(frame_ids, frames, values.tolist()):
+                label = f"{'C' if kind == 'column' else 'B'}{frame_id}"
+                for joint, joint_values in zip((node_i, node_j), frame_values):
+                    for step, step_values in zip(("Max", "Min"), joint_values):
+                        yield [
+                            f"Story{storey}",
+                            label,
+                            frame_id,
+                            f"COMB{combo}",
+                            "Combination",
+                            step,
+                            joint,
+                            *step_values,
+                        ]
+        for case in LOAD_CASES:
+            for frame_id, (storey, node_i, _, _, _) in zip(frame_ids, frames[:3]):
+                yield [f"Story{storey}", "", frame_id, case, "LinStatic", None, node_i, *rng.normal(0.0, 5.0, 6)]
+
+    def write_tables(write_table):
+        write_table(
+            "Objects and Elements - Joints",
+            ["Story", "Element Name", "Object Type", "Object Name", "Global X", "Global Y", "Global Z"],
+            [None, None, None, None, "mm", "mm", "mm"],
+            joints,
+        )
+        write_table("Group Assignments", ["Group Name", "Object Type", "Object Unique Name"], [None] * 3, group_rows)
+        write_table(
+            "Beam Object Connectivity",
+            ["Story", "Label", "Unique Name", "UniquePtI", "UniquePtJ", "Length"],
+            [None] * 5 + ["mm"],
+            beams,
+        )
+        write_table(
+            "Frame Assigns - Sect Prop",
+            ["Story", "Label", "UniqueName", "Shape", "Auto Select", "Section Property"],
+            [None] * 6,
+            section_rows,
+        )
+        write_table(
+            "Element Joint Forces - Frame",
+            ["Story", "Frame", "Unique Name", "Output Case", "Case Type", "Step Type", "Joint"]
+            + ["F1", "F2", "F3", "M1", "M2", "M3"],
+            [None] * 7 + ["kN"] * 3 + ["kN-m"] * 3,
+            force_rows(),
+        )
+        write_table(
+            "Column Object Connectivity",
+            ["Story", "Label", "Unique Name", "UniquePtI", "UniquePtJ", "Length"],
+            [None] * 5 + ["mm"],
+            columns,
+        )
+
+    if table_format == "csv":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            write_tables(_csv_writer(archive))
+    else:
+        workbook = openpyxl.Workbook(write_only=True)
+        write_tables(_sheet_writer(workbook))
+        workbook.save(path)
+    return model_size(storeys, bays, combos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Output .xlsx file, or .zip with --format csv")
+    parser.add_argument("--storeys", type=int, default=3)
+    parser.add_argument("--bays", type=int, default=3)
+    parser.add_argument("--groups", type=int, default=3)
+    parser.add_argument("--combos", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=FORMATS, default="xlsx")
+    args = parser.parse_args()
+
+    size = write_workbook(args.path, args.storeys, args.bays, args.groups, args.combos, args.seed, args.format)
+    print(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in size.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Headless check or design of a folder of ETABS exports, for scheduled re-verification of projects.
+
+Every .xlsx or .zip export (see `app.core.tables`) of the folder is parsed and checked in its own worker process
+with the group assignments of the assignment file, through the same pipeline as the app (`run_checks` /
+`run_design`). The VIKTOR controller and parametrization are not imported.
+
+Assignment file, either
+- CSV with the columns `group`, `connection_type` and `capacity` (the capacity is not used by the design), or
+- JSON mapping group -> {"connection_type": ..., "capacity": ...}.
+Groups that are not in a model are skipped for that model and listed in the summary.
+
+Output, in `--output`:
+- `<file>_results.csv` (or .xlsx): the frame results table of the report, one per export.
+- `summary.csv`: one row per file and group, with the checked frames, failures and governing ratio (and the
+  selected tier in design mode).
+- `summary.json`: the same rows plus the status, error and run time of every file.
+The exit code is 1 when a file could not be processed and, with `--fail-on-not-ok`, 2 when a frame fails.
+
+Usage:
+    python scripts/run_batch.py exports/ assignments.csv --output results/ [--mode design] [--combo COMB1]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import traceback
+import types
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# The core modules are imported without the VIKTOR controller, which `app` only loads on first use
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np  # noqa: E402
+
+from app.core.batch_check import CONNECTION_QUANTITIES, ENVELOPE_COMBO, NOT_OK, OK  # noqa: E402
+from app.core.design import design_tiers  # noqa: E402
+from app.core.parse_xlsx_files import get_entities  # noqa: E402
+from app.core.pipeline import run_checks, run_design  # noqa: E402
+from app.core.report import table_workbook  # noqa: E402
+from app.library.load_db import get_library  # noqa: E402
+from app.models.models import report_headers  # noqa: E402
+
+MODES = ["check", "design"]
+EXPORT_SUFFIXES = {".xlsx", ".zip"}
+ENVELOPE = "envelope"
+SUMMARY_FIELDS = [
+    "file",
+    "group",
+    "connection_type",
+    "capacity",
+    "frames",
+    "not_ok",
+    "unchecked",
+    "max_ratio",
+    "governing_frame",
+    "governing_combo",
+    "non_compliant_frames",
+    "driving_frames",
+]
+
+
+def read_assignments(path: Path, mode: str) -> dict[str, tuple[str, str | None]]:
+    """Group -> (connection type, capacity) of the assignment file, validated against the library."""
+    if path.suffix.lower() == ".json":
+        entries = json.loads(path.read_text())
+        rows = [(group, values["connection_type"], values.get("capacity")) for group, values in entries.items()]
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as assignment_file:
+            rows = [
+                (row["group"], row["connection_type"], row.get("capacity") or None)
+                for row in csv.DictReader(assignment_file)
+            ]
+
+    library = get_library()
+    assignments = {}
+    for group, conn_type, capacity in rows:
+        if conn_type not in CONNECTION_QUANTITIES:
+            raise ValueError(f"Group '{group}': unknown connection type '{conn_type}'")
+        if mode == "check":
+            tiers = design_tiers(library, conn_type)
+            if capacity not in tiers:
+                raise ValueError(f"Group '{group}': capacity '{capacity}' is not one of {', '.join(tiers)}")
+        assignments[group] = (conn_type, capacity if mode == "check" else None)
+    return assignments
+
+
+def write_table(results, path: Path) -> None:
+    if path.suffix == ".xlsx":
+        path.write_bytes(table_workbook(results.records(), report_headers))
+        return
+    with open(path, "w", newline="", encoding="utf-8") as table_file:
+        writer = csv.writer(table_file)
+        writer.writerow(report_headers)
+        writer.writerows(record.values() for record in results.records())
+
+
+def group_summary(results, group: str) -> dict:
+    rows = results.select(groups=[group])
+    status = results.status[rows]
+    ratio = results.numbers["capacity_ratio"][rows]
+    summary = {
+        "frames": len(rows),
+        "not_ok": int((status == NOT_OK).sum()),
+        "unchecked": int((~np.isin(status, [OK, NOT_OK])).sum()),
+        "max_ratio": None,
+        "governing_frame": None,
+        "governing_combo": None,
+    }
+    if len(rows) and not np.isnan(ratio).all():
+        governing = rows[np.nanargmax(ratio)]
+        summary["max_ratio"] = round(float(np.nanmax(ratio)), 4)
+        summary["governing_frame"] = results.column("frame_id", [governing])[0]
+        summary["governing_combo"] = results.column("load_combo", [governing])[0]
+    return summary
+
+
+def verify_file(
+    path: str, assignments: dict, mode: str, combo: str, output: str, table_format: str, envelope: bool = False
+) -> dict:
+    """Check or design one export and write its results table. Errors are returned, not raised."""
+    start = time.perf_counter()
+    path = Path(path)
+    report = {"file": path.name, "status": "ok", "error": None, "groups": [], "missing_groups": []}
+    try:
+        entities = get_entities(path.read_bytes(), envelope=envelope)
+        load_combination = ENVELOPE_COMBO if combo == ENVELOPE else combo
+        if combo != ENVELOPE and combo not in entities.load_combos.combos:
+            raise ValueError(f"Load combination '{combo}' is not in the model")
+
+        report["missing_groups"] = [group for group in assignments if group not in entities.groups]
+        cont_types = [
+            types.SimpleNamespace(groups=group, connection_type=conn_type, capacities=capacity, color=None)
+            for group, (conn_type, capacity) in assignments.items()
+            if group in entities.groups
+        ]
+        # One process per file already, the batches of a file run serially
+        if mode == "design":
+            _, results, design_result, non_compliant, drivers = run_design(
+                entities, get_library(), cont_types, load_combination, workers=1
+            )
+        else:
+            _, results = run_checks(entities, get_library(), cont_types, load_combination, workers=1)
+            design_result, non_compliant, drivers = {}, {}, {}
+
+        write_table(results, Path(output) / f"{path.stem}_results.{table_format}")
+        for assignment in cont_types:
+            group = assignment.groups
+            report["groups"].append(
+                {
+                    "file": path.name,
+                    "group": group,
+                    "connection_type": assignment.connection_type,
+                    "capacity": design_result.get(group, assignment.capacities),
+                    **group_summary(results, group),
+                    "non_compliant_frames": non_compliant.get(group),
+                    "driving_frames": drivers.get(group),
+                }
+            )
+    except Exception as exc:
+        report.update(status="error", error=f"{exc!r}\n{traceback.format_exc()}")
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", type=Path, help="Folder with the ETABS .xlsx or .zip exports")
+    parser.add_argument("assignments", type=Path, help="Group assignment file (.csv or .json)")
+    parser.add_argument("--output", type=Path, default=Path("batch_results"))
+    parser.add_argument("--mode", choices=MODES, default="check")
+    parser.add_argument("--combo", default=ENVELOPE, help=f"Load combination, or '{ENVELOPE}' for all of them")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="Format of the result tables")
+    parser.add_argument(
+        "--envelope", action="store_true", help="Reduce the joint forces to their envelope rows while parsing"
+    )
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--fail-on-not-ok", action="store_true", help="Exit with 2 when a frame does not comply")
+    args = parser.parse_args()
+
+    try:
+        assignments = read_assignments(args.assignments, args.mode)
+    except (OSError, KeyError, ValueError) as exc:
+        parser.error(f"invalid assignment file: {exc}")
+    # Skip the lock files Excel leaves next to open workbooks
+    files = sorted(
+        path
+        for path in args.folder.iterdir()
+        if path.suffix.lower() in EXPORT_SUFFIXES and not path.name.startswith("~$")
+    )
+    if not files:
+        parser.error(f"no .xlsx or .zip files in {args.folder}")
+    args.output.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(
+                verify_file, str(path), assignments, args.mode, args.combo, str(args.output), args.format, args.envelope
+            )
+            for path in files
+        ]
+        reports = []
+        for future in futures:
+            report = future.result()
+            reports.append(report)
+            failed = sum(group["not_ok"] for group in report["groups"])
+            detail = report["error"].splitlines()[0] if report["error"] else f"{failed} frames not OK"
+            print(f"{report['file']}: {report['status']} in {report['seconds']:.1f} s, {detail}")
+
+    with open(args.output / "summary.csv", "w", newline="", encoding="utf-8") as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for report in reports:
+            for group in report["groups"]:
+                # Frame lists as space separated ids
+                writer.writerow(
+                    {
+                        key: " ".join(map(str, value)) if isinstance(value, list) else value
+                        for key, value in group.items()
+                    }
+                )
+    (args.output / "summary.json").write_text(json.dumps(reports, indent=2, default=str))
+
+    errors = [report for report in reports if report["status"] != "ok"]
+    not_ok = sum(group["not_ok"] for report in reports for group in report["groups"])
+    print(f"{len(reports)} files, {len(errors)} failed, {not_ok} frames not OK. Summary in {args.output}")
+    if errors:
+        sys.exit(1)
+    if args.fail_on_not_ok and not_ok:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import io
+
+import openpyxl
+import pytest
+
+from benchmarks.synthetic_workbook import write_workbook
+
+FORCES_SHEET = "Element Joint Forces - Frame"
+
+
+@pytest.fixture
+def export(tmp_path):
+    """
+    Bytes of a small synthetic ETABS export (see `benchmarks/synthetic_workbook.py`).
+    `blank` lists (sheet row, column header) cells of the forces table to empty, the first data row is row 4.
+    """
+
+    def make(table_format: str = "xlsx", blank: list[tuple[int, str]] = (), **size) -> bytes:
+        path = tmp_path / f"model.{'zip' if table_format == 'csv' else 'xlsx'}"
+        write_workbook(path, table_format=table_format, **size)
+        if blank:
+            workbook = openpyxl.load_workbook(path)
+            worksheet = workbook[FORCES_SHEET]
+            header = [cell.value for cell in worksheet[2]]
+            for row, column in blank:
+                worksheet.cell(row=row, column=header.index(column) + 1).value = None
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            return buffer.getvalue()
+        return path.read_bytes()
+
+    return make
@@ -0,0 +1,193 @@
+"""
+The batch engines against the per-frame functions of `compliance_check` on random models, and the process pool
+against the serial path.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from app.core import compliance_check
+from app.core.batch_check import CONNECTION_QUANTITIES, NOT_OK, UNCHECKED, evaluate_pairs, joint_elevations
+from app.core.forces import ForceStoreBuilder
+from app.core.local_axes import direction_cosines
+from app.core.parallel import GroupTask, check_groups
+from app.core.parse_xlsx_files import envelope_forces
+from app.core.topology import Topology
+from app.library.load_db import get_library
+from app.models.models import OutputItem
+
+COMBOS = ["C1", "C2", "C3"]
+FRAMES = 200
+
+
+def random_model(seed: int, scale: float, n_frames: int = FRAMES, aligned: bool = False, rows: int = 3):
+    """
+    Frames of random orientation, half of them starting at z == 0, with 1 to `rows` load rows per joint and combo.
+    With `aligned` every frame runs along a global axis.
+    """
+    rng = np.random.default_rng(seed)
+    nodes, lines = {}, {}
+    builder = ForceStoreBuilder()
+    for frame_id in range(n_frames):
+        node_i, node_j = 2 * frame_id + 1, 2 * frame_id + 2
+        if aligned:
+            direction = np.zeros(3)
+            direction[rng.integers(0, 3)] = rng.choice([-5.0, 5.0])
+        else:
+            direction = rng.normal(0, 1, 3)
+            direction[2] *= rng.choice([0.0, 0.3, 10.0])  # Horizontal, inclined and near vertical members
+            direction *= 5 / np.linalg.norm(direction)
+        nodes[node_i] = {"x": 0.0, "y": 0.0, "z": float(rng.choice([0.0, 3.0]))}
+        nodes[node_j] = {"x": float(direction[0]), "y": float(direction[1]), "z": nodes[node_i]["z"] + direction[2]}
+        lines[frame_id] = {"nodeI": node_i, "nodeJ": node_j}
+        for combo in COMBOS:
+            for joint in (node_i, node_j):
+                for _ in range(rng.integers(1, rows + 1)):
+                    values = rng.normal(0, scale, 6)
+                    if rng.random() < 0.1:
+                        values[rng.integers(0, 6)] = 0  # Exact zeros reach the M3 <= 0 branch
+                    builder.append(frame_id, combo, joint, values.tolist())
+    return nodes, lines, builder.build()
+
+
+def axes_of(lines: dict, nodes: dict, frame_ids: list) -> np.ndarray:
+    start = [[nodes[lines[frame_id]["nodeI"]][key] for key in "xyz"] for frame_id in frame_ids]
+    end = [[nodes[lines[frame_id]["nodeJ"]][key] for key in "xyz"] for frame_id in frame_ids]
+    return direction_cosines(start, end)
+
+
+def sections_with(cont_type: str, capacity: str) -> list[str]:
+    return [name for name, tiers in get_library().to_dict()[cont_type].items() if capacity in tiers]
+
+
+def per_frame(cont_type, frame_con_capacity, section_name, capacity, load, nodes, lines, frame_id):
+    item = OutputItem()
+    if cont_type == "Moment End Plate":
+        axes = compliance_check.get_local_axes(lines, nodes, frame_id)
+        return compliance_check.moment_end_plate_check(frame_con_capacity, section_name, item, capacity, load, axes)
+    if cont_type == "Web Cleat":
+        return compliance_check.web_cope(frame_con_capacity, section_name, item, capacity, load)
+    return compliance_check.base_plate(frame_con_capacity, section_name, item, capacity, load, nodes)
+
+
+def same(batch_value, frame_value) -> bool:
+    if batch_value is None or frame_value is None:
+        return batch_value is None and frame_value is None
+    if isinstance(batch_value, float):
+        return math.isclose(batch_value, frame_value, rel_tol=1e-9, abs_tol=1e-9)
+    return batch_value == frame_value
+
+
+CAPACITIES = [
+    ("Moment End Plate", "MEP 70%/35% (Moment/Shear)"),
+    ("Web Cleat", "Web Cleat 40%"),
+    ("Base Plate", "Base Plate 30%"),
+]
+
+
+@pytest.mark.parametrize(
+    "cont_type, capacity, scale",
+    [
+        ("Moment End Plate", "MEP 70%/35% (Moment/Shear)", 5),
+        ("Moment End Plate", "MEP 100%/50% (Moment/Shear)", 100),
+        ("Web Cleat", "Web Cleat 40%", 5),
+        ("Web Cleat", "Web Cleat 30%", 100),
+        ("Base Plate", "Base Plate 30%", 20),
+        ("Base Plate", "Base Plate 15%", 400),
+    ],
+)
+def test_batch_matches_per_frame(cont_type, capacity, scale):
+    nodes, lines, store = random_model(seed=scale, scale=scale)
+    rng = np.random.default_rng(len(cont_type))
+    sections = sections_with(cont_type, capacity)
+    frame_ids = list(range(FRAMES))
+    section_names = [sections[rng.integers(len(sections))] for _ in frame_ids]
+    caps = get_library().lookup(cont_type, section_names, capacity, CONNECTION_QUANTITIES[cont_type])
+    axes = axes_of(lines, nodes, frame_ids)
+    joint_z = joint_elevations(store, nodes)
+    frame_con_capacity = get_library().to_dict()[cont_type]
+
+    for combo_code, combo in enumerate(COMBOS):
+        result = evaluate_pairs(cont_type, store, frame_ids, caps, axes, joint_z, [combo_code])
+        records, colors = result.records(), result.colors()
+        for position, frame_id in enumerate(frame_ids):
+            load = store[frame_id][combo]
+            try:
+                color, item = per_frame(
+                    cont_type, frame_con_capacity, section_names[position], capacity, load, nodes, lines, frame_id
+                )
+            except UnboundLocalError:
+                # No entry set a color: the per-frame function fails, the batch leaves the frame unchecked
+                assert result.status[position] == UNCHECKED
+                continue
+            for field, value in records[position].items():
+                assert same(value, getattr(item, field)), (frame_id, combo, field)
+            assert color == colors[position], (frame_id, combo)
+
+    # The larger scales fail frames part way through their rows, which covers the stop at the first failure
+    if scale >= 100:
+        assert (result.status == NOT_OK).any()
+
+
+def test_stop_at_first_failure():
+    # The second row fails: the third, larger one is never reached
+    builder = ForceStoreBuilder()
+    for shear in (0.5, 2.0, 5.0):
+        builder.append(1, "C", 10, [0.0, 0.0, shear, 0.0, 0.0, 0.0])
+    store = builder.build()
+    result = evaluate_pairs("Web Cleat", store, [1], {"Shear": np.array([1.0])}, None, None, [0])
+    assert result.status.tolist() == [NOT_OK]
+    assert result.capacity_ratio.tolist() == [2.0]
+    assert store.values[result.governing_row[0], 2] == 2.0
+
+
+def test_workers_match_serial():
+    nodes, lines, store = random_model(seed=7, scale=50)
+    library = get_library()
+    joint_z = joint_elevations(store, nodes)
+    rng = np.random.default_rng(7)
+    tasks = []
+    for cont_type, capacity, frame_ids in [
+        ("Moment End Plate", "MEP 70%/35% (Moment/Shear)", np.arange(0, 80)),
+        ("Web Cleat", "Web Cleat 40%", np.arange(80, 140)),
+        ("Base Plate", "Base Plate 50%", np.arange(140, FRAMES)),
+    ]:
+        sections = sections_with(cont_type, capacity)
+        section_names = [sections[rng.integers(len(sections))] for _ in frame_ids]
+        caps = library.lookup(cont_type, section_names, capacity, CONNECTION_QUANTITIES[cont_type])
+        axes = axes_of(lines, nodes, frame_ids.tolist()) if cont_type == "Moment End Plate" else None
+        tasks.append(GroupTask(cont_type, frame_ids, caps, axes))
+
+    combo_codes = list(range(len(COMBOS)))
+    serial = check_groups(tasks, store, joint_z, combo_codes, workers=1)
+    # More workers than groups, so the combos are also split in chunks
+    pooled = check_groups(tasks, store, joint_z, combo_codes, workers=4)
+    for expected, actual in zip(serial, pooled):
+        for name, values in expected._asdict().items():
+            np.testing.assert_array_equal(values, getattr(actual, name), err_msg=name)
+
+
+@pytest.mark.parametrize("cont_type, capacity", CAPACITIES)
+def test_envelope_keeps_the_status_of_aligned_frames(cont_type, capacity):
+    nodes, lines, store = random_model(seed=3, scale=40, aligned=True, rows=6)
+    reduced = envelope_forces(store, Topology(nodes, lines, {}, {}))
+    assert len(reduced.values) < len(store.values)
+    rng = np.random.default_rng(3)
+    sections = sections_with(cont_type, capacity)
+    frame_ids = list(range(FRAMES))
+    section_names = [sections[rng.integers(len(sections))] for _ in frame_ids]
+    caps = get_library().lookup(cont_type, section_names, capacity, CONNECTION_QUANTITIES[cont_type])
+    axes = axes_of(lines, nodes, frame_ids)
+    joint_z = joint_elevations(store, nodes)
+    combo_codes = list(range(len(COMBOS)))
+    raw = evaluate_pairs(cont_type, store, frame_ids, caps, axes, joint_z, combo_codes)
+    enveloped = evaluate_pairs(cont_type, reduced, frame_ids, caps, axes, joint_z, combo_codes)
+    np.testing.assert_array_equal(enveloped.status, raw.status)
+    assert (raw.status == NOT_OK).any() and (raw.status != NOT_OK).any()
+
+
+def test_envelope_leaves_other_frames_unchanged():
+    nodes, lines, store = random_model(seed=4, scale=40, n_frames=20, rows=6)
+    np.testing.assert_array_equal(envelope_forces(store, Topology(nodes, lines, {}, {})).values, store.values)
@@ -0,0 +1,69 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.cache import ModelCache, estimate_size, private_directory
+
+
+def test_private_directory_is_created_for_the_user_only(tmp_path):
+    directory = private_directory(tmp_path / "cache")
+    assert directory == tmp_path / "cache"
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_private_directory_is_tightened_and_symlinks_are_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    assert private_directory(shared) == shared
+    assert shared.stat().st_mode & 0o777 == 0o700
+
+    link = tmp_path / "link"
+    link.symlink_to(shared)
+    assert private_directory(link) is None
+    cache = ModelCache(1024, link)
+    cache.put("key", [1])
+    assert cache.cache_dir is None and not list(shared.iterdir())
+
+
+def test_size_counts_the_arrays_of_an_entry():
+    entry = {"values": np.zeros((1000, 6)), "labels": ["a", "b"]}
+    assert 48000 <= estimate_size(entry) < 50000
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ModelCache(3 * 8000 + 1000, tmp_path)
+    for key in "abc":
+        cache.put(key, np.zeros(1000))
+    cache.get("a")
+    cache.put("d", np.zeros(1000))
+    assert cache.peek("b") is None and cache.peek("a") is not None
+    # Evicted entries are still on disk
+    assert cache.get("b") is not None and cache.stats()["disk_hits"] == 1
+
+
+def test_concurrent_callers_create_an_entry_once(tmp_path):
+    cache = ModelCache(10**6, tmp_path)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return np.arange(3)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("key", factory))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 4 and all(result is results[0] for result in results)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.core.batch_check import UNCHECKED, joint_elevations
+from app.core.design import design_task, select_tier
+from app.core.forces import ForceStoreBuilder
+from app.core.parallel import check_groups
+from app.library.load_db import get_library
+
+SECTION = "310UC118"
+
+
+def base_plate_design(axials: dict[int, float]):
+    """Design of a Base Plate group of one ground floor column (frame 1) and one upper storey column (frame 2)."""
+    nodes = {1: {"z": 0.0}, 2: {"z": 3500.0}, 3: {"z": 7000.0}}
+    builder = ForceStoreBuilder()
+    for frame_id, (node_i, node_j) in {1: (1, 2), 2: (2, 3)}.items():
+        for joint in (node_i, node_j):
+            builder.append(frame_id, "C", joint, [1.0, 1.0, axials[frame_id], 0.0, 0.0, 0.0])
+    store = builder.build()
+    task, tiers = design_task("Base Plate", [1, 2], [SECTION, SECTION], get_library(), None)
+    (result,) = check_groups([task], store, joint_elevations(store, nodes), [0], workers=1)
+    return select_tier(result, tiers, 2, ["C"])
+
+
+def test_unchecked_frames_do_not_drive_the_design():
+    design = base_plate_design({1: 1.0, 2: 1e9})
+    # The upper column has no joint at z == 0, whatever its forces it is not checked by any tier
+    assert design.envelope.result.status.tolist()[1] == UNCHECKED
+    assert design.tier == design.tiers[0]
+    assert design.non_compliant.tolist() == [False, False]
+    assert design.drivers.tolist() == [False, False]
+    assert design.frame_min_tier.tolist() == [0, -1]
+
+
+def test_checked_frames_still_drive_the_design():
+    # Above the 15% axial capacity of the section (970 kN), within the 30% one (1436 kN)
+    design = base_plate_design({1: 1200.0, 2: 1e9})
+    assert design.tier == "Base Plate 30%"
+    assert design.non_compliant.tolist() == [False, False]
+    assert design.drivers.tolist() == [True, False]
+    assert design.frame_min_tier.tolist() == [1, -1]
+
+
+def test_failing_groups_leave_unchecked_frames_out():
+    design = base_plate_design({1: 1e9, 2: 1e9})
+    assert design.tier == design.tiers[-1]
+    assert design.non_compliant.tolist() == [True, False]
+    assert design.drivers.tolist() == [True, False]
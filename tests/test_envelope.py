@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from app.core.batch_check import (
+    CONNECTION_QUANTITIES,
+    NOT_OK,
+    OK,
+    UNCHECKED,
+    BatchResult,
+    EnvelopeResult,
+    evaluate_pairs,
+    joint_elevations,
+)
+from app.core.forces import ForceStoreBuilder
+from app.library.load_db import get_library
+from test_batch_check import COMBOS, FRAMES, axes_of, random_model, sections_with
+
+
+def web_cleat_envelope(rows: dict[str, list[float]], shear: float = 1.0) -> EnvelopeResult:
+    builder = ForceStoreBuilder()
+    for combo, forces in rows.items():
+        for force in forces:
+            builder.append(1, combo, 10, [0.0, 0.0, force, 0.0, 0.0, 0.0])
+    store = builder.build()
+    combo_codes = range(len(store.combos))
+    pairs = evaluate_pairs("Web Cleat", store, [1], {"Shear": np.array([shear])}, None, None, combo_codes)
+    return EnvelopeResult.reduce(pairs, 1, store.combos)
+
+
+def test_governing_combo_has_the_highest_ratio_of_any_row():
+    # web_cope reports the last row of a passing combo: 0.1 for A, although A reaches 0.9
+    envelope = web_cleat_envelope({"A": [0.9, 0.1], "B": [0.5]})
+    assert envelope.governing_combo == ["A"]
+    np.testing.assert_allclose(envelope.ratios, [[0.9, 0.5]])
+    np.testing.assert_allclose(envelope.margin, [0.4])
+    # The reported result stays the one of the per-frame function for the governing combo
+    assert envelope.result.capacity_ratio.tolist() == pytest.approx([0.1])
+    assert envelope.result.status.tolist() == [OK]
+
+
+def test_failure_without_ratio_governs():
+    pairs = BatchResult.empty(3)
+    pairs.status[:] = [OK, NOT_OK, UNCHECKED]
+    pairs.max_ratio[:] = [0.5, np.nan, np.nan]
+    pairs.capacity_ratio[:] = [0.5, np.nan, np.nan]
+    envelope = EnvelopeResult.reduce(pairs, 1, ["A", "B", "C"])
+    assert envelope.governing_combo == ["B"]
+    assert envelope.result.status.tolist() == [NOT_OK]
+    assert np.isnan(envelope.margin).all()
+
+
+def test_unchecked_frames_have_no_governing_combo():
+    envelope = EnvelopeResult.reduce(BatchResult.empty(2), 1, ["A", "B"])
+    assert envelope.governing_combo == [None]
+    assert envelope.result.status.tolist() == [UNCHECKED]
+
+
+@pytest.mark.parametrize(
+    "cont_type, capacity",
+    [
+        ("Moment End Plate", "MEP 70%/35% (Moment/Shear)"),
+        ("Web Cleat", "Web Cleat 30%"),
+        ("Base Plate", "Base Plate 15%"),
+    ],
+)
+def test_envelope_agrees_with_every_combo(cont_type, capacity):
+    nodes, lines, store = random_model(seed=3, scale={"Base Plate": 300}.get(cont_type, 60))
+    rng = np.random.default_rng(3)
+    sections = sections_with(cont_type, capacity)
+    frame_ids = list(range(FRAMES))
+    section_names = [sections[rng.integers(len(sections))] for _ in frame_ids]
+    caps = get_library().lookup(cont_type, section_names, capacity, CONNECTION_QUANTITIES[cont_type])
+    axes = axes_of(lines, nodes, frame_ids)
+    joint_z = joint_elevations(store, nodes)
+
+    combo_codes = range(len(COMBOS))
+    per_combo = [evaluate_pairs(cont_type, store, frame_ids, caps, axes, joint_z, [code]) for code in combo_codes]
+    pairs = evaluate_pairs(cont_type, store, frame_ids, caps, axes, joint_z, combo_codes)
+    envelope = EnvelopeResult.reduce(pairs, len(frame_ids), COMBOS)
+
+    statuses = np.stack([result.status for result in per_combo], axis=1)
+    any_failure = (statuses == NOT_OK).any(axis=1)
+    assert any_failure.any() and not any_failure.all()
+    np.testing.assert_array_equal(envelope.result.status == NOT_OK, any_failure)
+    max_ratios = np.stack([result.max_ratio for result in per_combo], axis=1)
+    np.testing.assert_array_equal(envelope.ratios, max_ratios)
+    checked = ~np.isnan(max_ratios).all(axis=1)
+    governing = [COMBOS.index(combo) for combo in np.asarray(envelope.governing_combo)[checked]]
+    np.testing.assert_array_equal(max_ratios[checked, governing], np.nanmax(max_ratios[checked], axis=1))
@@ -0,0 +1,129 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from app.core.forces import FORCE_COMPONENTS, ForceStore, ForceStoreBuilder
+from app.core.parse_xlsx_files import FORCES_SHEET, combination_rows, extract_sheets, get_entities
+
+
+def assert_same_store(actual: ForceStore, expected: ForceStore, rtol: float = 0.0):
+    assert actual.frame_ids.tolist() == expected.frame_ids.tolist()
+    assert actual.combos == expected.combos
+    assert actual.joint_ids.tolist() == expected.joint_ids.tolist()
+    for name in ["frame_codes", "combo_codes", "joint_codes", "slice_keys", "slice_offsets"]:
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name), err_msg=name)
+    np.testing.assert_allclose(actual.values, expected.values, rtol=rtol, atol=0, err_msg="values")
+
+
+def test_builder_keeps_rows_aligned_with_blank_cells():
+    builder = ForceStoreBuilder()
+    builder.append(1, "C", 10, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    # The blank cell comes after numbers that a partial conversion would already have written
+    builder.append(1, "C", 11, [1.0, 2.0, None, 4.0, "Global", 6.0])
+    store = builder.build()
+    assert store.values.shape == (2, 6)
+    np.testing.assert_array_equal(store.values[1], [1.0, 2.0, np.nan, 4.0, np.nan, 6.0])
+
+
+def test_streamed_forces_match_dataframe_path(export):
+    # Blank force values, and a row without its frame, in the combination rows
+    content = export(blank=[(4, "F2"), (9, "M3"), (9, "F1"), (20, "Unique Name")], storeys=2, bays=1, combos=2)
+    streamed = extract_sheets(content, stream=True)[FORCES_SHEET]
+    expected = ForceStore.from_dataframe(combination_rows(extract_sheets(content)[FORCES_SHEET]))
+    assert_same_store(streamed, expected)
+    assert np.isnan(streamed.values).sum() == 3
+
+    entities = get_entities(content, stream=True, envelope=False)
+    assert len(entities.load_combos.values) == len(expected.values)
+
+
+def forces_frame(rng: np.random.Generator, rows: int = 60) -> pd.DataFrame:
+    """Combination rows in a shuffled sheet order, several rows per (frame, combo, joint)."""
+    frames = rng.choice([12, 3, 7, 40], rows)
+    return pd.DataFrame(
+        {
+            "Unique Name": frames,
+            "Output Case": rng.choice(["ULS2", "ULS1", "SLS"], rows),
+            "Case Type": "Combination",
+            "Joint": frames * 10 + rng.integers(0, 2, rows),
+            **{component: rng.normal(0, 10, rows) for component in FORCE_COMPONENTS},
+        }
+    )
+
+
+def nested_layout(df: pd.DataFrame) -> dict:
+    """The `{frame: {combo: {joint: [entries]}}}` layout the per-frame checks were written against."""
+    layout = {}
+    for row in df.to_dict("records"):
+        joints = layout.setdefault(row["Unique Name"], {}).setdefault(row["Output Case"], {})
+        joints.setdefault(row["Joint"], []).append({component: row[component] for component in FORCE_COMPONENTS})
+    return layout
+
+
+def test_store_reads_as_the_nested_layout():
+    df = forces_frame(np.random.default_rng(0))
+    store = ForceStore.from_dataframe(df)
+    expected = nested_layout(df)
+
+    assert sorted(store) == sorted(expected)
+    # Combos keep the order of their first row, frames and joints are sorted
+    assert store.combos == list(dict.fromkeys(df["Output Case"]))
+    assert store.frame_ids.tolist() == sorted(expected)
+    for frame_id, combos in expected.items():
+        assert sorted(store[frame_id]) == sorted(combos)
+        for combo, joints in combos.items():
+            block = store[frame_id][combo]
+            assert list(block) == sorted(joints)
+            assert dict(block.items()) == joints
+            for joint, entries in joints.items():
+                assert block[joint] == entries
+
+
+def test_gather_concatenates_the_blocks_in_frame_order():
+    store = ForceStore.from_dataframe(forces_frame(np.random.default_rng(1)))
+    frame_ids = [40, 99, 3, 40]  # 99 has no rows
+    rows, owner = store.gather(frame_ids, "ULS1")
+    expected = [store[frame_id]["ULS1"].values for frame_id in frame_ids if frame_id != 99]
+    np.testing.assert_array_equal(store.values[rows], np.concatenate(expected))
+    assert np.unique(owner).tolist() == [0, 2, 3]
+    assert np.all(np.diff(owner) >= 0)
+
+
+def test_mapped_store_matches_the_store_in_memory(tmp_path):
+    store = ForceStore.from_dataframe(forces_frame(np.random.default_rng(2)))
+    store.save(tmp_path / "forces")
+    mapped = ForceStore.open(tmp_path / "forces")
+    assert isinstance(mapped.values, np.memmap)
+    for frame_id in store:
+        for combo in store[frame_id]:
+            assert dict(mapped[frame_id][combo].items()) == dict(store[frame_id][combo].items())
+    # A mapped store pickles as its directory
+    assert len(pickle.dumps(mapped)) < 1000
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(mapped)).values, store.values)
+
+
+def test_envelope_keeps_the_extremes_of_long_blocks():
+    builder = ForceStoreBuilder()
+    for values in ([1, -2, 3, 0, 0, 0], [4, -5, -6, 0, 0, 0], [-7, 8, 9, 0, 0, 0]):
+        builder.append(1, "C", 10, values)  # Reduced
+    for values in ([1, 2, 3, 4, 5, 6], [6, 5, 4, 3, 2, 1]):
+        builder.append(1, "C", 11, values)  # Two rows, kept
+    for values in ([1, 1, 1, 1, 1, 1], [float("nan"), 0, 0, 0, 0, 0], [2, 2, 2, 2, 2, 2]):
+        builder.append(2, "C", 10, values)  # A missing value, kept
+    for values in ([0, 0, 0, 0, 0, 1], [0, 0, 0, 0, 0, 3], [0, 0, 0, 0, 0, 2]):
+        builder.append(3, "C", 30, values)  # Masked out, kept
+    store = builder.build()
+
+    reduced = store.envelope(frame_mask=[True, True, False], keep_raw=True)
+    assert reduced.raw is store
+    assert reduced[1]["C"][10] == [
+        dict(zip(FORCE_COMPONENTS, [4.0, 8.0, 9.0, 0.0, 0.0, 0.0])),
+        dict(zip(FORCE_COMPONENTS, [-7.0, -5.0, -6.0, 0.0, 0.0, 0.0])),
+    ]
+    assert reduced[1]["C"][11] == store[1]["C"][11]
+    for frame_id in (2, 3):
+        np.testing.assert_array_equal(reduced[frame_id]["C"].values, store[frame_id]["C"].values)
+    assert len(reduced.values) == len(store.values) - 1
+    assert store.envelope().raw is None
+    assert len(store.envelope().values) == len(store.values) - 2
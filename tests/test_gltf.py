@@ -0,0 +1,34 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from app.core.gltf import ModelGeometry
+
+
+def gltf_document(glb: bytes) -> dict:
+    magic, _, _ = struct.unpack_from("<4sII", glb)
+    assert magic == b"glTF"
+    length, _ = struct.unpack_from("<I4s", glb, 12)
+    return json.loads(glb[20 : 20 + length])
+
+
+def test_model_keeps_z_up_coordinates():
+    # A column of 3.5 m on a 6 m beam along X: the views are Z-up, so the GLB must not rotate the model
+    nodes = {
+        1: {"x": 0.0, "y": 0.0, "z": 0.0},
+        2: {"x": 0.0, "y": 0.0, "z": 3500.0},
+        3: {"x": 6000.0, "y": 0.0, "z": 3500.0},
+    }
+    lines = {1: {"nodeI": 1, "nodeJ": 2}, 2: {"nodeI": 2, "nodeJ": 3}}
+    geometry = ModelGeometry({"310UC118": {"frame_ids": [1, 2]}}, lines, nodes)
+    document = gltf_document(geometry.glb(np.zeros((2, 3), dtype=np.uint8), legend=True))
+
+    assert all("rotation" not in node and "matrix" not in node for node in document["nodes"])
+    assert document["scenes"][0]["nodes"] == list(range(len(document["nodes"])))
+    members = next(mesh for mesh in document["meshes"] if mesh["name"] == "members")
+    positions = document["accessors"][members["primitives"][0]["attributes"]["POSITION"]]
+    # Boxes of 200 x 200 mm around the member axes, in the model axes
+    assert positions["min"] == pytest.approx([-100.0, -100.0, 0.0])
+    assert positions["max"] == pytest.approx([6000.0, 100.0, 3600.0])
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from app.library import load_db
+from app.library.load_db import CapacityLibrary
+
+
+def test_misspelled_tiers_are_reported_not_remapped():
+    sources = {"Base Plate": {"310UC118": {"Base Plate15%": {"Shear": 114.0, "Axial": 970.0}}}}
+    library = CapacityLibrary.compile(sources)
+    issue = "Base Plate: tier 'Base Plate15%' is not a connection type (did you mean 'Base Plate 15%'?)"
+    assert library.issues == [issue]
+    assert np.isnan(library.lookup("Base Plate", ["310UC118"], "Base Plate 15%", ["Shear"])["Shear"]).all()
+
+
+@pytest.fixture
+def library_cache(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "capacity_library.pkl"
+    monkeypatch.setattr(load_db, "LIBRARY_CACHE_PATH", path)
+    return path
+
+
+def test_compiled_library_is_kept_in_a_private_directory(library_cache):
+    stats = load_db._source_stats()
+    sources = {cont_type: load_db.load_json(path) for cont_type, path in load_db.LIBRARY_SOURCES.items()}
+    library = CapacityLibrary.compile(sources)
+    load_db._write_cached_library(stats, library)
+    assert library_cache.parent.stat().st_mode & 0o777 == 0o700
+    assert load_db._read_cached_library(stats).sections == library.sections
+
+
+def test_compiled_library_is_not_read_through_a_symlink(tmp_path, library_cache):
+    target = tmp_path / "elsewhere"
+    target.mkdir()
+    library_cache.parent.symlink_to(target)
+    stats = load_db._source_stats()
+    load_db._write_cached_library(stats, CapacityLibrary.compile({}))
+    assert not list(target.iterdir())
+    assert load_db._read_cached_library(stats) is None
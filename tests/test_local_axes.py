@@ -0,0 +1,47 @@
+"""Local axes of the frames for the ETABS default orientations, and the batched transformation of the forces."""
+
+import numpy as np
+
+from app.core.local_axes import VERTICAL_TOLERANCE, direction_cosines, to_local
+
+
+def test_axes_of_beams_and_columns():
+    start = np.zeros((4, 3))
+    end = [[6.0, 0.0, 0.0], [0.0, 6.0, 0.0], [0.0, 0.0, 3.5], [0.0, 0.0, -3.5]]
+    axes = direction_cosines(start, end)
+    # Beams: local 2 is global Z
+    np.testing.assert_allclose(axes[0], [[1, 0, 0], [0, 0, 1], [0, -1, 0]], atol=1e-15)
+    np.testing.assert_allclose(axes[1], [[0, 1, 0], [0, 0, 1], [1, 0, 0]], atol=1e-15)
+    # Columns: local 2 is global X
+    np.testing.assert_allclose(axes[2], [[0, 0, 1], [1, 0, 0], [0, 1, 0]], atol=1e-15)
+    np.testing.assert_allclose(axes[3], [[0, 0, -1], [1, 0, 0], [0, -1, 0]], atol=1e-15)
+
+
+def test_axes_are_right_handed_and_orthonormal():
+    rng = np.random.default_rng(0)
+    start = rng.normal(0, 5, (500, 3))
+    direction = rng.normal(0, 1, (500, 3))
+    # Near vertical members
+    direction[:50, :2] *= VERTICAL_TOLERANCE / 10
+    direction[:50, 2] = np.sign(direction[:50, 2])
+    axes = direction_cosines(start, start + direction)
+    np.testing.assert_allclose(axes @ axes.transpose(0, 2, 1), np.broadcast_to(np.eye(3), axes.shape), atol=1e-12)
+    np.testing.assert_allclose(np.linalg.det(axes), 1.0)
+    np.testing.assert_allclose(axes[:, 0], direction / np.linalg.norm(direction, axis=1)[:, None])
+    # Local 2 points up for inclined members, and along global X for the near vertical ones
+    assert (axes[50:, 1, 2] > 0).all()
+    assert (axes[:50, 1, 0] > 0.99).all()
+
+
+def test_frames_without_length_get_nan_axes():
+    axes = direction_cosines([[1.0, 2.0, 3.0], [0.0, 0.0, 0.0]], [[1.0, 2.0, 3.0], [1.0, 0.0, 0.0]])
+    assert np.isnan(axes[0]).all()
+    assert not np.isnan(axes[1]).any()
+
+
+def test_to_local_transforms_forces_and_moments_per_row():
+    rng = np.random.default_rng(1)
+    axes = direction_cosines(np.zeros((20, 3)), rng.normal(0, 1, (20, 3)))
+    loads = rng.normal(0, 10, (20, 6))
+    expected = np.hstack([np.einsum("nij,nj->ni", axes, loads[:, :3]), np.einsum("nij,nj->ni", axes, loads[:, 3:])])
+    np.testing.assert_allclose(to_local(loads, axes), expected, atol=1e-12)
@@ -0,0 +1,100 @@
+"""The streamed report table against the data row of the templates, and the appendix workbook."""
+
+import io
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+from xml.sax.saxutils import unescape
+
+import openpyxl
+import pytest
+
+from app.core import report
+from app.core.report import DOCUMENT_XML, TABLE_LOOP, TABLE_MARKER, format_cell, load_template, table_workbook
+
+TEMPLATES = Path(__file__).parents[1] / "app" / "library" / "templates"
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def records(count: int) -> list[dict]:
+    return [
+        {
+            "frame_id": frame_id,
+            "group_name": f"Beams <{frame_id}> & co",
+            "section_name": "310UB40.4",
+            "load_combo": "ULS1",
+            "conn_type": "Web Cleat",
+            "V": frame_id + 0.123456,
+            "M": None,
+            "P": -1.005,
+            "Vn": 100.0,
+            "Mn": None,
+            "Pn": 50,
+            "check": "OK" if frame_id % 2 else "NOT OK",
+        }
+        for frame_id in range(count)
+    ]
+
+
+def document_tree(docx: bytes) -> ElementTree.Element:
+    with zipfile.ZipFile(io.BytesIO(docx)) as archive:
+        return ElementTree.fromstring(archive.read(DOCUMENT_XML))
+
+
+def row_texts(row: ElementTree.Element) -> list[str]:
+    return ["".join(text.text or "" for text in cell.iter(f"{W}t")) for cell in row.iter(f"{W}tc")]
+
+
+def template_data_row(path: Path) -> ElementTree.Element:
+    """The `{%tr for %}` data row of the template itself."""
+    rows = list(document_tree(path.read_bytes()).iter(f"{W}tr"))
+    loop = next(index for index, row in enumerate(rows) if TABLE_LOOP in "".join(row_texts(row)))
+    return rows[loop + 1]
+
+
+@pytest.mark.parametrize("name", ["report_template.docx", "report_template_design.docx"])
+def test_table_rows_follow_the_template_data_row(name, monkeypatch):
+    # Several chunks, the last one partial
+    monkeypatch.setattr(report, "ROWS_PER_CHUNK", 7)
+    template = load_template(TEMPLATES / name)
+    document = document_tree(template.content)
+    assert TABLE_MARKER in "".join(document.itertext())
+    assert TABLE_LOOP not in "".join(document.itertext())
+
+    filled = document_tree(template.fill_table(template.content, iter(records(30))))
+    assert TABLE_MARKER not in "".join(filled.itertext())
+    rows = [row for row in filled.iter(f"{W}tr") if row_texts(row) and row_texts(row)[0].isdigit()]
+    assert [row_texts(row) for row in rows] == [
+        [unescape(format_cell(record[field])) for field in template.fields] for record in records(30)
+    ]
+    # The cells keep the properties of the template cells
+    data_row = template_data_row(TEMPLATES / name)
+    cell_props = [ElementTree.tostring(cell.find(f"{W}tcPr")) for cell in data_row.iter(f"{W}tc")]
+    assert [ElementTree.tostring(cell.find(f"{W}tcPr")) for cell in rows[0].iter(f"{W}tc")] == cell_props
+
+
+def test_template_fields_are_the_record_keys():
+    template = load_template(TEMPLATES / "report_template.docx")
+    assert template.fields == list(records(1)[0])
+    assert load_template(TEMPLATES / "report_template.docx") is template
+
+
+def test_format_cell():
+    assert format_cell(None) == "-"
+    assert format_cell(1.23456) == "1.23"
+    assert format_cell(3) == "3"
+    assert format_cell("a<b") == "a&lt;b"
+
+
+def test_empty_table_removes_the_marker():
+    template = load_template(TEMPLATES / "report_template.docx")
+    filled = template.fill_table(template.content, [])
+    assert TABLE_MARKER not in "".join(document_tree(filled).itertext())
+
+
+def test_table_workbook_has_one_row_per_record():
+    rows = records(5)
+    workbook = openpyxl.load_workbook(io.BytesIO(table_workbook(iter(rows), list(rows[0]))), read_only=True)
+    values = list(workbook["Frame Results"].values)
+    assert list(values[0]) == list(rows[0])
+    assert [list(row) for row in values[1:]] == [list(record.values()) for record in rows]
@@ -0,0 +1,87 @@
+"""Filtering and ordering of the result store against a sort of the records."""
+
+import math
+
+import numpy as np
+import pytest
+
+from app.core.batch_check import NOT_OK, OK, UNCHECKED
+from app.core.results import (
+    CHECK_ORDER,
+    FIELDS,
+    HIGHEST_RATIO,
+    LABEL_FIELDS,
+    LOWEST_RATIO,
+    NUMBER_FIELDS,
+    UNCHECKED_LABEL,
+    ResultStore,
+)
+
+GROUPS = ["GF Columns", "Beams X 1", "Beams Y 1"]
+SECTIONS = ["310UC118", "410UB59.7", "250UB37.3"]
+CONN_TYPES = ["Base Plate", "Moment End Plate", "Web Cleat"]
+
+
+def random_store(rows: int, seed: int) -> ResultStore:
+    rng = np.random.default_rng(seed)
+    labels = {"group_name": GROUPS, "section_name": SECTIONS, "load_combo": ["C1", "C2"], "conn_type": CONN_TYPES}
+    codes = {field: rng.integers(-1 if field == "section_name" else 0, 2, rows).astype(np.int32) for field in labels}
+    numbers = {field: rng.normal(0, 1, rows) for field in NUMBER_FIELDS}
+    # Ties and missing ratios, as for unchecked frames
+    ratio = np.round(rng.uniform(0, 2, rows), 1)
+    ratio[rng.random(rows) < 0.2] = np.nan
+    numbers["capacity_ratio"] = ratio
+    status = rng.choice([OK, NOT_OK, UNCHECKED], rows).astype(np.int8)
+    return ResultStore(np.arange(100, 100 + rows), codes, labels, numbers, status)
+
+
+def reference_select(store, groups, checks, order, limit) -> list[int]:
+    records = list(store.records())
+    rows = [
+        row
+        for row, record in enumerate(records)
+        if (not groups or record["group_name"] in groups)
+        and (not checks or (record["check"] or UNCHECKED_LABEL) in checks)
+    ]
+
+    def highest_first(row):
+        ratio = records[row]["capacity_ratio"]
+        return (ratio is None, -(ratio or 0.0), row)
+
+    if limit:
+        rows = sorted(sorted(rows, key=highest_first)[:limit])
+    if order == HIGHEST_RATIO:
+        return sorted(rows, key=highest_first)
+    if order == LOWEST_RATIO:
+        return sorted(
+            rows, key=lambda row: (records[row]["capacity_ratio"] is None, records[row]["capacity_ratio"] or 0)
+        )
+    return rows
+
+
+@pytest.mark.parametrize("order", [CHECK_ORDER, HIGHEST_RATIO, LOWEST_RATIO])
+@pytest.mark.parametrize("limit", [None, 1, 25, 1000])
+@pytest.mark.parametrize(
+    "groups, checks",
+    [(None, None), (["Beams X 1"], None), (None, ["Not OK", UNCHECKED_LABEL]), (GROUPS[:2], ["OK"])],
+)
+def test_select_matches_a_sort_of_the_records(order, limit, groups, checks):
+    store = random_store(300, seed=len(groups or []) + len(checks or []))
+    assert store.select(groups=groups, checks=checks, order=order, limit=limit).tolist() == reference_select(
+        store, groups, checks, order, limit
+    )
+
+
+def test_records_hold_python_values_with_none_for_missing():
+    store = random_store(50, seed=1)
+    records = list(store.records())
+    assert [list(record) for record in records] == [FIELDS] * 50
+    for row, record in enumerate(records):
+        assert record["frame_id"] == 100 + row
+        assert record["check"] == {OK: "OK", NOT_OK: "Not OK"}.get(int(store.status[row]))
+        for field in LABEL_FIELDS:
+            code = store.codes[field][row]
+            assert record[field] == (None if code < 0 else store.labels[field][code])
+        ratio = store.numbers["capacity_ratio"][row]
+        assert record["capacity_ratio"] == (None if math.isnan(ratio) else ratio)
+    assert store.table_rows([0])[0][FIELDS.index("V")] == round(store.numbers["V"][0], 2)
@@ -0,0 +1,71 @@
+"""The zipped CSV tables against the xlsx export of the same model."""
+
+import io
+import zipfile
+
+import pytest
+
+from app.core.parse_xlsx_files import SHEET_COLUMNS, get_entities, read_names
+from app.core.tables import CSV, PARQUET, XLSX, TableBundle, detect_format
+from test_forces import assert_same_store
+
+
+def zip_of(members: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+def test_detect_format(export):
+    assert detect_format(export()) == XLSX
+    assert detect_format(export(table_format="csv")) == CSV
+    assert detect_format(zip_of({"tables/Group Assignments.parquet": ""})) == PARQUET
+    with pytest.raises(ValueError, match="Unknown file format"):
+        detect_format(b"Group Name,Object Unique Name\n")
+    with pytest.raises(ValueError, match="neither"):
+        detect_format(zip_of({"readme.txt": ""}))
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_csv_tables_match_the_workbook(export, stream):
+    size = dict(storeys=2, bays=2, combos=3)
+    from_xlsx = get_entities(export(**size), stream=stream, envelope=False)
+    from_csv = get_entities(export(table_format="csv", **size), stream=stream, envelope=False)
+    for name in ["nodes", "lines", "groups", "sections"]:
+        assert getattr(from_csv, name) == getattr(from_xlsx, name), name
+    # The CSV parser of pandas may round the last digit of a value differently than Python
+    assert_same_store(from_csv.load_combos, from_xlsx.load_combos, rtol=1e-13)
+
+
+def test_read_names_match_the_workbook(export):
+    for sheet, column in [("Group Assignments", "Group Name"), ("Frame Assigns - Sect Prop", "Section Property")]:
+        assert read_names(export(table_format="csv"), sheet, column) == read_names(export(), sheet, column)
+
+
+def test_bundle_matches_table_names_and_reads_the_columns():
+    content = zip_of(
+        {
+            "__MACOSX/export/group_assignments.csv": "garbage",
+            "export/group_assignments.CSV": (
+                "TABLE:  Group Assignments\n"
+                "Group Name,Object Type,Object Unique Name\n"
+                ",,\n"
+                "GF,Frame,12\n"
+                ",,\n"
+                "GF,Frame,Global\n"
+            ),
+        }
+    )
+    with TableBundle(content, CSV) as bundle:
+        table_df = bundle.read("Group Assignments", SHEET_COLUMNS["Group Assignments"])
+        with pytest.raises(ValueError, match="missing the columns: Global Z"):
+            bundle.read("Group Assignments", ["Group Name", "Global Z"])
+        with pytest.raises(ValueError, match="no 'Beam Object Connectivity.csv'"):
+            bundle.read("Beam Object Connectivity", SHEET_COLUMNS["Beam Object Connectivity"])
+    # Units and blank rows dropped, text that is not an id read as missing
+    assert table_df["Group Name"].tolist() == ["GF", "GF"]
+    assert table_df["Object Unique Name"].isna().tolist() == [False, True]
+    assert table_df["Object Unique Name"][0] == 12
+    assert str(table_df["Object Unique Name"].dtype) == "Int64"